@@ -0,0 +1,124 @@
+"""Compare the legacy dict-based feed extraction with the indexed protobuf path.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parse --trips 600 --repeat 20
+
+The direct path walks the FeedMessage once to build the feed-wide arrival
+index and then queries the station from it, as the service does for each
+new feed version; "query" is the per-request cost of serving the station
+from an index that is already built. Memory is the peak traced Python heap during one run. The upb
+arena backing a parsed FeedMessage is allocated outside the Python heap and
+is the same for both paths, so the figures isolate the dict conversion.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+import tracemalloc
+
+from mta_data.subway import MTAService, protobuf_to_dict
+from benchmarks.synthetic import build_feed_bytes, station_stop_ids
+
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mta_data", "mta_config.json")
+
+
+def legacy_upcoming_trains(service, feed_dict, station_id):
+    """The pre-protobuf extraction: scan the full dict conversion of the feed."""
+    station_stops = service.station_tables[station_id].stops
+    now = time.time()
+    upcoming_trains = []
+    for entity in feed_dict.get('entity', []):
+        if 'trip_update' not in entity:
+            continue
+        trip_update = entity['trip_update']
+        if 'trip' not in trip_update or 'route_id' not in trip_update['trip']:
+            continue
+        route_id = trip_update['trip']['route_id']
+        if route_id not in service.target_route_set or 'stop_time_update' not in trip_update:
+            continue
+        for stop in trip_update['stop_time_update']:
+            stop_id = stop.get('stop_id', '')
+            if stop_id not in station_stops:
+                continue
+            arrival_time = stop.get('arrival', {}).get('time')
+            if arrival_time and now < arrival_time < now + 3600:
+                upcoming_trains.append({
+                    'route_id': route_id,
+                    'direction': station_stops[stop_id],
+                    'arrival_time': arrival_time,
+                    'arrival_time_formatted': service.format_time(arrival_time),
+                    'minutes_away': int((arrival_time - now) / 60)
+                })
+    return sorted(upcoming_trains, key=lambda x: x['arrival_time'])
+
+
+def legacy_path(service, payload, station_id):
+    feed = service.parse_feed(payload)
+    return legacy_upcoming_trains(service, protobuf_to_dict(feed), station_id)
+
+
+def direct_path(service, payload, station_id):
+    feed_index = service.build_feed_index(service.parse_feed(payload))
+    return service.get_upcoming_trains_at_station(feed_index, station_id)
+
+
+def measure(func, repeat):
+    """Return (median seconds, peak traced bytes, result size) for ``func``."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--station", default="union_square")
+    parser.add_argument("--trips", type=int, default=300, help="Trips per synthetic feed")
+    parser.add_argument("--stops-per-trip", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Emit results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    service = MTAService(CONFIG_PATH)
+    results = []
+    for url, feed_ids in service.get_station_feeds(args.station).items():
+        routes = sorted({route for feed_id in feed_ids for route in service.feed_to_routes.get(feed_id, [])})
+        payload = build_feed_bytes(
+            routes, station_stop_ids(service.config, routes),
+            trips=args.trips, stops_per_trip=args.stops_per_trip
+        )
+        row = {"feed": "/".join(feed_ids), "bytes": len(payload)}
+        for name, func in (("dict", legacy_path), ("direct", direct_path)):
+            seconds, peak, count = measure(lambda: func(service, payload, args.station), args.repeat)
+            row[name] = {"median_ms": round(seconds * 1000, 3), "peak_kib": round(peak / 1024, 1), "trains": count}
+        feed_index = service.build_feed_index(service.parse_feed(payload))
+        seconds, _, count = measure(lambda: service.get_upcoming_trains_at_station(feed_index, args.station), args.repeat)
+        row["query"] = {"median_ms": round(seconds * 1000, 3), "trains": count}
+        row["speedup"] = round(row["dict"]["median_ms"] / row["direct"]["median_ms"], 2)
+        row["memory_ratio"] = round(row["dict"]["peak_kib"] / row["direct"]["peak_kib"], 2)
+        results.append(row)
+
+    if args.json:
+        print(json.dumps({"station": args.station, "results": results}, indent=2))
+        return
+
+    print(f"{'feed':<10}{'bytes':>10}{'dict ms':>10}{'direct ms':>11}{'speedup':>9}{'query ms':>10}{'dict KiB':>10}{'direct KiB':>12}")
+    for row in results:
+        print(f"{row['feed']:<10}{row['bytes']:>10}{row['dict']['median_ms']:>10}{row['direct']['median_ms']:>11}"
+              f"{row['speedup']:>9}{row['query']['median_ms']:>10}{row['dict']['peak_kib']:>10}{row['direct']['peak_kib']:>12}")
+
+
+if __name__ == "__main__":
+    main()
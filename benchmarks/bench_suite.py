@@ -0,0 +1,274 @@
+"""Measure every stage of the station trains hot path against a local stand-in MTA server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite --output results.json
+
+Each feed in ``FEED_URLS`` is served from a recorded fixture (see
+``benchmarks.fixtures``), a payload from a feed archive (``--archive``) or
+a synthetic payload by ``FeedServer``, and the following stages are timed
+separately:
+
+- ``fetch``: one unconditional HTTP fetch of a feed (``fetch_feed``)
+- ``parse_gtfs_data``: protobuf parse plus the legacy dict conversion
+- ``build_feed_index``: protobuf parse plus the arrival index the service builds
+- ``station_query``: ``get_upcoming_trains_at_station`` on an indexed feed
+- ``station_trains_cold``: ``get_station_trains`` after dropping the feed cache
+- ``station_trains_warm``: ``get_station_trains`` served from cached snapshots
+- ``end_to_end``: ``GET /api/stations/{id}/trains`` through uvicorn at each
+  ``--concurrency`` level, reporting latency percentiles and throughput
+
+Results are printed as JSON (or written to ``--output``) so runs can be
+compared across releases.
+"""
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.feed_server import serve_fixtures
+from benchmarks.fixtures import FIXTURES_DIR, load_fixtures
+from mta_data import subway
+from mta_data.subway import MTAService, parse_timestamp
+
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mta_data", "mta_config.json")
+
+API_KEY = "benchmark"
+
+# (config station ID, API station ID) pairs exercised by the suite
+STATIONS = [
+    ("union_square", "union-square"),
+    ("times_square", "times-square-42nd"),
+    ("grand_central", "grand-central-42nd"),
+    ("herald_square", "herald-square-34th"),
+    ("penn_station", "penn-station-34th"),
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    """Summarize a list of durations in seconds as milliseconds."""
+    ordered = sorted(timings)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        "count": len(ordered),
+        "mean_ms": ms(statistics.fmean(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p95_ms": ms(percentile(ordered, 0.95)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "min_ms": ms(ordered[0]) if ordered else None,
+        "max_ms": ms(ordered[-1]) if ordered else None,
+    }
+
+
+def time_calls(func, repeat):
+    """Call ``func`` ``repeat`` times and return the durations in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_feeds(service, payloads, repeat):
+    """Time fetch, parse and index for every feed URL."""
+    results = {}
+    for url, payload in payloads.items():
+        feed_ids = sorted(feed_id for feed_id, feed_url in service.feed_urls.items() if feed_url == url)
+        results["/".join(feed_ids)] = {
+            "bytes": len(payload),
+            "fetch": summarize(time_calls(lambda: service.fetch_feed(url), repeat)),
+            "parse_gtfs_data": summarize(time_calls(lambda: service.parse_gtfs_data(payload), repeat)),
+            "build_feed_index": summarize(time_calls(
+                lambda: service.build_feed_index(service.parse_feed(payload)), repeat
+            )),
+        }
+    return results
+
+
+def bench_stations(service, repeat):
+    """Time the per-station query and full ``get_station_trains`` for every station."""
+    results = {}
+    for station_id, _ in STATIONS:
+        if station_id not in service.stations:
+            continue
+        query = service.plan_station_query(station_id)
+        indexes = [service.get_feed(url) for url in query.feeds]
+
+        def station_query():
+            for feed_index in indexes:
+                service.get_upcoming_trains_at_station(feed_index, station_id, query)
+
+        def station_trains_cold():
+            service.feed_cache.invalidate()
+            service.get_station_trains(station_id)
+
+        service.get_station_trains(station_id)
+        results[station_id] = {
+            "feeds": len(query.feeds),
+            "trains": len(service.get_station_trains(station_id)["all_trains"]),
+            "station_query": summarize(time_calls(station_query, repeat)),
+            "station_trains_warm": summarize(time_calls(lambda: service.get_station_trains(station_id), repeat)),
+            "station_trains_cold": summarize(time_calls(station_trains_cold, repeat)),
+        }
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(config_path):
+    """Run the FastAPI app under uvicorn in a background thread against ``config_path``."""
+    import uvicorn
+
+    os.environ.setdefault("API_KEY", API_KEY)
+    subway.config_path = config_path
+    import main
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-api", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    logging.disable(logging.WARNING)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def bench_end_to_end(base_url, concurrency_levels, requests_per_client):
+    """Hit the station trains endpoint from concurrent keep-alive clients."""
+    headers = {"X-API-Key": os.environ["API_KEY"]}
+    paths = [f"/api/stations/{station_id}/trains" for _, station_id in STATIONS]
+    # Warm every feed once so the first measured requests aren't all cold
+    with requests.Session() as session:
+        for path in paths:
+            session.get(base_url + path, headers=headers)
+
+    results = {}
+    for concurrency in concurrency_levels:
+        def client(offset):
+            timings, errors = [], 0
+            with requests.Session() as session:
+                for i in range(requests_per_client):
+                    path = paths[(offset + i) % len(paths)]
+                    started = time.perf_counter()
+                    try:
+                        response = session.get(base_url + path, headers=headers)
+                        if response.status_code != 200:
+                            errors += 1
+                    except requests.RequestException:
+                        errors += 1
+                    timings.append(time.perf_counter() - started)
+            return timings, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(client, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        timings = [t for client_timings, _ in outcomes for t in client_timings]
+        results[str(concurrency)] = dict(
+            summarize(timings),
+            errors=sum(errors for _, errors in outcomes),
+            requests_per_second=round(len(timings) / elapsed, 1),
+        )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of recorded <feed>.pb payloads")
+    parser.add_argument("--synthetic", action="store_true", help="Ignore recorded fixtures")
+    parser.add_argument("--archive", help="Feed archive directory (MTA_ARCHIVE_DIR) to take real payloads from")
+    parser.add_argument("--archive-at", help="Unix time or ISO datetime of the archived payloads (default: latest)")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply the trips in every feed")
+    parser.add_argument("--trips", type=int, default=300, help="Trips per synthetic feed before scaling")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added by the stand-in server")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts for end_to_end")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client for end_to_end")
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with open(args.config) as f:
+        config = json.load(f)
+    payloads, sources = load_fixtures(
+        config, args.fixtures, scale=args.scale, trips=args.trips, synthetic_only=args.synthetic,
+        archive_dir=args.archive, archive_at=parse_timestamp(args.archive_at) if args.archive_at else None
+    )
+    server, config_path = serve_fixtures(config, payloads, latency=args.latency_ms / 1000)
+    try:
+        service = MTAService(config_path)
+        local_payloads = {service.feed_urls[feed_id]: payloads[url]
+                          for feed_id, url in config["FEED_URLS"].items()}
+        report = {
+            "meta": {
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "scale": args.scale,
+                "repeat": args.repeat,
+                "latency_ms": args.latency_ms,
+                "fixtures": {url: sources[url] for url in sorted(sources)},
+            },
+            "feeds": bench_feeds(service, local_payloads, args.repeat),
+            "stations": bench_stations(service, args.repeat),
+        }
+        if not args.skip_end_to_end:
+            api, thread, base_url = start_api(config_path)
+            try:
+                levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+                report["end_to_end"] = bench_end_to_end(base_url, levels, args.requests)
+            finally:
+                api.should_exit = True
+                thread.join()
+    finally:
+        server.stop()
+        os.unlink(config_path)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
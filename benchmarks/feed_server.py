@@ -0,0 +1,137 @@
+"""A local stand-in for the MTA GTFS-rt endpoint.
+
+Serves fixed protobuf payloads over HTTP/1.1 keep-alive with ETags, so the
+service's fetch path (connection pooling, conditional requests, parsing)
+can be exercised without touching ``api-endpoint.mta.info``.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class FeedServer:
+    """Serve ``{path: payload}`` on a local port until stopped.
+
+    ``latency`` seconds (plus up to ``jitter`` more) are slept before every
+    response to stand in for the network round trip to the MTA, and a
+    fraction ``error_rate`` of requests is answered with a 503.
+    """
+
+    def __init__(self, payloads, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.payloads = {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.not_modified = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        for path, payload in payloads.items():
+            self.set_payload(path, payload)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_payload(self, path, payload):
+        """Replace the payload served at ``path``; its ETag changes with it."""
+        etag = '"' + hashlib.blake2b(payload, digest_size=8).hexdigest() + '"'
+        with self._lock:
+            self.payloads[path] = (payload, etag)
+
+    def url_for(self, url):
+        """Rewrite an upstream feed URL to point at this server."""
+        parts = urlsplit(url)
+        return self.base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="feed-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, handler):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        path = urlsplit(handler.path).path
+        with self._lock:
+            self.requests += 1
+            entry = self.payloads.get(path)
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            handler.send_response(503)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        if entry is None:
+            handler.send_response(404)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        payload, etag = entry
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-protobuf")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+def serve_fixtures(config, fixtures, **kwargs):
+    """Start a FeedServer for ``{url: payload}`` fixtures.
+
+    Returns ``(server, config_path)`` where ``config_path`` is a temporary
+    copy of ``config`` whose ``FEED_URLS`` point at the server.
+    """
+    server = FeedServer({urlsplit(url).path: payload for url, payload in fixtures.items()}, **kwargs)
+    standin = json.loads(json.dumps(config))
+    standin["FEED_URLS"] = {feed_id: server.url_for(url) for feed_id, url in config.get("FEED_URLS", {}).items()}
+    fd, config_path = tempfile.mkstemp(prefix="mta-standin-", suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(standin, f)
+    return server.start(), config_path
@@ -0,0 +1,137 @@
+"""GTFS-rt payload fixtures for the benchmarks.
+
+Recorded payloads live in ``benchmarks/fixtures/<feed>.pb``, one per unique
+feed URL. Record a fresh set from the live MTA API with:
+
+    python -m benchmarks.fixtures record
+
+Feeds without a recording fall back to a synthetic payload. Either kind can
+be scaled up to stress the hot path with more trips than a real feed has.
+Recorded payloads are shifted so their header timestamp is the current
+time, keeping their arrivals inside the service's one-hour window.
+
+Real traffic captured by the service's feed archive (``MTA_ARCHIVE_DIR``)
+can be used instead of the recordings by passing ``archive_dir``; each feed
+is taken as it was at ``archive_at`` (the latest archived version by
+default).
+"""
+import argparse
+import os
+import time
+from urllib.parse import unquote, urlsplit
+
+from google.transit import gtfs_realtime_pb2
+
+from benchmarks.synthetic import build_feed_bytes, station_stop_ids
+from mta_data.archive import FeedArchive
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture_name(url):
+    """Return the fixture file name for a feed URL, e.g. ``gtfs-ace.pb``."""
+    return unquote(urlsplit(url).path).rsplit("/", 1)[-1] + ".pb"
+
+
+def feed_routes(config, url):
+    """Return the routes carried by every feed ID that resolves to ``url``."""
+    return sorted({
+        route
+        for feed_id, feed_url in config.get("FEED_URLS", {}).items() if feed_url == url
+        for route in config.get("FEED_TO_ROUTES", {}).get(feed_id, [])
+    })
+
+
+def replay_feed(payload, factor=1, now=None):
+    """Shift a recorded feed to ``now`` and repeat every trip ``factor`` times under distinct trip IDs."""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(payload)
+    offset = int(now if now is not None else time.time()) - feed.header.timestamp
+    feed.header.timestamp += offset
+    for entity in feed.entity:
+        if entity.HasField("trip_update"):
+            for stop in entity.trip_update.stop_time_update:
+                if stop.arrival.time:
+                    stop.arrival.time += offset
+                if stop.departure.time:
+                    stop.departure.time += offset
+        if entity.HasField("vehicle") and entity.vehicle.timestamp:
+            entity.vehicle.timestamp += offset
+
+    originals = list(feed.entity)
+    for copy in range(1, factor):
+        for entity in originals:
+            clone = feed.entity.add()
+            clone.CopyFrom(entity)
+            clone.id = f"{entity.id}#{copy}"
+            if clone.HasField("trip_update"):
+                clone.trip_update.trip.trip_id += f"#{copy}"
+            if clone.HasField("vehicle"):
+                clone.vehicle.trip.trip_id += f"#{copy}"
+    return feed.SerializeToString()
+
+
+def load_fixtures(config, directory=FIXTURES_DIR, scale=1, trips=300, stops_per_trip=30, synthetic_only=False,
+                  archive_dir=None, archive_at=None):
+    """Return ``({url: payload}, {url: source})`` for every unique feed URL in ``config``.
+
+    ``source`` is ``"archived"``, ``"recorded"`` or ``"synthetic"``. Archived
+    and recorded payloads are repeated ``scale`` times; synthetic ones get
+    ``trips * scale`` trips.
+    """
+    archive = FeedArchive(archive_dir) if archive_dir and not synthetic_only else None
+    payloads = {}
+    sources = {}
+    for url in sorted(set(config.get("FEED_URLS", {}).values())):
+        path = os.path.join(directory, fixture_name(url))
+        entry = None
+        if archive is not None:
+            entry = archive.entry_at(url, archive_at if archive_at is not None else time.time())
+        if entry is not None:
+            payloads[url] = replay_feed(archive.read(entry), scale)
+            sources[url] = "archived"
+        elif not synthetic_only and os.path.exists(path):
+            with open(path, "rb") as f:
+                payloads[url] = replay_feed(f.read(), scale)
+            sources[url] = "recorded"
+        else:
+            routes = feed_routes(config, url) or ["1"]
+            payloads[url] = build_feed_bytes(
+                routes, station_stop_ids(config, routes),
+                trips=trips * scale, stops_per_trip=stops_per_trip
+            )
+            sources[url] = "synthetic"
+    return payloads, sources
+
+
+def record_fixtures(service, directory=FIXTURES_DIR):
+    """Fetch every feed in the service configuration once and save the payloads."""
+    os.makedirs(directory, exist_ok=True)
+    recorded = {}
+    for url in sorted(set(service.feed_urls.values())):
+        payload = service.fetch_mta_data(url)
+        if not payload:
+            print(f"Could not fetch {url}")
+            continue
+        path = os.path.join(directory, fixture_name(url))
+        with open(path, "wb") as f:
+            f.write(payload)
+        recorded[url] = len(payload)
+        print(f"Recorded {len(payload)} bytes to {path}")
+    return recorded
+
+
+def main():
+    from mta_data.subway import MTAService, config_path
+
+    parser = argparse.ArgumentParser(description="Record GTFS-rt fixtures from the live MTA API")
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("--config", default=config_path)
+    parser.add_argument("--out", default=FIXTURES_DIR)
+    args = parser.parse_args()
+    record_fixtures(MTAService(args.config), args.out)
+
+
+if __name__ == "__main__":
+    main()
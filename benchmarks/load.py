@@ -0,0 +1,423 @@
+"""Soak the API with many concurrent clients against synthetic feeds and a misbehaving upstream.
+
+Run from the repository root:
+
+    python -m benchmarks.load --clients 2000 --trips 3000 --duration 600 \\
+        --upstream-latency-ms 200 --upstream-error-rate 0.05 --output soak.json
+
+The harness
+
+- generates synthetic NYCT ``FeedMessage`` payloads with ``--trips`` trips
+  per feed and publishes a fresh version every ``--feed-update-seconds``;
+- serves them from a local stand-in MTA endpoint with injected latency,
+  jitter and 503 errors;
+- runs the app in a child process (``benchmarks.load_server``) so the
+  server's RSS and event-loop lag are measured in isolation;
+- drives it with ``--clients`` keep-alive asyncio clients following the
+  ``--mix`` of station, line, batch, nearby, trip and route requests.
+
+Every ``--report-seconds`` it prints one line per interval with throughput,
+p50/p95/p99 latency, errors, RSS and event-loop lag. The full timeline and
+totals are written as JSON to ``--output``. RSS growing from interval to
+interval under a steady load points at a leak.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from google.transit import gtfs_realtime_pb2
+
+from benchmarks.bench_suite import CONFIG_PATH, free_port, git_revision, summarize
+from benchmarks.feed_server import serve_fixtures
+from benchmarks.fixtures import feed_routes
+from benchmarks.synthetic import build_feed_bytes, station_stop_ids
+
+
+API_KEY = "load-test"
+
+DEFAULT_MIX = "station=55,line=15,batch=10,nearby=10,trip=5,route=5"
+
+
+class FeedGenerator:
+    """Synthetic payloads for every feed URL, regenerated on demand."""
+
+    def __init__(self, config, trips, stops_per_trip):
+        self.config = config
+        self.trips = trips
+        self.stops_per_trip = stops_per_trip
+        self.generation = 0
+        self.trip_ids = []
+
+    def build(self):
+        """Return ``{url: payload}`` for a new feed version and remember its trip IDs."""
+        self.generation += 1
+        payloads = {}
+        trip_ids = []
+        for url in sorted(set(self.config["FEED_URLS"].values())):
+            routes = feed_routes(self.config, url) or ["1"]
+            payload = build_feed_bytes(
+                routes, station_stop_ids(self.config, routes),
+                trips=self.trips, stops_per_trip=self.stops_per_trip, seed=self.generation
+            )
+            feed = gtfs_realtime_pb2.FeedMessage()
+            feed.ParseFromString(payload)
+            trip_ids.extend(entity.trip_update.trip.trip_id for entity in feed.entity if entity.HasField("trip_update"))
+            payloads[url] = payload
+        self.trip_ids = trip_ids
+        return payloads
+
+
+class HttpConnection:
+    """A minimal keep-alive HTTP/1.1 client connection for thousands of concurrent clients."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._reader = self._writer = None
+
+    async def get(self, path, headers):
+        """Send a GET and return ``(status, body_bytes)``; reconnects as needed."""
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        try:
+            await self._writer.drain()
+            status_line = await self._reader.readline()
+            if not status_line:
+                raise ConnectionError("Connection closed")
+            status = int(status_line.split()[1])
+            length, chunked, close = 0, False, False
+            while True:
+                line = await self._reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                name, value = name.strip().lower(), value.strip().lower()
+                if name == "content-length":
+                    length = int(value)
+                elif name == "transfer-encoding" and "chunked" in value:
+                    chunked = True
+                elif name == "connection" and value == "close":
+                    close = True
+            if chunked:
+                size = 0
+                while True:
+                    chunk_size = int((await self._reader.readline()).split(b";")[0], 16)
+                    await self._reader.readexactly(chunk_size + 2)
+                    size += chunk_size
+                    if chunk_size == 0:
+                        break
+            else:
+                await self._reader.readexactly(length)
+                size = length
+        except Exception:
+            await self.close()
+            raise
+        if close:
+            await self.close()
+        return status, size
+
+
+class Recorder:
+    """Latencies and outcomes per request kind for the current interval."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.timings = {}
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, kind, seconds, status):
+        self.timings.setdefault(kind, []).append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status is None or status >= 500:
+            self.errors += 1
+
+
+def parse_mix(mix):
+    """Parse ``kind=weight,...`` into ``(kinds, weights)``."""
+    kinds, weights = [], []
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip():
+            kinds.append(kind.strip())
+            weights.append(float(weight or 1))
+    return kinds, weights
+
+
+class RequestPlanner:
+    """Pick the next request path for a client according to the mix."""
+
+    def __init__(self, config, stations, generator, mix):
+        """``stations`` is the ``/api/stations`` listing; line groups are the feeds serving each station."""
+        self.generator = generator
+        self.kinds, self.weights = parse_mix(mix)
+        self.station_ids = [station["id"] for station in stations]
+        self.lines = [
+            (station["id"], feed_id)
+            for station in stations
+            for feed_id, routes in config.get("FEED_TO_ROUTES", {}).items()
+            if set(routes) & set(station["lines"])
+        ]
+        self.points = [
+            (station["LAT"], station["LON"])
+            for station in config["STATIONS"].values() if "LAT" in station and "LON" in station
+        ]
+        self.routes = sorted(config.get("TARGET_ROUTES", []))
+
+    def next(self, rnd):
+        kind = rnd.choices(self.kinds, self.weights)[0]
+        station_ids = self.station_ids
+        if kind == "station" or (kind == "line" and not self.lines):
+            return "station", f"/api/stations/{rnd.choice(station_ids)}/trains"
+        if kind == "line":
+            station_id, line_group = rnd.choice(self.lines)
+            return kind, f"/api/stations/{station_id}/trains?line={line_group}"
+        if kind == "batch":
+            chosen = rnd.sample(station_ids, min(len(station_ids), rnd.randint(2, 4)))
+            return kind, "/api/trains?stations=" + ",".join(chosen)
+        if kind == "nearby" and self.points:
+            lat, lon = rnd.choice(self.points)
+            return kind, f"/api/nearby/trains?lat={lat + rnd.uniform(-0.005, 0.005):.6f}&lon={lon + rnd.uniform(-0.005, 0.005):.6f}&radius=1000"
+        if kind == "trip" and self.generator.trip_ids:
+            return kind, f"/api/trips/{rnd.choice(self.generator.trip_ids)}"
+        if kind == "route" and self.routes:
+            return kind, f"/api/routes/{rnd.choice(self.routes)}/trains"
+        return "station", f"/api/stations/{rnd.choice(station_ids)}/trains"
+
+
+async def client_loop(index, host, port, planner, recorder, think, stop):
+    rnd = random.Random(index)
+    headers = {"X-API-Key": API_KEY}
+    connection = HttpConnection(host, port)
+    # Spread the initial requests over one think period
+    await asyncio.sleep(rnd.uniform(0, think))
+    try:
+        while not stop.is_set():
+            kind, path = planner.next(rnd)
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.get(path, headers)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                status = None
+            recorder.record(kind, time.perf_counter() - started, status)
+            if think:
+                await asyncio.sleep(rnd.expovariate(1 / think))
+    finally:
+        await connection.close()
+
+
+async def get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nX-API-Key: {API_KEY}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    return json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+def start_server(config_path, port, poll_interval):
+    env = dict(os.environ, API_KEY=API_KEY, MTA_CONFIG_PATH=config_path, MTA_POLL_INTERVAL=str(poll_interval))
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.load_server", "--port", str(port)],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+
+
+async def wait_for_server(host, port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            await get_json(host, port, "/api/health")
+            return
+        except (OSError, ValueError, IndexError):
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not start")
+
+
+async def run_load(args, config, generator, host, port):
+    stations = await get_json(host, port, "/api/stations")
+    planner = RequestPlanner(config, stations, generator, args.mix)
+    recorder = Recorder()
+    stop = asyncio.Event()
+    think = args.think_ms / 1000
+
+    clients = [
+        asyncio.create_task(client_loop(i, host, port, planner, recorder, think, stop))
+        for i in range(args.clients)
+    ]
+
+    intervals = []
+    all_timings = {}
+    total_errors = 0
+    started = time.monotonic()
+    try:
+        while time.monotonic() - started < args.duration:
+            interval_started = time.monotonic()
+            await asyncio.sleep(min(args.report_seconds, args.duration - (interval_started - started)))
+            elapsed = time.monotonic() - interval_started
+            timings, statuses, errors = recorder.timings, recorder.statuses, recorder.errors
+            recorder.reset()
+
+            stats = await get_json(host, port, "/api/_load/stats")
+            flat = [t for kind_timings in timings.values() for t in kind_timings]
+            for kind, kind_timings in timings.items():
+                all_timings.setdefault(kind, []).extend(kind_timings)
+            total_errors += errors
+            interval = {
+                "t_seconds": round(time.monotonic() - started, 1),
+                "requests_per_second": round(len(flat) / elapsed, 1) if elapsed else None,
+                "latency": summarize(flat),
+                "errors": errors,
+                "statuses": {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+                "server": stats,
+            }
+            intervals.append(interval)
+            lag = stats["event_loop_lag"]
+            print(
+                f"[{interval['t_seconds']:>7}s] {interval['requests_per_second']:>8} req/s"
+                f"  p50 {interval['latency']['p50_ms']} ms  p95 {interval['latency']['p95_ms']} ms"
+                f"  p99 {interval['latency']['p99_ms']} ms  errors {errors}"
+                f"  rss {stats['rss_kib'] / 1024:.1f} MiB  loop lag p99 {lag.get('p99_ms')} ms max {lag.get('max_ms')} ms",
+                flush=True
+            )
+    finally:
+        stop.set()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+    rss = [interval["server"]["rss_kib"] for interval in intervals]
+    return {
+        "intervals": intervals,
+        "totals": {
+            "requests": sum(len(t) for t in all_timings.values()),
+            "errors": total_errors,
+            "latency": summarize([t for kind_timings in all_timings.values() for t in kind_timings]),
+            "by_kind": {kind: summarize(kind_timings) for kind, kind_timings in sorted(all_timings.items())},
+            "rss_kib_first": rss[0] if rss else None,
+            "rss_kib_last": rss[-1] if rss else None,
+            "rss_kib_max": max(rss) if rss else None,
+        },
+    }
+
+
+def raise_file_limit(wanted):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent keep-alive clients")
+    parser.add_argument("--think-ms", type=float, default=1000, help="Mean pause between a client's requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted request kinds: station, line, batch, nearby, trip, route")
+    parser.add_argument("--duration", type=float, default=300, help="Seconds to run")
+    parser.add_argument("--report-seconds", type=float, default=10)
+    parser.add_argument("--trips", type=int, default=1500, help="Trips per synthetic feed")
+    parser.add_argument("--stops-per-trip", type=int, default=30)
+    parser.add_argument("--feed-update-seconds", type=float, default=30, help="Publish a new version of every feed this often")
+    parser.add_argument("--poll-interval", type=float, default=30, help="MTA_POLL_INTERVAL for the server; 0 fetches on demand")
+    parser.add_argument("--upstream-latency-ms", type=float, default=0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    raise_file_limit(args.clients * 2 + 256)
+    with open(args.config) as f:
+        config = json.load(f)
+
+    generator = FeedGenerator(config, args.trips, args.stops_per_trip)
+    payloads = generator.build()
+    upstream, config_path = serve_fixtures(
+        config, payloads,
+        latency=args.upstream_latency_ms / 1000, jitter=args.upstream_jitter_ms / 1000,
+        error_rate=args.upstream_error_rate
+    )
+
+    stop_updates = threading.Event()
+
+    def publish_updates():
+        while not stop_updates.wait(args.feed_update_seconds):
+            for url, payload in generator.build().items():
+                upstream.set_payload(urlsplit(url).path, payload)
+
+    updater = threading.Thread(target=publish_updates, name="feed-updates", daemon=True)
+    updater.start()
+
+    host, port = "127.0.0.1", free_port()
+    process = start_server(config_path, port, args.poll_interval)
+    try:
+        asyncio.run(wait_for_server(host, port, process))
+        result = asyncio.run(run_load(args, config, generator, host, port))
+    finally:
+        stop_updates.set()
+        process.terminate()
+        process.wait(timeout=10)
+        upstream.stop()
+        os.unlink(config_path)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "clients": args.clients,
+            "think_ms": args.think_ms,
+            "mix": args.mix,
+            "duration": args.duration,
+            "trips": args.trips,
+            "stops_per_trip": args.stops_per_trip,
+            "feed_bytes": {url: len(payload) for url, payload in sorted(payloads.items())},
+            "feed_update_seconds": args.feed_update_seconds,
+            "poll_interval": args.poll_interval,
+            "upstream": {
+                "latency_ms": args.upstream_latency_ms,
+                "jitter_ms": args.upstream_jitter_ms,
+                "error_rate": args.upstream_error_rate,
+                "requests": upstream.requests,
+                "errors": upstream.errors,
+                "not_modified": upstream.not_modified,
+            },
+        },
+        **result,
+    }
+    totals = result["totals"]
+    print(f"{totals['requests']} requests, {totals['errors']} errors, p99 {totals['latency']['p99_ms']} ms, "
+          f"rss {totals['rss_kib_first']} -> {totals['rss_kib_last']} KiB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
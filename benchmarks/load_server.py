@@ -0,0 +1,105 @@
+"""Run the API under uvicorn with load-test instrumentation.
+
+Started as a child process by ``benchmarks.load``:
+
+    python -m benchmarks.load_server --port 8100
+
+On top of the normal app it samples event-loop lag in the server's own
+loop and serves ``GET /api/_load/stats`` with the process RSS and the lag
+observed since the previous call, so the harness can watch the server
+without sharing its process.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import resource
+import threading
+import time
+
+
+LAG_INTERVAL = 0.05
+
+
+def rss_kib():
+    """Current resident set size in KiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class LagMonitor:
+    """Measure how late the event loop wakes up from a fixed sleep."""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self._samples = []
+        self._lock = threading.Lock()
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            with self._lock:
+                self._samples.append(max(0.0, lag))
+
+    def drain(self):
+        """Return lag statistics in milliseconds since the previous call."""
+        with self._lock:
+            samples, self._samples = sorted(self._samples), []
+        if not samples:
+            return {"samples": 0}
+        p99 = samples[min(len(samples) - 1, math.ceil(0.99 * len(samples)) - 1)]
+        return {
+            "samples": len(samples),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+
+
+def main():
+    import uvicorn
+    import main as api
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--backlog", type=int, default=4096)
+    args = parser.parse_args()
+
+    # Upstream errors are injected on purpose; keep the report readable
+    logging.disable(logging.ERROR)
+    monitor = LagMonitor()
+
+    async def load_stats():
+        return {
+            "rss_kib": rss_kib(),
+            "threads": threading.active_count(),
+            "event_loop_lag": monitor.drain(),
+        }
+
+    api.app.add_api_route("/api/_load/stats", load_stats, methods=["GET"], include_in_schema=False)
+    server = uvicorn.Server(uvicorn.Config(
+        api.app, host=args.host, port=args.port, backlog=args.backlog,
+        log_level="warning", access_log=False
+    ))
+
+    async def serve():
+        lag_task = asyncio.create_task(monitor.run())
+        try:
+            await server.serve()
+        finally:
+            lag_task.cancel()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import random
+import time
+from google.transit import gtfs_realtime_pb2
+
+
+# Field number of the NYCT extensions (nyct-subway.proto)
+NYCT_EXTENSION_FIELD = 1001
+
+# NyctTripDescriptor.Direction values
+NYCT_NORTH = 1
+NYCT_SOUTH = 3
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+def _string_field(field_number, value):
+    data = value.encode('utf-8')
+    return _varint((field_number << 3) | 2) + _varint(len(data)) + data
+
+def _varint_field(field_number, value):
+    return _varint(field_number << 3) + _varint(value)
+
+def _extension(payload):
+    return _varint((NYCT_EXTENSION_FIELD << 3) | 2) + _varint(len(payload)) + payload
+
+def add_nyct_trip_descriptor(trip, train_id, direction, is_assigned=True):
+    """Attach a NyctTripDescriptor extension to a TripDescriptor."""
+    payload = (_string_field(1, train_id)
+               + _varint_field(2, int(is_assigned))
+               + _varint_field(3, direction))
+    trip.MergeFromString(_extension(payload))
+
+def add_nyct_stop_time_update(stop, scheduled_track, actual_track=None):
+    """Attach a NyctStopTimeUpdate extension to a StopTimeUpdate."""
+    payload = _string_field(1, scheduled_track)
+    if actual_track:
+        payload += _string_field(2, actual_track)
+    stop.MergeFromString(_extension(payload))
+
+
+def station_stop_ids(config, routes=None):
+    """Return the configured stop IDs, optionally only those served by ``routes``."""
+    stop_ids = set()
+    for station_config in config.get('STATIONS', {}).values():
+        for key, stop_id in station_config.get('STOP_IDS', {}).items():
+            if routes is None or key.split('_')[0] in routes:
+                stop_ids.add(stop_id)
+    return sorted(stop_ids)
+
+
+def build_feed(routes, stop_ids, trips=300, stops_per_trip=30, now=None, seed=0):
+    """Build a synthetic NYCT-style FeedMessage.
+
+    Each trip runs one of ``routes`` in a random direction and visits
+    ``stops_per_trip`` stops. Stops are drawn from ``stop_ids`` (so
+    configured stations see arrivals) mixed with filler stop IDs, and
+    carry arrival/departure times spread over the next ~90 minutes plus
+    NYCT trip and track extensions.
+    """
+    now = int(now if now is not None else time.time())
+    rnd = random.Random(seed)
+    base_ids = sorted({stop_id[:-1] for stop_id in stop_ids}) or ['000']
+    filler = [f"{100 + i:03d}" for i in range(max(stops_per_trip * 2, 60))]
+
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "1.0"
+    feed.header.incrementality = gtfs_realtime_pb2.FeedHeader.FULL_DATASET
+    feed.header.timestamp = now
+
+    for i in range(trips):
+        route_id = routes[i % len(routes)]
+        northbound = rnd.random() < 0.5
+        suffix = 'N' if northbound else 'S'
+
+        entity = feed.entity.add()
+        entity.id = f"{i:06d}"
+        trip_update = entity.trip_update
+        trip = trip_update.trip
+        trip.trip_id = f"{rnd.randint(0, 143999):06d}_{route_id}..{suffix}{rnd.randint(1, 99):02d}R"
+        trip.route_id = route_id
+        trip.start_date = time.strftime('%Y%m%d', time.localtime(now))
+        add_nyct_trip_descriptor(
+            trip, f"0{route_id} {rnd.randint(0, 2359):04d}+ X/Y",
+            NYCT_NORTH if northbound else NYCT_SOUTH
+        )
+
+        stops = rnd.sample(base_ids, min(len(base_ids), max(1, stops_per_trip // 6)))
+        stops += rnd.sample(filler, stops_per_trip - len(stops))
+        arrival = now + rnd.randint(-300, 1800)
+        for stop_base in stops:
+            arrival += rnd.randint(60, 180)
+            stop = trip_update.stop_time_update.add()
+            stop.stop_id = stop_base + suffix
+            stop.arrival.time = arrival
+            stop.departure.time = arrival + 30
+            add_nyct_stop_time_update(stop, str(rnd.randint(1, 4)))
+
+        vehicle_entity = feed.entity.add()
+        vehicle_entity.id = f"{i:06d}v"
+        vehicle = vehicle_entity.vehicle
+        vehicle.trip.CopyFrom(trip)
+        vehicle.current_stop_sequence = 1
+        vehicle.timestamp = now
+
+    return feed
+
+
+def build_feed_bytes(routes, stop_ids, **kwargs):
+    """Build a synthetic feed and return its serialized payload."""
+    return build_feed(routes, stop_ids, **kwargs).SerializeToString()
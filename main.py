@@ -1,32 +1,45 @@
 from fastapi import FastAPI, Query, HTTPException, Depends, Security, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security.api_key import APIKeyHeader, APIKey
-from mta_data.subway import get_service, get_union_square_trains, get_times_square_trains, get_station_trains
+from mta_data.subway import get_service, get_poller, get_broker, get_stations_trains_async, get_station_changes_async, get_station_trains_at_async, get_nearby_trains_async, get_trip_async, get_route_trains_async
 from typing import Optional, List, Dict, Any, Union
 from pydantic import BaseModel
 import os
 from dotenv import load_dotenv
 import logging
+import random
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import uuid
-from fastapi.responses import JSONResponse
+import asyncio
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from mta_data.response_cache import ResponseCache
+from mta_data import metrics
+from mta_data.logging_queue import configure_queued_logging
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
+# Configure logging; records are written to the console and api.log in
+# batches by a background thread so the event loop never blocks on I/O
+log_listener = configure_queued_logging(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler("api.log")
+        logging.FileHandler("api.log", delay=True)
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Fraction of successful requests written to the access log; errors are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1"))
+
 # Get API key from environment
 API_KEY = os.getenv("API_KEY")
 if not API_KEY:
@@ -36,7 +49,7 @@ if not API_KEY:
 class Station(BaseModel):
     id: str
     name: str
-    borough: str
+    borough: Optional[str] = None
     lines: List[str]
     description: Optional[str] = None
 
@@ -95,51 +108,98 @@ STATION_ID_MAPPING = {
     # Add more mappings as needed
 }
 
-# Map of station data fetch functions
-STATION_DATA_FUNCTIONS = {
-    "union-square": get_union_square_trains,
-    "times-square-42nd": get_times_square_trains,
-    # Other stations will use the generic function
-}
+def register_catalog_stations():
+    """Expose the stations loaded from the static GTFS catalog, if any."""
+    service = get_service()
+    for config_station_id in service.catalog_station_ids:
+        # Read from the catalog directly so no station config is decoded at startup
+        name, station_id, routes = service.catalog_station_summary(config_station_id)
+        STATIONS[station_id] = Station(id=station_id, name=name, lines=routes)
+        STATION_ID_MAPPING[station_id] = config_station_id
+    if service.catalog_station_ids:
+        logger.info(f"Registered {len(service.catalog_station_ids)} catalog stations")
+
+# Rendered station responses are reused within buckets of this many seconds;
+# minutes_away in a cached body is relative to the bucket's first render, so
+# buckets are a minute long by default, the resolution of minutes_away
+RESPONSE_BUCKET_SECONDS = int(os.getenv("RESPONSE_BUCKET_SECONDS", "60"))
+
+# Rendered station responses keyed by station, filters, feed contents and bucket
+response_cache = ResponseCache()
+
+# Seconds between keep-alive comments on idle arrival streams
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Maximum number of stations accepted by the batch trains endpoint
+MAX_BATCH_STATIONS = 25
+
+# Largest search radius, in meters, accepted by the nearby trains endpoint
+MAX_NEARBY_RADIUS = 5000
+
+# Add a Server-Timing header breaking each response down by stage (fetch, parse, extract, ...)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
 
-# Request ID middleware for tracking requests
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+# Request ID middleware for tracking requests, written as plain ASGI so it
+# adds no task or body-streaming overhead around each request
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
+        scope.setdefault("state", {})["request_id"] = request_id
         
         # Add request ID to logger context
         logger_context = {"request_id": request_id}
-        
-        # Log the incoming request
-        logger.info(
-            f"Request started: {request.method} {request.url.path}",
-            extra=logger_context
-        )
+        method = scope["method"]
+        path = scope["path"]
+        logger.debug(f"Request started: {method} {path}", extra=logger_context)
         
         start_time = time.time()
+        timing_token = metrics.start_request_timing() if SERVER_TIMING else None
+        
+        async def send_with_request_id(message: Message):
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                process_time = time.time() - start_time
+                
+                # Log the completed request, sampling successful ones
+                if status_code >= 500 or random.random() < ACCESS_LOG_SAMPLE_RATE:
+                    logger.info(
+                        f"Request completed: {method} {path} - Status: {status_code} - Duration: {process_time:.3f}s",
+                        extra=logger_context
+                    )
+                # Label by route template so IDs in the path don't explode the series
+                route = scope.get("route")
+                metrics.HTTP_REQUEST_SECONDS.labels(
+                    method, route.path if route is not None else "unmatched", status_code
+                ).observe(process_time)
+                
+                # Add request ID to response headers
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                if timing_token is not None:
+                    headers["Server-Timing"] = metrics.server_timing_header(
+                        metrics.current_request_timings(), total=process_time
+                    )
+            await send(message)
         
         try:
-            response = await call_next(request)
-            
-            # Log the completed request
-            process_time = time.time() - start_time
-            logger.info(
-                f"Request completed: {request.method} {request.url.path} - Status: {response.status_code} - Duration: {process_time:.3f}s",
-                extra=logger_context
-            )
-            
-            # Add request ID to response headers
-            response.headers["X-Request-ID"] = request_id
-            return response
-            
+            await self.app(scope, receive, send_with_request_id)
         except Exception as e:
             # Log any unhandled exceptions
             logger.exception(
-                f"Request failed: {request.method} {request.url.path} - Error: {str(e)}",
+                f"Request failed: {method} {path} - Error: {str(e)}",
                 extra=logger_context
             )
             raise
+        finally:
+            if timing_token is not None:
+                metrics.stop_request_timing(timing_token)
 
 # API Key security scheme
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -160,6 +220,20 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
         )
     return api_key_header
 
+# Register catalog stations and start the background feed poller with the app
+# so handlers only read snapshots
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    register_catalog_stations()
+    poller = None
+    if float(os.getenv("MTA_POLL_INTERVAL", "30")) > 0:
+        poller = get_poller()
+        poller.start()
+    yield
+    if poller is not None:
+        poller.stop(timeout=5)
+    get_service().close()
+
 # Create FastAPI app with metadata
 app = FastAPI(
     title="NYC MTA Station API",
@@ -168,6 +242,7 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
     responses={
         status.HTTP_401_UNAUTHORIZED: {"model": ErrorResponse},
         status.HTTP_403_FORBIDDEN: {"model": ErrorResponse},
@@ -207,7 +282,15 @@ async def root():
         "endpoints": [
             "/api/stations",
             "/api/stations/{station_id}",
-            "/api/stations/{station_id}/trains"
+            "/api/stations/{station_id}/trains",
+            "/api/stations/{station_id}/trains/changes?since={version}",
+            "/api/stations/{station_id}/trains/history?at={datetime}",
+            "/api/stations/{station_id}/trains/stream",
+            "/api/trains?stations={station_id},{station_id}",
+            "/api/nearby/trains?lat={lat}&lon={lon}",
+            "/api/trips/{trip_id}",
+            "/api/routes/{route_id}/trains",
+            "/api/metrics"
         ],
         "version": app.version
     }
@@ -220,8 +303,20 @@ async def health_check():
     
     Returns a 200 OK response if the service is healthy.
     """
-    # In a more complex app, you might check database connections, cache, etc.
-    return {"status": "healthy", "version": app.version}
+    # Report how fresh each feed snapshot is
+    return {"status": "healthy", "version": app.version, "feeds": get_service().feed_status()}
+
+# Metrics endpoint
+@app.get("/api/metrics", tags=["Health"], response_class=Response)
+async def get_metrics():
+    """
+    Prometheus metrics in the text exposition format.
+    
+    Covers upstream fetch latency, bytes and errors per feed, parse and index
+    time, extraction time per station, serialization time, feed age at serve
+    time, cache hit rates and request duration per route.
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Get all stations
 @app.get(
@@ -272,6 +367,93 @@ async def get_station(
     
     return STATIONS[station_id]
 
+# Query parameters shared by the train endpoints, pushed down to MTAService
+def train_filters(
+    line: Optional[str] = Query(None, description="Filter by line group: 456, nqrw, l, etc."),
+    routes: Optional[str] = Query(None, description="Comma-separated route IDs, e.g. 4,5"),
+    direction: Optional[str] = Query(None, description="Filter by direction: uptown, downtown, etc."),
+    max_minutes: Optional[int] = Query(None, ge=1, le=60, description="Only trains arriving within this many minutes"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Maximum number of trains returned"),
+) -> Dict[str, Any]:
+    return {
+        "line": line,
+        "routes": [r.strip().upper() for r in routes.split(",") if r.strip()] if routes else None,
+        "direction": direction,
+        "max_minutes": max_minutes,
+        "limit": limit,
+    }
+
+# Seconds between feed refreshes, used to tell clients how long a response stays fresh
+def feed_refresh_interval() -> float:
+    poll_interval = float(os.getenv("MTA_POLL_INTERVAL", "30"))
+    return poll_interval if poll_interval > 0 else get_service().feed_cache_ttl
+
+# Serve a station's trains from pre-rendered JSON, honouring If-None-Match
+async def render_station_trains(request: Request, config_station_id: str, filters: Dict[str, Any]) -> Response:
+    """
+    Render a station's train data once per (filters, feed contents, time bucket).
+    
+    The ETag is derived from those inputs, so a matching If-None-Match is
+    answered with 304 before anything is built or serialized. Feeds are
+    identified by the MTA's header timestamp (the body digest if there is
+    none) rather than this process's version numbers, so every worker
+    issues the same ETag for the same data.
+    """
+    service = get_service()
+    query = service.plan_station_query(config_station_id, **filters)
+    snapshots = await service.get_query_snapshots_async(query)
+    
+    now = time.time()
+    bucket = int(now // RESPONSE_BUCKET_SECONDS)
+    contents = tuple(
+        (url, snapshot.feed.timestamp or snapshot.digest, service.is_stale(snapshot)) if snapshot is not None else (url, None, None)
+        for url, snapshot in snapshots.items()
+    )
+    key = (
+        config_station_id,
+        tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(filters.items())),
+        contents,
+        bucket,
+    )
+    etag = response_cache.etag(key)
+    
+    # Fresh until the time bucket rolls over or the oldest feed is due for a refresh
+    max_age = (bucket + 1) * RESPONSE_BUCKET_SECONDS - now
+    refresh_interval = feed_refresh_interval()
+    for snapshot in snapshots.values():
+        if snapshot is not None:
+            max_age = min(max_age, refresh_interval - snapshot.age(now))
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={max(0, int(max_age))}"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    # Weak comparison, as If-None-Match requires
+    if etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        metrics.RESPONSE_CACHE_LOOKUPS.labels("not_modified").inc()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    def render() -> bytes:
+        result = service.build_station_result(query, snapshots)
+        with metrics.stage("serialize", metrics.RESPONSE_SERIALIZE_SECONDS, "station_trains"):
+            return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    # Building and serializing a large station takes milliseconds; keep it off the event loop
+    body = await asyncio.to_thread(response_cache.get_or_render, key, render)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Serialize a response body in a worker thread
+async def render_json(payload: Dict[str, Any], endpoint: str) -> Response:
+    """
+    Encode a JSON response off the event loop.
+    
+    Batch and nearby responses hold several full station results, and
+    encoding them on the loop would stall every other request meanwhile.
+    """
+    def render() -> bytes:
+        with metrics.stage("serialize", metrics.RESPONSE_SERIALIZE_SECONDS, endpoint):
+            return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    return Response(content=await asyncio.to_thread(render), media_type="application/json")
+
 # Get station train arrivals
 @app.get(
     "/api/stations/{station_id}/trains",
@@ -284,8 +466,9 @@ async def get_station(
     }
 )
 async def station_trains(
+    request: Request,
     station_id: str,
-    line: Optional[str] = Query(None, description="Filter by line group: 456, nqrw, l, etc."),
+    filters: Dict[str, Any] = Depends(train_filters),
     api_key: APIKey = Depends(get_api_key)
 ):
     """
@@ -294,8 +477,15 @@ async def station_trains(
     Path parameter:
     - station_id: The ID of the station
     
-    Query parameter:
-    - line: Optional filter by line group (456, nqrw, or l)
+    Query parameters (all optional):
+    - line: Filter by line group (456, nqrw, l, etc.); only that group's feeds are fetched
+    - routes: Comma-separated route IDs to include
+    - direction: Direction key such as uptown or downtown
+    - max_minutes: Only trains arriving within this many minutes
+    - limit: Maximum number of trains returned
+    
+    Responses carry an ETag and Cache-Control max-age tied to the feed
+    versions; send If-None-Match to get 304 Not Modified when unchanged.
     
     Authentication required:
     - API Key must be provided in the X-API-Key header
@@ -307,65 +497,393 @@ async def station_trains(
             detail=f"Station '{station_id}' not found"
         )
     
+    if station_id not in STATION_ID_MAPPING:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, 
+            detail=f"Train data for station '{station_id}' is not yet implemented"
+        )
+    
     try:
-        # Get train data for the station
-        if station_id in STATION_DATA_FUNCTIONS:
-            # Use dedicated function if available
-            result = STATION_DATA_FUNCTIONS[station_id]()
-        elif station_id in STATION_ID_MAPPING:
-            # Use generic function with mapped ID
-            config_station_id = STATION_ID_MAPPING[station_id]
-            result = get_station_trains(config_station_id)
-        else:
+        # Fetch the station's feeds concurrently and serve the pre-rendered body
+        return await render_station_trains(request, STATION_ID_MAPPING[station_id], filters)
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching train data for station {station_id}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+
+# Get changes to station train arrivals since a version
+@app.get(
+    "/api/stations/{station_id}/trains/changes",
+    tags=["Trains"],
+    summary="Get train arrival changes",
+    response_description="Arrivals added, removed or re-timed since the given version",
+    responses={
+        404: {"model": ErrorResponse},
+        501: {"model": ErrorResponse}
+    }
+)
+async def station_trains_changes(
+    station_id: str,
+    since: Optional[str] = Query(None, description="Version token from a previous response"),
+    filters: Dict[str, Any] = Depends(train_filters),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get what changed in a station's arrivals since a previous response.
+    
+    Pass the `version` from the last response as `since` to receive only the
+    trips added, removed or re-timed since then, keyed by trip ID. If the
+    server cannot answer from its history (first call, a token from another
+    server, or one that is too old), `reset` is true and `all_trains` holds
+    the full current arrivals. The line, routes and direction filters apply.
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    if station_id not in STATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Station '{station_id}' not found"
+        )
+    if station_id not in STATION_ID_MAPPING:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, 
+            detail=f"Train changes for station '{station_id}' are not yet implemented"
+        )
+    
+    try:
+        return await get_station_changes_async(STATION_ID_MAPPING[station_id], since, **filters)
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching train changes for station {station_id}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+
+# Get station train arrivals as of a past time, from the feed archive
+@app.get(
+    "/api/stations/{station_id}/trains/history",
+    tags=["Trains"],
+    summary="Get past train arrivals",
+    response_description="Train arrivals at the specified station as they were at the given time",
+    responses={
+        404: {"model": ErrorResponse},
+        501: {"model": ErrorResponse}
+    }
+)
+async def station_trains_history(
+    station_id: str,
+    at: datetime = Query(..., description="ISO 8601 date and time to answer for (server local time if no offset)"),
+    filters: Dict[str, Any] = Depends(train_filters),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get the train arrivals a station showed at a past time.
+    
+    Answers from the feed archive (`MTA_ARCHIVE_DIR`): each feed is read as
+    it was last fetched before `at`, and arrivals are counted from `at`.
+    Each feed reports when that version was fetched. Returns 404 when the
+    archive is disabled or holds no data for the station before `at`. The
+    line, routes, direction, max_minutes and limit filters apply.
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    if station_id not in STATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Station '{station_id}' not found"
+        )
+    if station_id not in STATION_ID_MAPPING:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, 
+            detail=f"Train history for station '{station_id}' is not yet implemented"
+        )
+    
+    try:
+        result = await get_station_trains_at_async(STATION_ID_MAPPING[station_id], at.timestamp(), **filters)
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching train history for station {station_id}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No archived train data for station '{station_id}' at {at.isoformat()}"
+        )
+    return result
+
+# Stream station train arrivals as Server-Sent Events
+@app.get(
+    "/api/stations/{station_id}/trains/stream",
+    tags=["Trains"],
+    summary="Stream train arrivals",
+    response_description="Server-Sent Events with the station's arrivals after every feed update",
+    responses={
+        404: {"model": ErrorResponse},
+        501: {"model": ErrorResponse}
+    }
+)
+async def station_trains_stream(
+    request: Request,
+    station_id: str,
+    filters: Dict[str, Any] = Depends(train_filters),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Stream upcoming train arrivals at the specified station.
+    
+    Sends an `arrivals` event with the current data on connect and another
+    whenever a feed the station uses publishes a new version. A client that
+    falls behind only receives the latest update. Accepts the same filters
+    as the trains endpoint.
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    if station_id not in STATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Station '{station_id}' not found"
+        )
+    if station_id not in STATION_ID_MAPPING:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, 
+            detail=f"Streaming for station '{station_id}' is not yet implemented"
+        )
+    
+    broker = get_broker()
+    
+    async def events():
+        # Subscribed on the first step, so a stream that never starts leaves nothing behind
+        subscription = broker.subscribe(STATION_ID_MAPPING[station_id], filters)
+        try:
+            message = await broker.current(subscription)
+            while not await request.is_disconnected():
+                if message is not None:
+                    yield f"event: arrivals\ndata: {message}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+                message = await subscription.next(timeout=STREAM_KEEPALIVE_SECONDS)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Get train arrivals for several stations at once
+@app.get(
+    "/api/trains",
+    tags=["Trains"],
+    summary="Get train arrivals for several stations",
+    response_description="Upcoming train arrivals keyed by station ID",
+    responses={
+        400: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+        501: {"model": ErrorResponse}
+    }
+)
+async def batch_trains(
+    stations: str = Query(..., description="Comma-separated station IDs, e.g. union-square,times-square-42nd"),
+    filters: Dict[str, Any] = Depends(train_filters),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get upcoming train arrivals for several stations in one request.
+    
+    Every feed needed by any of the requested stations is fetched once and
+    shared between them.
+    
+    Query parameters:
+    - stations: Comma-separated station IDs (at most 25)
+    - line, routes, direction, max_minutes, limit: Optional filters applied to each station
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    station_ids = list(dict.fromkeys(s.strip() for s in stations.split(",") if s.strip()))
+    if not station_ids or len(station_ids) > MAX_BATCH_STATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provide between 1 and {MAX_BATCH_STATIONS} station IDs"
+        )
+    
+    for station_id in station_ids:
+        if station_id not in STATIONS:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, 
+                detail=f"Station '{station_id}' not found"
+            )
+        if station_id not in STATION_ID_MAPPING:
             raise HTTPException(
                 status_code=status.HTTP_501_NOT_IMPLEMENTED, 
                 detail=f"Train data for station '{station_id}' is not yet implemented"
             )
+    
+    try:
+        batch = await get_stations_trains_async([STATION_ID_MAPPING[station_id] for station_id in station_ids], **filters)
+        results = {station_id: batch[STATION_ID_MAPPING[station_id]] for station_id in station_ids}
         
-        # Filter by line if requested
-        if line and line in result["lines"]:
-            filtered_result = {
-                "station": result["station"],
-                "timestamp": result["timestamp"],
-                "formatted_time": result["formatted_time"],
-                "lines": {line: result["lines"][line]},
-            }
-            
-            # Filter all_trains to only include specified line
-            if line == "456":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["4", "5", "6"]]
-            elif line == "nqrw":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["N", "Q", "R", "W"]]
-            elif line == "l":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] == "L"]
-            elif line == "123":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["1", "2", "3"]]
-            elif line == "ace":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["A", "C", "E"]]
-            elif line == "bdfm":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["B", "D", "F", "M"]]
-            elif line == "7":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] == "7"]
-            elif line == "g":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] == "G"]
-            elif line == "jz":
-                filtered_result["all_trains"] = [t for t in result["all_trains"] if t["route_id"] in ["J", "Z"]]
-                
-            return filtered_result
+        return await render_json({"stations": results}, "batch_trains")
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching train data for stations {station_ids}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+
+# Get train arrivals for the stations closest to a location
+@app.get(
+    "/api/nearby/trains",
+    tags=["Trains"],
+    summary="Get train arrivals near a location",
+    response_description="Upcoming train arrivals for the nearest stations, nearest first"
+)
+async def nearby_trains(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the location"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the location"),
+    radius: int = Query(800, ge=1, le=MAX_NEARBY_RADIUS, description="Search radius in meters"),
+    max_stations: int = Query(5, ge=1, le=MAX_BATCH_STATIONS, description="Maximum number of stations returned"),
+    filters: Dict[str, Any] = Depends(train_filters),
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get upcoming train arrivals for the stations closest to a location.
+    
+    Stations are found with an in-memory spatial index, and every feed they
+    need is fetched once and shared between them.
+    
+    Query parameters:
+    - lat, lon: Location to search around
+    - radius: Search radius in meters (default 800)
+    - max_stations: Maximum number of stations returned (default 5)
+    - line, routes, direction, max_minutes, limit: Optional filters applied to each station
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    station_ids = {config_station_id: station_id for station_id, config_station_id in STATION_ID_MAPPING.items()}
+    try:
+        nearby = await get_nearby_trains_async(lat, lon, radius, max_stations, **filters)
+        
+        results = []
+        for config_station_id, distance, result in nearby:
+            if config_station_id not in station_ids:
+                continue
+            station_id = station_ids[config_station_id]
+            results.append({
+                "station": STATIONS[station_id].model_dump(),
+                "distance_meters": round(distance),
+                "trains": result
+            })
         
-        return result
-    except HTTPException:
-        # Re-raise HTTP exceptions
-        raise
+        return await render_json({"stations": results}, "nearby_trains")
     except Exception as e:
         # Log the error
-        logger.error(f"Error fetching train data for station {station_id}: {str(e)}")
+        logger.error(f"Error fetching nearby train data for ({lat}, {lon}): {str(e)}")
         # Return a friendly error message
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error fetching train arrival data. Please try again later."
         )
 
+# Follow one train across stations
+@app.get(
+    "/api/trips/{trip_id}",
+    tags=["Trains"],
+    summary="Get the remaining stops of a train",
+    response_description="Remaining stops and ETAs for one trip",
+    responses={
+        404: {"model": ErrorResponse}
+    }
+)
+async def get_trip(
+    trip_id: str,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get every remaining stop and its ETA for one train.
+    
+    Path parameters:
+    - trip_id: The GTFS-realtime trip ID, as returned in station arrivals
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    try:
+        result = await get_trip_async(trip_id)
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching trip {trip_id}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+    
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Trip '{trip_id}' not found"
+        )
+    return result
+
+# List every active train on a line
+@app.get(
+    "/api/routes/{route_id}/trains",
+    tags=["Trains"],
+    summary="Get all active trains on a route",
+    response_description="Active trips on the route with their next and final stops",
+    responses={
+        404: {"model": ErrorResponse}
+    }
+)
+async def get_route_trains(
+    route_id: str,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Get every active train on a route, soonest next arrival first.
+    
+    Path parameters:
+    - route_id: The route ID, e.g. 6, L or Q
+    
+    Authentication required:
+    - API Key must be provided in the X-API-Key header
+    """
+    try:
+        result = await get_route_trains_async(route_id.upper())
+    except Exception as e:
+        # Log the error
+        logger.error(f"Error fetching trains for route {route_id}: {str(e)}")
+        # Return a friendly error message
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching train arrival data. Please try again later."
+        )
+    
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, 
+            detail=f"Route '{route_id}' not found"
+        )
+    return result
+
 # Run with Uvicorn when script is executed directly
 if __name__ == "__main__":
     import uvicorn
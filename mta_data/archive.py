@@ -0,0 +1,199 @@
+import bisect
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+import logging
+from typing import NamedTuple
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# fetched_at, offset into the segment, compressed length, payload digest
+INDEX_ENTRY = struct.Struct('=dQI8s')
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+
+def payload_digest(payload):
+    """Short digest used to skip archiving a payload identical to the previous one."""
+    return hashlib.blake2b(payload, digest_size=8).digest()
+
+
+class ArchiveEntry(NamedTuple):
+    """One archived payload of a feed: when it was fetched and where it is stored."""
+
+    fetched_at: float
+    segment: str
+    offset: int
+    length: int
+    digest: bytes
+
+
+class FeedArchive:
+    """Append-only, compressed archive of raw feed payloads, one directory per feed URL.
+
+    Changed payloads are appended to time-bucketed segment files, each with
+    a fixed-size index of (fetch time, offset, length, digest) entries.
+    Payloads are written before their index entries, so a crash at worst
+    leaves an unindexed tail that readers never see.
+    """
+
+    def __init__(self, directory, segment_seconds=3600, retention_seconds=None, compression_level=6):
+        """Archive into ``directory``, starting a new segment every ``segment_seconds``."""
+        self.directory = directory
+        self.segment_seconds = int(segment_seconds)
+        self.retention_seconds = retention_seconds
+        self.compression_level = compression_level
+        self._last_digests = {}
+        self._segment_starts = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def feed_directory(self, url):
+        """Return the directory holding the segments of a feed URL."""
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16])
+
+    def urls(self):
+        """Return the feed URLs that have an archive."""
+        urls = []
+        for name in sorted(os.listdir(self.directory)):
+            try:
+                with open(os.path.join(self.directory, name, 'url'), encoding='utf-8') as f:
+                    urls.append(f.read().strip())
+            except OSError:
+                continue
+        return urls
+
+    def segment_starts(self, url):
+        """Return the start times of a feed's segments, oldest first."""
+        try:
+            names = os.listdir(self.feed_directory(url))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-len(INDEX_SUFFIX)]) for name in names if name.endswith(INDEX_SUFFIX))
+
+    def _segment_path(self, url, start, suffix):
+        return os.path.join(self.feed_directory(url), f"{start:012d}{suffix}")
+
+    def append(self, url, payload, fetched_at=None):
+        """Archive ``payload`` unless it is identical to the feed's last archived one.
+
+        Returns True when the payload was written.
+        """
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        digest = payload_digest(payload)
+        with self._lock:
+            if url not in self._last_digests:
+                self._recover(url)
+            if self._last_digests.get(url) == digest:
+                return False
+
+            start = int(fetched_at // self.segment_seconds) * self.segment_seconds
+            if self._segment_starts.get(url) != start:
+                self._segment_starts[url] = start
+                self._expire(url, fetched_at)
+
+            data = zlib.compress(payload, self.compression_level)
+            segment = self._segment_path(url, start, SEGMENT_SUFFIX)
+            with open(segment, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            with open(self._segment_path(url, start, INDEX_SUFFIX), 'ab') as f:
+                # Drop a partial entry left by a crash so later entries stay aligned
+                torn = f.tell() % INDEX_ENTRY.size
+                if torn:
+                    f.truncate(f.tell() - torn)
+                    f.seek(0, os.SEEK_END)
+                f.write(INDEX_ENTRY.pack(fetched_at, offset, len(data), digest))
+            self._last_digests[url] = digest
+        return True
+
+    def _recover(self, url):
+        # Caller must hold self._lock; pick up the last digest written by an earlier run
+        directory = self.feed_directory(url)
+        os.makedirs(directory, exist_ok=True)
+        url_path = os.path.join(directory, 'url')
+        if not os.path.exists(url_path):
+            with open(url_path, 'w', encoding='utf-8') as f:
+                f.write(url + '\n')
+        self._last_digests[url] = None
+        for start in reversed(self.segment_starts(url)):
+            entries = self._read_index(url, start)
+            if entries:
+                self._last_digests[url] = entries[-1].digest
+                self._segment_starts[url] = start
+                return
+
+    def _expire(self, url, now):
+        # Caller must hold self._lock
+        if self.retention_seconds is None:
+            return
+        for start in self.segment_starts(url):
+            if start + self.segment_seconds >= now - self.retention_seconds:
+                break
+            for suffix in (INDEX_SUFFIX, SEGMENT_SUFFIX):
+                try:
+                    os.unlink(self._segment_path(url, start, suffix))
+                except FileNotFoundError:
+                    pass
+            logger.info(f"Expired archive segment {start} of feed {url}")
+
+    def _read_index(self, url, start):
+        try:
+            with open(self._segment_path(url, start, INDEX_SUFFIX), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        segment = self._segment_path(url, start, SEGMENT_SUFFIX)
+        # Ignore a partially written trailing entry
+        data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+        return [ArchiveEntry(fetched_at, segment, offset, length, digest)
+                for fetched_at, offset, length, digest in INDEX_ENTRY.iter_unpack(data)]
+
+    def entries(self, url, start=None, end=None):
+        """Return a feed's archived entries with ``start <= fetched_at < end``, oldest first."""
+        found = []
+        for segment_start in self.segment_starts(url):
+            if start is not None and segment_start + self.segment_seconds <= start:
+                continue
+            if end is not None and segment_start >= end:
+                break
+            found.extend(
+                entry for entry in self._read_index(url, segment_start)
+                if (start is None or entry.fetched_at >= start) and (end is None or entry.fetched_at < end)
+            )
+        return found
+
+    def entry_at(self, url, when):
+        """Return the entry that was current for a feed at Unix time ``when``, or None."""
+        starts = self.segment_starts(url)
+        for segment_start in reversed(starts[:bisect.bisect_right(starts, when)]):
+            entries = self._read_index(url, segment_start)
+            i = bisect.bisect_right([entry.fetched_at for entry in entries], when)
+            if i:
+                return entries[i - 1]
+        return None
+
+    def read(self, entry):
+        """Return the decompressed payload of an entry."""
+        with open(entry.segment, 'rb') as f:
+            f.seek(entry.offset)
+            return zlib.decompress(f.read(entry.length))
+
+
+class ReplayClock:
+    """A clock that runs from ``start`` at ``speed`` times real time, for replaying an archive."""
+
+    def __init__(self, start, speed=1.0):
+        """Start the replay at Unix time ``start``."""
+        self.start = start
+        self.speed = speed
+        self._started = time.monotonic()
+
+    def __call__(self):
+        return self.start + (time.monotonic() - self._started) * self.speed
@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+import logging
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Per-URL circuit breaker with exponential backoff for upstream feeds.
+
+    A URL's breaker opens after ``failure_threshold`` consecutive failed
+    loads. While it is open, ``allow`` refuses calls so callers fail fast
+    (and keep serving their last snapshot) instead of waiting on a broken
+    upstream. Once the backoff delay has passed, one call is let through
+    as a probe; a success closes the breaker, a failure reopens it for
+    twice as long, up to ``max_delay`` seconds.
+    """
+
+    def __init__(self, failure_threshold=3, base_delay=5.0, max_delay=300.0):
+        """Open after ``failure_threshold`` failures for ``base_delay`` seconds, doubling up to ``max_delay``."""
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def allow(self, url):
+        """Whether a call to ``url`` may go upstream now."""
+        with self._lock:
+            return time.time() >= self._open_until.get(url, 0.0)
+
+    def is_open(self, url):
+        """Whether ``url`` has failed enough that its data should be treated as stale."""
+        with self._lock:
+            return self._failures.get(url, 0) >= self.failure_threshold
+
+    def retry_at(self, url):
+        """Unix time after which ``url`` may be called again (0 when the breaker is closed)."""
+        with self._lock:
+            return self._open_until.get(url, 0.0)
+
+    def record_success(self, url):
+        """Close the breaker for ``url``."""
+        with self._lock:
+            failures = self._failures.pop(url, 0)
+            self._open_until.pop(url, None)
+        if failures >= self.failure_threshold:
+            logger.info(f"Circuit closed for feed {url} after {failures} failures")
+
+    def record_failure(self, url):
+        """Count a failed call to ``url``; returns True if this opened (or reopened) the breaker."""
+        with self._lock:
+            failures = self._failures[url] = self._failures.get(url, 0) + 1
+            if failures < self.failure_threshold:
+                return False
+            # Capped so a long outage can't overflow the float conversion
+            doublings = min(failures - self.failure_threshold, 32)
+            delay = min(self.max_delay, self.base_delay * 2 ** doublings)
+            # Jitter so the breakers of feeds that failed together don't retry in lockstep
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            self._open_until[url] = time.time() + delay
+        logger.warning(f"Circuit open for feed {url} after {failures} failures; retrying in {delay:.1f}s")
+        return True
+
+    def state(self, url):
+        """Return ``(state, retry_in_seconds)`` where state is closed, open or half-open."""
+        with self._lock:
+            failures = self._failures.get(url, 0)
+            retry_in = self._open_until.get(url, 0.0) - time.time()
+        if failures < self.failure_threshold:
+            return 'closed', 0.0
+        if retry_in > 0:
+            return 'open', retry_in
+        return 'half-open', 0.0
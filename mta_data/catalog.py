@@ -0,0 +1,285 @@
+import csv
+import importlib.util
+import io
+import marshal
+import os
+import re
+import struct
+import tempfile
+import time
+import zipfile
+import logging
+from collections.abc import Mapping
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MTAC'
+FORMAT_VERSION = 1
+
+# magic, format version, Python bytecode magic, source size, source mtime (ns)
+HEADER = struct.Struct('=4sI4sQQ')
+
+DIRECTIONS = {
+    'N': ('northbound', 'Northbound'),
+    'S': ('southbound', 'Southbound'),
+}
+
+
+def _rows(archive, name):
+    """Stream the rows of a CSV member of a GTFS zip as dicts."""
+    with archive.open(name) as raw:
+        yield from csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+
+
+def slugify(value):
+    """Turn a station name into a URL-friendly slug."""
+    return re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')
+
+
+def build_catalog(zip_path):
+    """Compile a static GTFS zip into the columnar catalog payload.
+
+    Reads ``stops.txt`` for parent stations and their platforms,
+    ``transfers.txt`` (if present) to merge station complexes, ``trips.txt``
+    for each trip's route, and streams ``stop_times.txt`` row by row to find
+    which routes serve which platforms without holding the file in memory.
+    """
+    started = time.monotonic()
+    strings = {}
+
+    def intern(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    with zipfile.ZipFile(zip_path) as archive:
+        members = set(archive.namelist())
+
+        parents = {}
+        platform_parent = {}
+        for row in _rows(archive, 'stops.txt'):
+            stop_id = row['stop_id']
+            parent_id = row.get('parent_station') or ''
+            if parent_id:
+                platform_parent[stop_id] = parent_id
+            else:
+                parents[stop_id] = (row.get('stop_name', stop_id), float(row.get('stop_lat') or 0), float(row.get('stop_lon') or 0))
+
+        # Union-find over transfers between different stations (complexes)
+        complex_root = {stop_id: stop_id for stop_id in parents}
+
+        def find(stop_id):
+            while complex_root[stop_id] != stop_id:
+                complex_root[stop_id] = complex_root[complex_root[stop_id]]
+                stop_id = complex_root[stop_id]
+            return stop_id
+
+        if 'transfers.txt' in members:
+            for row in _rows(archive, 'transfers.txt'):
+                a = platform_parent.get(row['from_stop_id'], row['from_stop_id'])
+                b = platform_parent.get(row['to_stop_id'], row['to_stop_id'])
+                if a != b and a in complex_root and b in complex_root:
+                    root_a, root_b = find(a), find(b)
+                    if root_a != root_b:
+                        complex_root[max(root_a, root_b)] = min(root_a, root_b)
+
+        trip_routes = {}
+        for row in _rows(archive, 'trips.txt'):
+            trip_routes[row['trip_id']] = intern(row['route_id'])
+
+        # Stream stop_times.txt: only the distinct (platform, route) pairs are kept
+        served = set()
+        with archive.open('stop_times.txt') as raw:
+            reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+            header = next(reader)
+            trip_column, stop_column = header.index('trip_id'), header.index('stop_id')
+            last_trip, route = None, None
+            for row in reader:
+                trip_id = row[trip_column]
+                if trip_id != last_trip:
+                    last_trip, route = trip_id, trip_routes.get(trip_id)
+                if route is not None:
+                    served.add((row[stop_column], route))
+        del trip_routes
+
+    complexes = {}
+    for platform_id, route in served:
+        parent_id = platform_parent.get(platform_id, platform_id)
+        if parent_id not in parents:
+            continue
+        platforms, routes = complexes.setdefault(find(parent_id), ({}, set()))
+        platforms.setdefault(platform_id, set()).add(route)
+        routes.add(route)
+
+    # Columnar payload: parallel lists of interned strings and coordinates
+    station_roots, station_names, station_lats, station_lons = [], [], [], []
+    station_platforms, station_routes = [], []
+    for root_id in sorted(complexes):
+        platforms, routes = complexes[root_id]
+        name, lat, lon = parents[root_id]
+        station_roots.append(intern(root_id))
+        station_names.append(intern(name))
+        station_lats.append(lat)
+        station_lons.append(lon)
+        station_platforms.append(tuple(sorted(intern(p) for p in platforms)))
+        station_routes.append(tuple(sorted(routes)))
+
+    logger.info(f"Built station catalog with {len(station_roots)} stations from {zip_path} "
+                f"in {time.monotonic() - started:.2f}s")
+    return {
+        'strings': sorted(strings, key=strings.get),
+        'roots': station_roots,
+        'names': station_names,
+        'lats': station_lats,
+        'lons': station_lons,
+        'platforms': station_platforms,
+        'routes': station_routes,
+    }
+
+
+class StationCatalog:
+    """Stations compiled from static GTFS, decoded into config entries on demand."""
+
+    def __init__(self, payload):
+        """Wrap a payload produced by ``build_catalog``."""
+        self._payload = payload
+        self._strings = payload['strings']
+        self._configs = {}
+
+    def __len__(self):
+        return len(self._payload['roots'])
+
+    def station_ids(self):
+        """Return the config IDs of every station, e.g. ``gtfs_635``."""
+        return ['gtfs_' + self._strings[root] for root in self._payload['roots']]
+
+    def platform_ids(self, index):
+        """Return the platform stop IDs of the station at ``index``."""
+        return [self._strings[p] for p in self._payload['platforms'][index]]
+
+    def location(self, index):
+        """Return ``(lat, lon)`` of the station at ``index``."""
+        return self._payload['lats'][index], self._payload['lons'][index]
+
+    def summary(self, index):
+        """Return ``(display_name, slug, routes)`` of the station at ``index`` without building its config."""
+        payload = self._payload
+        strings = self._strings
+        name = strings[payload['names'][index]]
+        slug = f"{slugify(name)}-{strings[payload['roots'][index]].lower()}"
+        return name, slug, [strings[r] for r in payload['routes'][index]]
+
+    def station_config(self, index, feed_to_routes):
+        """Return the ``STATIONS`` config entry for the station at ``index``.
+
+        Line groups follow ``FEED_TO_ROUTES``: one group per feed that
+        carries any of the station's routes.
+        """
+        config = self._configs.get(index)
+        if config is not None:
+            return config
+
+        name, slug, routes = self.summary(index)
+        platforms = self.platform_ids(index)
+        lat, lon = self.location(index)
+
+        directions = {}
+        for platform_id in platforms:
+            key, display_name = DIRECTIONS.get(platform_id[-1:], ('other', 'Other'))
+            direction = directions.setdefault(key, {"display_name": display_name, "stop_id_keys": []})
+            direction["stop_id_keys"].append(platform_id)
+
+        line_groups = {}
+        for feed_id, feed_routes in feed_to_routes.items():
+            group_routes = [route for route in feed_routes if route in routes]
+            if group_routes:
+                line_groups[feed_id] = {
+                    "display_name": f"{'/'.join(group_routes)} Trains",
+                    "routes": group_routes
+                }
+
+        config = self._configs[index] = {
+            "DISPLAY_NAME": name,
+            "SLUG": slug,
+            "LAT": lat,
+            "LON": lon,
+            "STOP_IDS": {platform_id: platform_id for platform_id in platforms},
+            "LINE_GROUPS": line_groups,
+            "DIRECTIONS": directions,
+            "ROUTES": routes
+        }
+        return config
+
+
+class LazyMapping(Mapping):
+    """Read-only mapping over fixed keys whose values are built by ``factory(key)`` on first lookup."""
+
+    def __init__(self, keys, factory):
+        """Map each of ``keys`` to ``factory(key)``, built when first looked up."""
+        self._keys = dict.fromkeys(keys)
+        self._factory = factory
+        self._values = {}
+
+    def __getitem__(self, key):
+        value = self._values.get(key)
+        if value is None:
+            if key not in self._keys:
+                raise KeyError(key)
+            # Two threads may build the same value; the first one stored wins
+            value = self._values.setdefault(key, self._factory(key))
+        return value
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _fingerprint(zip_path):
+    stat = os.stat(zip_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_catalog(zip_path, cache_path=None):
+    """Load the station catalog for a static GTFS zip, rebuilding its cache only when the zip changed.
+
+    The cache (``<zip>.catalog`` by default) is a small header recording the
+    zip's size and mtime followed by the marshalled columnar payload, so a
+    warm start is a single read.
+    """
+    cache_path = cache_path or zip_path + '.catalog'
+    size, mtime_ns = _fingerprint(zip_path)
+
+    try:
+        with open(cache_path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) == HEADER.size:
+                magic, format_version, py_magic, cached_size, cached_mtime = HEADER.unpack(header)
+                if (magic == MAGIC and format_version == FORMAT_VERSION
+                        and py_magic == importlib.util.MAGIC_NUMBER
+                        and (cached_size, cached_mtime) == (size, mtime_ns)):
+                    return StationCatalog(marshal.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable station catalog cache {cache_path}: {str(e)}")
+
+    payload = build_catalog(zip_path)
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, importlib.util.MAGIC_NUMBER, size, mtime_ns))
+            marshal.dump(payload, f)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        os.unlink(tmp_path)
+        logger.warning(f"Could not write station catalog cache {cache_path}: {str(e)}")
+    return StationCatalog(payload)
@@ -0,0 +1,239 @@
+import threading
+import time
+import uuid
+from array import array
+from collections import deque
+from typing import FrozenSet, NamedTuple, Optional
+import logging
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Change kinds, stored as one byte per change
+ADDED, REMOVED, CHANGED = 0, 1, 2
+CHANGE_NAMES = ('added', 'removed', 'changed')
+
+
+class ArrivalChange(NamedTuple):
+    """One difference between two versions of a feed at a stop."""
+
+    change: str  # 'added', 'removed' or 'changed'
+    stop_id: str
+    trip_id: str
+    route_id: str
+    arrival_time: Optional[int]
+    previous_arrival_time: Optional[int] = None
+    track: Optional[str] = None
+
+
+class StopChanges:
+    """The changes at one stop between two feed versions, stored column-wise.
+
+    Kinds are bytes and times are packed arrays (0 for none); trip, route
+    and track IDs are references to the feed index's interned strings.
+    ``ArrivalChange`` tuples are only created when a reader iterates.
+    """
+
+    __slots__ = ('stop_id', 'kinds', 'trip_ids', 'route_ids', 'arrival_times', 'previous_times', 'tracks')
+
+    def __init__(self, stop_id):
+        self.stop_id = stop_id
+        self.kinds = bytearray()
+        self.trip_ids = []
+        self.route_ids = []
+        self.arrival_times = array('q')
+        self.previous_times = array('q')
+        self.tracks = []
+
+    def add(self, kind, trip_id, route_id, arrival_time, previous_time, track):
+        """Append one change; times are 0 when absent."""
+        self.kinds.append(kind)
+        self.trip_ids.append(trip_id)
+        self.route_ids.append(route_id)
+        self.arrival_times.append(arrival_time)
+        self.previous_times.append(previous_time)
+        self.tracks.append(track)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __iter__(self):
+        for i, kind in enumerate(self.kinds):
+            yield ArrivalChange(
+                CHANGE_NAMES[kind], self.stop_id, self.trip_ids[i], self.route_ids[i],
+                self.arrival_times[i] or None, self.previous_times[i] or None, self.tracks[i]
+            )
+
+
+class FeedDiff(NamedTuple):
+    """The changes a new feed version made, tagged with a change-log sequence number.
+
+    ``changes`` maps stop_id to ``StopChanges`` for the stops in ``stops``
+    that changed; it is None for the first version seen of a feed, which
+    has no predecessor to diff against.
+    """
+
+    sequence: int
+    url: str
+    version: int
+    changes: Optional[dict]
+    stops: FrozenSet[str] = frozenset()
+    size: int = 0
+
+
+def diff_stop(old, new, stop_id):
+    """Diff one stop's arrivals in two FeedIndex versions; None if nothing changed."""
+    before = {a.trip_id: a for a in old.arrivals(stop_id)}
+    after = {a.trip_id: a for a in new.arrivals(stop_id)}
+    changes = StopChanges(stop_id)
+    for trip_id, arrival in after.items():
+        previous = before.get(trip_id)
+        if previous is None:
+            changes.add(ADDED, trip_id, arrival.route_id, arrival.arrival_time, 0, arrival.track)
+        elif previous.arrival_time != arrival.arrival_time or previous.track != arrival.track:
+            changes.add(CHANGED, trip_id, arrival.route_id, arrival.arrival_time,
+                        previous.arrival_time, arrival.track)
+    for trip_id, previous in before.items():
+        if trip_id not in after:
+            changes.add(REMOVED, trip_id, previous.route_id, 0, previous.arrival_time, previous.track)
+    return changes if changes else None
+
+
+def diff_feed_indexes(old, new, stop_ids=None):
+    """Diff two FeedIndex versions, keyed by (stop_id, trip_id).
+
+    Only ``stop_ids`` are compared when given. Returns ``{stop_id:
+    StopChanges}`` for stops with added trips, removed trips or trips whose
+    arrival time or track changed.
+    """
+    if stop_ids is None:
+        stop_ids = old.stop_ids() | new.stop_ids()
+    changes = {}
+    for stop_id in stop_ids:
+        stop_changes = diff_stop(old, new, stop_id)
+        if stop_changes is not None:
+            changes[stop_id] = stop_changes
+    return changes
+
+
+class ChangeLog:
+    """Bounded history of per-version feed diffs for the stops clients follow.
+
+    Registered as a FeedCache listener, it numbers every new feed version
+    and diffs it against the previous one, but only at stops a client has
+    asked for changes at in the last ``idle_after`` seconds. With nobody
+    reading, recording a version costs nothing. A stop's history starts
+    when it is first asked for, so tokens from before then are answered
+    with a reset, as are tokens older than the retained history.
+
+    History is capped at ``max_diffs`` versions and ``max_changes``
+    changes in total, whichever is reached first. Version tokens handed to
+    clients are ``<epoch>-<sequence>``; the epoch is random per process, so
+    a token from another worker or an earlier run is detected and the
+    client is told to reset instead of receiving an incomplete delta.
+    """
+
+    def __init__(self, max_diffs=500, max_changes=100000, idle_after=600):
+        """Keep at most ``max_diffs`` feed diffs holding ``max_changes`` changes."""
+        self.epoch = uuid.uuid4().hex[:8]
+        self.idle_after = idle_after
+        self._sequence = 0
+        self._evicted_through = 0
+        self._diffs = deque()
+        self._size = 0
+        self._max_diffs = max_diffs
+        self._max_changes = max_changes
+        # stop_id -> last time a client asked for changes there
+        self._watched = {}
+        # Frozen copy of the watched stops, shared by every diff until they change
+        self._watched_view = frozenset()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Token identifying the latest recorded change."""
+        with self._lock:
+            return f"{self.epoch}-{self._sequence}"
+
+    @property
+    def change_count(self):
+        """Number of changes currently retained."""
+        with self._lock:
+            return self._size
+
+    def watched_stops(self, now=None):
+        """Return the stops read within ``idle_after`` seconds, forgetting the others."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            idle = [stop_id for stop_id, read_at in self._watched.items() if now - read_at > self.idle_after]
+            if idle:
+                for stop_id in idle:
+                    del self._watched[stop_id]
+                self._watched_view = frozenset(self._watched)
+            return self._watched_view
+
+    def record(self, snapshot, previous):
+        """Diff a newly published snapshot against its predecessor at the watched stops."""
+        if previous is not None and previous.version == snapshot.version:
+            return
+        changes = None
+        stop_ids = frozenset()
+        if previous is not None:
+            stop_ids = self.watched_stops()
+            changes = {}
+            if stop_ids:
+                try:
+                    changes = diff_feed_indexes(previous.feed, snapshot.feed, stop_ids)
+                except Exception as e:
+                    logger.error(f"Error diffing feed {snapshot.url}: {str(e)}")
+                    changes = None
+        size = sum(len(stop_changes) for stop_changes in changes.values()) if changes else 0
+
+        with self._lock:
+            self._sequence += 1
+            self._diffs.append(FeedDiff(self._sequence, snapshot.url, snapshot.version, changes, stop_ids, size))
+            self._size += size
+            while len(self._diffs) > self._max_diffs or (self._size > self._max_changes and len(self._diffs) > 1):
+                evicted = self._diffs.popleft()
+                self._size -= evicted.size
+                self._evicted_through = evicted.sequence
+
+    def _parse(self, token):
+        epoch, _, sequence = (token or '').partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def changes_since(self, token, urls, stops, routes=None):
+        """Return ``(reset, changes, version)`` for a station since ``token``.
+
+        ``changes`` lists the ArrivalChanges at ``stops`` (optionally only
+        for ``routes``) in feeds ``urls``, oldest first. ``reset`` is True
+        when the history cannot answer the token and the client must reload
+        the full arrivals. Asking starts (or extends) the history of
+        ``stops``; versions recorded before a stop was watched can't answer
+        for it.
+        """
+        now = time.time()
+        with self._lock:
+            version = f"{self.epoch}-{self._sequence}"
+            watched = len(self._watched)
+            for stop_id in stops:
+                self._watched[stop_id] = now
+            if len(self._watched) != watched:
+                self._watched_view = frozenset(self._watched)
+            since = self._parse(token)
+            if since is None or since > self._sequence or since < self._evicted_through:
+                return True, [], version
+            diffs = [diff for diff in self._diffs if diff.sequence > since and diff.url in urls]
+
+        changes = []
+        for diff in diffs:
+            if diff.changes is None or not diff.stops.issuperset(stops):
+                return True, [], version
+            for stop_id in stops:
+                for change in diff.changes.get(stop_id, ()):
+                    if routes is None or change.route_id in routes:
+                        changes.append(change)
+        return False, changes, version
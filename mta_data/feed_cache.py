@@ -0,0 +1,225 @@
+import threading
+import time
+import logging
+from dataclasses import dataclass, replace
+from typing import Any, NamedTuple, Optional
+
+from mta_data.metrics import FEED_CACHE_LOOKUPS
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+# Returned by a loader when the upstream feed has not changed since the last load
+NOT_MODIFIED = object()
+
+
+class FeedLoad(NamedTuple):
+    """A freshly loaded feed, its validators and, when republished from elsewhere, its version."""
+
+    feed: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: Optional[str] = None
+    version: Optional[int] = None
+    fetched_at: Optional[float] = None
+    restored: bool = False
+
+
+@dataclass(frozen=True)
+class FeedSnapshot:
+    """An immutable, versioned view of one parsed feed; ``restored`` if read back from disk."""
+
+    url: str
+    version: int
+    fetched_at: float
+    feed: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: Optional[str] = None
+    restored: bool = False
+
+    def age(self, now=None):
+        """Seconds since this snapshot was fetched."""
+        return (now if now is not None else time.time()) - self.fetched_at
+
+
+class FeedCache:
+    """Shared cache of parsed GTFS-rt feeds keyed by feed URL.
+
+    Concurrent misses share one load and stale hits are served while a
+    background thread refreshes them. ``loader(url, previous)`` returns a
+    ``FeedLoad``, ``NOT_MODIFIED`` or None on failure.
+    """
+
+    def __init__(self, loader, ttl=30):
+        """Create a cache that fills itself by calling ``loader(url, previous)``."""
+        self.loader = loader
+        self.ttl = ttl
+        self.managed = False
+        self._snapshots = {}
+        self._inflight = {}
+        self._requested = {}
+        self._demand_sources = []
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Call ``listener(snapshot, previous)`` whenever a snapshot is published."""
+        self._listeners.append(listener)
+
+    def get(self, url):
+        """Return the parsed feed for ``url``, loading it if needed."""
+        snapshot = self.get_snapshot(url)
+        return snapshot.feed if snapshot is not None else None
+
+    def get_snapshot(self, url):
+        """Return the latest snapshot for ``url``, loading it if needed."""
+        self._requested[url] = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(url)
+            if snapshot is not None:
+                return self._serve(url, snapshot)
+
+            event = self._inflight.get(url)
+            leader = event is None
+            if leader:
+                event = self._start_load(url, background=False)
+
+        FEED_CACHE_LOOKUPS.labels('miss' if leader else 'coalesced').inc()
+        if leader:
+            self._load(url, event)
+        else:
+            event.wait()
+
+        return self.peek(url)
+
+    def lookup(self, url):
+        """Return the latest snapshot for ``url`` like ``get_snapshot``, but None on a miss instead of loading."""
+        self._requested[url] = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(url)
+            if snapshot is not None:
+                return self._serve(url, snapshot)
+        return None
+
+    def _serve(self, url, snapshot):
+        # Caller must hold self._lock
+        if snapshot.age() < self.ttl and not snapshot.restored:
+            FEED_CACHE_LOOKUPS.labels('hit').inc()
+        else:
+            FEED_CACHE_LOOKUPS.labels('stale').inc()
+            if not self.managed and url not in self._inflight:
+                self._start_load(url, background=True)
+        return snapshot
+
+    def refresh(self, url):
+        """Load ``url`` now (or join a load in flight) and return its snapshot."""
+        with self._lock:
+            event = self._inflight.get(url)
+            leader = event is None
+            if leader:
+                event = self._start_load(url, background=False)
+
+        if leader:
+            self._load(url, event)
+        else:
+            event.wait()
+
+        return self.peek(url)
+
+    def seed(self, url, loaded):
+        """Publish ``loaded`` (a ``FeedLoad``) for ``url`` unless a snapshot already exists."""
+        with self._lock:
+            if url in self._snapshots:
+                return None
+            published = self._publish(url, loaded)
+        self._notify(published, None)
+        return published
+
+    def add_demand_source(self, source):
+        """Count the URLs returned by ``source()`` as in demand, e.g. those with open streams."""
+        self._demand_sources.append(source)
+
+    def in_demand(self, url, within):
+        """Whether ``url`` was read in the last ``within`` seconds or a demand source wants it."""
+        requested = self._requested.get(url)
+        if requested is not None and time.monotonic() - requested < within:
+            return True
+        return any(url in source() for source in self._demand_sources)
+
+    def peek(self, url):
+        """Return the latest snapshot for ``url`` without triggering a load."""
+        with self._lock:
+            return self._snapshots.get(url)
+
+    def snapshots(self):
+        """Return a copy of the latest snapshot for every cached URL."""
+        with self._lock:
+            return dict(self._snapshots)
+
+    def invalidate(self, url=None):
+        """Drop one cached URL, or every snapshot when ``url`` is None."""
+        with self._lock:
+            if url is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(url, None)
+
+    def _start_load(self, url, background):
+        # Caller must hold self._lock
+        event = threading.Event()
+        self._inflight[url] = event
+        if background:
+            threading.Thread(
+                target=self._load, args=(url, event),
+                name=f"feed-refresh-{url}", daemon=True
+            ).start()
+        return event
+
+    def _load(self, url, event):
+        previous = self.peek(url)
+        try:
+            loaded = self.loader(url, previous)
+        except Exception as e:
+            logger.error(f"Error loading feed {url}: {str(e)}")
+            loaded = None
+
+        published = None
+        with self._lock:
+            previous = self._snapshots.get(url)
+            if loaded is NOT_MODIFIED:
+                if previous is not None:
+                    published = replace(previous, fetched_at=time.time(), restored=False)
+                    self._snapshots[url] = published
+            # Keep serving the previous snapshot if the refresh failed
+            elif loaded is not None and loaded.feed is not None:
+                published = self._publish(url, loaded)
+            self._inflight.pop(url, None)
+        event.set()
+
+        if published is not None:
+            self._notify(published, previous)
+
+    def _publish(self, url, loaded):
+        # Caller must hold self._lock
+        previous = self._snapshots.get(url)
+        if loaded.version is not None:
+            version = loaded.version
+        else:
+            version = previous.version + 1 if previous is not None else 1
+        published = FeedSnapshot(
+            url, version, loaded.fetched_at or time.time(), loaded.feed,
+            etag=loaded.etag, last_modified=loaded.last_modified,
+            digest=loaded.digest, restored=loaded.restored
+        )
+        self._snapshots[url] = published
+        return published
+
+    def _notify(self, published, previous):
+        for listener in self._listeners:
+            try:
+                listener(published, previous)
+            except Exception as e:
+                logger.error(f"Error in feed listener for {published.url}: {str(e)}")
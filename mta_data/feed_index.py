@@ -0,0 +1,231 @@
+import bisect
+import heapq
+import time
+from array import array
+from operator import attrgetter
+from typing import NamedTuple, Optional
+
+
+class Arrival(NamedTuple):
+    """One upcoming arrival of a trip at a stop."""
+
+    arrival_time: int
+    stop_id: str
+    route_id: str
+    trip_id: str
+    track: Optional[str] = None
+
+
+arrival_time_key = attrgetter('arrival_time')
+
+# Stored in the track column for arrivals without a track
+NO_TRACK = -1
+
+# Sort keys pack a small index above a Unix timestamp into a single int
+_KEY_SHIFT = 40
+
+
+class FeedIndex:
+    """All arrivals in one feed version, grouped by stop_id and sorted by time.
+
+    Arrivals are stored as parallel columns over an interned string table,
+    with a trip-major ordering built alongside; ``Arrival`` tuples are only
+    created for the arrivals a query returns.
+    """
+
+    __slots__ = ('timestamp', '_strings', '_stop_ids', '_stops', '_stop_starts', '_stop_counts',
+                 '_times', '_route_column', '_trip_column', '_tracks',
+                 '_trip_codes', '_trip_starts', '_trip_order', '_trips', '_routes', '_count')
+
+    def __init__(self, strings, stop_ids, stop_starts, stop_counts, times, route_column, trip_column,
+                 tracks, trip_codes, trip_starts, trip_order, timestamp=0):
+        """Wrap stop-major arrival columns (see ``columns``) and their trip-major ordering (see ``trip_columns``)."""
+        self.timestamp = timestamp
+        self._strings = strings
+        self._stop_ids = stop_ids
+        self._stops = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+        self._stop_starts = stop_starts
+        self._stop_counts = stop_counts
+        self._times = times
+        self._route_column = route_column
+        self._trip_column = trip_column
+        self._tracks = tracks
+        self._trip_codes = trip_codes
+        self._trip_starts = trip_starts
+        self._trip_order = trip_order
+        self._count = len(times)
+        self._trips = {}
+        self._routes = {}
+        for j, code in enumerate(trip_codes):
+            trip_id = self._string(code)
+            self._trips[trip_id] = j
+            route_id = self._string(route_column[trip_order[trip_starts[j]]])
+            self._routes.setdefault(route_id, []).append(trip_id)
+
+    @classmethod
+    def build(cls, feed, routes=None, track_decoder=None):
+        """Index every stop time update in ``feed``.
+
+        Only trips whose route is in ``routes`` are kept when it is given.
+        ``track_decoder(stop_time_update)`` extracts the NYCT track, if any.
+        """
+        strings = {}
+        stops = {}
+        stop_column = array('I')
+        times = array('q')
+        route_column = array('I')
+        trip_column = array('I')
+        tracks = array('i')
+
+        def intern(value):
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            return index
+
+        for entity in feed.entity:
+            if not entity.HasField('trip_update'):
+                continue
+
+            trip_update = entity.trip_update
+            trip = trip_update.trip
+            route_id = trip.route_id
+            if not route_id or (routes is not None and route_id not in routes):
+                continue
+
+            route_code = intern(route_id)
+            trip_code = intern(trip.trip_id)
+            for stop in trip_update.stop_time_update:
+                arrival_time = stop.arrival.time
+                if not arrival_time:
+                    continue
+                stop_id = stop.stop_id
+                stop_code = stops.get(stop_id)
+                if stop_code is None:
+                    stop_code = stops[stop_id] = len(stops)
+                track = track_decoder(stop) if track_decoder else None
+                stop_column.append(stop_code)
+                times.append(arrival_time)
+                route_column.append(route_code)
+                trip_column.append(trip_code)
+                tracks.append(intern(track) if track else NO_TRACK)
+
+        # Reorder the records stop by stop, each stop's run by arrival time
+        count = len(times)
+        keys = [(stop_code << _KEY_SHIFT) + arrival_time for stop_code, arrival_time in zip(stop_column, times)]
+        order = sorted(range(count), key=keys.__getitem__)
+        stop_counts = array('I', bytes(4 * len(stops)))
+        for stop_code in stop_column:
+            stop_counts[stop_code] += 1
+        stop_starts = array('I')
+        start = 0
+        for stop_count in stop_counts:
+            stop_starts.append(start)
+            start += stop_count
+        position = array('I', bytes(4 * count))
+        for new_position, record in enumerate(order):
+            position[record] = new_position
+
+        # Order the same records trip by trip; trip codes are interned in feed order
+        keys = [(trip_code << _KEY_SHIFT) + arrival_time for trip_code, arrival_time in zip(trip_column, times)]
+        by_trip = sorted(range(count), key=keys.__getitem__)
+        del keys
+        trip_codes = array('I')
+        trip_starts = array('I')
+        for i, record in enumerate(by_trip):
+            if not trip_codes or trip_column[record] != trip_codes[-1]:
+                trip_codes.append(trip_column[record])
+                trip_starts.append(i)
+
+        return cls(
+            list(strings), list(stops), stop_starts, stop_counts,
+            array('q', [times[i] for i in order]),
+            array('I', [route_column[i] for i in order]),
+            array('I', [trip_column[i] for i in order]),
+            array('i', [tracks[i] for i in order]),
+            trip_codes, trip_starts,
+            array('I', [position[i] for i in by_trip]),
+            timestamp=feed.header.timestamp
+        )
+
+    def __len__(self):
+        return self._count
+
+    def _string(self, index):
+        return self._strings[index]
+
+    def string_table(self):
+        """Return every interned route, trip and track string, in code order."""
+        return self._strings
+
+    def columns(self):
+        """Return ``(stop_ids, stop_starts, stop_counts, times, route_column, trip_column, tracks)``.
+
+        Stop ``i`` owns ``stop_counts[i]`` records from ``stop_starts[i]``, in time order.
+        """
+        return (self._stop_ids, self._stop_starts, self._stop_counts, self._times,
+                self._route_column, self._trip_column, self._tracks)
+
+    def trip_columns(self):
+        """Return ``(trip_codes, trip_starts, trip_order)``, the trip-major ordering of the records.
+
+        Trip ``j`` owns ``trip_order`` from ``trip_starts[j]`` up to the next trip's start, in time order.
+        """
+        return self._trip_codes, self._trip_starts, self._trip_order
+
+    def _arrival(self, stop_id, position):
+        track = self._tracks[position]
+        return Arrival(
+            self._times[position], stop_id,
+            self._string(self._route_column[position]), self._string(self._trip_column[position]),
+            self._string(track) if track != NO_TRACK else None
+        )
+
+    def _stop_at(self, position):
+        return self._stop_ids[bisect.bisect_right(self._stop_starts, position) - 1]
+
+    def stop_ids(self):
+        """Return the stop IDs that have at least one arrival."""
+        return self._stops.keys()
+
+    def stop_arrivals(self):
+        """Yield ``(stop_id, arrivals)`` for every stop, arrivals in time order."""
+        for stop_id, i in self._stops.items():
+            base = self._stop_starts[i]
+            yield stop_id, [self._arrival(stop_id, p) for p in range(base, base + self._stop_counts[i])]
+
+    def trip_ids(self):
+        """Return the IDs of the trips that have at least one arrival."""
+        return self._trips.keys()
+
+    def trip(self, trip_id):
+        """Return a trip's remaining arrivals in time order, or None if it isn't in the feed."""
+        j = self._trips.get(trip_id)
+        if j is None:
+            return None
+        start = self._trip_starts[j]
+        end = self._trip_starts[j + 1] if j + 1 < len(self._trip_starts) else self._count
+        return [self._arrival(self._stop_at(p), p) for p in self._trip_order[start:end]]
+
+    def route_trips(self, route_id):
+        """Return ``[(trip_id, arrivals)]`` for every trip on a route, in feed order."""
+        return [(trip_id, self.trip(trip_id)) for trip_id in self._routes.get(route_id, ())]
+
+    def arrivals(self, stop_id, start=None, end=None):
+        """Return a stop's arrivals with ``start < arrival_time < end``, in time order."""
+        i = self._stops.get(stop_id)
+        if i is None:
+            return []
+        base = self._stop_starts[i]
+        limit = base + self._stop_counts[i]
+        lo = bisect.bisect_right(self._times, start, base, limit) if start is not None else base
+        hi = bisect.bisect_left(self._times, end, lo, limit) if end is not None else limit
+        return [self._arrival(stop_id, p) for p in range(lo, hi)]
+
+    def upcoming(self, stop_ids, now=None, window=3600):
+        """Merge the upcoming arrivals of several stops into one time-ordered iterator."""
+        now = now if now is not None else time.time()
+        return heapq.merge(
+            *(self.arrivals(stop_id, now, now + window) for stop_id in stop_ids),
+            key=arrival_time_key
+        )
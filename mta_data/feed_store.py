@@ -0,0 +1,89 @@
+import hashlib
+import os
+import struct
+import tempfile
+import logging
+from typing import NamedTuple, Optional
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MTAF'
+FORMAT_VERSION = 1
+
+# magic, format version, fetched_at, ETag length, Last-Modified length, body length
+HEADER = struct.Struct('=4sIdIIQ')
+
+
+class StoredFeed(NamedTuple):
+    """A raw feed body saved by ``FeedStore`` and the validators it was fetched with."""
+
+    body: bytes
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class FeedStore:
+    """Last-known-good raw feed bodies on local disk, one file per feed URL.
+
+    Every newly fetched body is written to a temporary file and renamed
+    over the previous one, so a reader (or a restart after a crash) only
+    ever sees a complete file. At startup the service parses these bodies
+    to serve every station before the MTA has answered once.
+    """
+
+    def __init__(self, directory):
+        """Keep feed files in ``directory``, creating it if needed."""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, url):
+        """Return the stored feed file path for a feed URL."""
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.feed')
+
+    def save(self, url, body, fetched_at, etag=None, last_modified=None):
+        """Atomically replace the stored body of ``url``."""
+        etag_bytes = (etag or '').encode('utf-8')
+        last_modified_bytes = (last_modified or '').encode('utf-8')
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, fetched_at, len(etag_bytes), len(last_modified_bytes), len(body)
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(etag_bytes)
+                f.write(last_modified_bytes)
+                f.write(body)
+            os.replace(tmp_path, self.path_for(url))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, url):
+        """Return the stored ``StoredFeed`` for ``url``, or None if there is no usable file."""
+        try:
+            with open(self.path_for(url), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            logger.warning(f"Ignoring truncated stored feed for {url}")
+            return None
+
+        magic, format_version, fetched_at, etag_size, last_modified_size, body_size = HEADER.unpack_from(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            logger.warning(f"Ignoring stored feed for {url} in an unknown format")
+            return None
+        offset = HEADER.size
+        etag = data[offset:offset + etag_size].decode('utf-8')
+        offset += etag_size
+        last_modified = data[offset:offset + last_modified_size].decode('utf-8')
+        offset += last_modified_size
+        body = data[offset:]
+        if len(body) != body_size:
+            logger.warning(f"Ignoring truncated stored feed for {url}")
+            return None
+        return StoredFeed(body, fetched_at, etag or None, last_modified or None)
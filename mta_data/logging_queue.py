@@ -0,0 +1,108 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+
+class BatchingQueueListener:
+    """Write queued log records from a background thread, a batch at a time.
+
+    Records put on ``log_queue`` (normally by a ``logging.handlers.QueueHandler``)
+    are drained in batches of up to ``max_batch``. Each stream handler
+    (``StreamHandler`` and its subclasses such as ``FileHandler``) gets one
+    write and one flush per batch instead of one per record; any other
+    handler is called record by record.
+    """
+
+    _SENTINEL = None
+
+    def __init__(self, log_queue, *handlers, max_batch=512):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.max_batch = max_batch
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread and flush whatever is left at interpreter exit."""
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write every queued record and stop the writer thread."""
+        if self._thread is None:
+            return
+        self.queue.put(self._SENTINEL)
+        self._thread.join()
+        self._thread = None
+        atexit.unregister(self.stop)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._SENTINEL in batch
+            self._write([record for record in batch if record is not self._SENTINEL])
+            if stopping:
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        for handler in self.handlers:
+            if not isinstance(handler, logging.StreamHandler):
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+                continue
+
+            lines = []
+            for record in records:
+                if record.levelno >= handler.level and handler.filter(record):
+                    try:
+                        lines.append(handler.format(record) + handler.terminator)
+                    except Exception:
+                        handler.handleError(record)
+            if not lines:
+                continue
+            handler.acquire()
+            try:
+                # FileHandler opens its stream lazily on the first emit
+                if handler.stream is None and isinstance(handler, logging.FileHandler):
+                    handler.stream = handler._open()
+                handler.stream.write("".join(lines))
+                handler.flush()
+            except Exception:
+                handler.handleError(records[-1])
+            finally:
+                handler.release()
+
+
+def configure_queued_logging(level, fmt, handlers, max_batch=512):
+    """Route the root logger through a queue drained by a ``BatchingQueueListener``.
+
+    ``handlers`` do the actual writing on the listener's thread, so logging
+    calls on the event loop only format the message and enqueue it.
+    Returns the started listener.
+    """
+    formatter = logging.Formatter(fmt)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The listener's handlers add the timestamp and level; only render the message here
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    listener = BatchingQueueListener(log_queue, *handlers, max_batch=max_batch)
+    listener.start()
+    return listener
@@ -0,0 +1,228 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Latency buckets in seconds, from sub-millisecond index lookups to slow upstream fetches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Return the child metric for one combination of label values."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. cache lookups by result."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, plus their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(upper_bound) + '"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+UPSTREAM_FETCH_SECONDS = Histogram(
+    'mta_upstream_fetch_seconds', 'Time to fetch a feed from the MTA API.', ['feed'])
+UPSTREAM_RESPONSE_BYTES = Histogram(
+    'mta_upstream_response_bytes', 'Size of feed bodies received from the MTA API.', ['feed'],
+    buckets=(10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000))
+UPSTREAM_ERRORS = Counter(
+    'mta_upstream_errors_total', 'Feed loads that failed, by reason.', ['feed', 'reason'])
+UPSTREAM_SHORT_CIRCUITED = Counter(
+    'mta_upstream_short_circuited_total', 'Feed loads refused because the circuit breaker was open.', ['feed'])
+UPSTREAM_BREAKER_OPENED = Counter(
+    'mta_upstream_breaker_opened_total', 'Times a feed circuit breaker opened or reopened.', ['feed'])
+UPSTREAM_NOT_MODIFIED = Counter(
+    'mta_upstream_not_modified_total', 'Feed fetches answered with a 304 or an unchanged body.', ['feed'])
+FEED_PARSE_SECONDS = Histogram(
+    'mta_feed_parse_seconds', 'Time to parse a feed body into a FeedMessage.', ['feed'])
+FEED_INDEX_SECONDS = Histogram(
+    'mta_feed_index_seconds', 'Time to build the arrival index of a parsed feed.', ['feed'])
+FEED_AGE_AT_SERVE_SECONDS = Histogram(
+    'mta_feed_age_at_serve_seconds', 'Age of the feed snapshot each station result was built from.', ['feed'],
+    buckets=(1, 5, 10, 15, 30, 45, 60, 90, 120, 300, 600))
+FEED_CACHE_LOOKUPS = Counter(
+    'mta_feed_cache_lookups_total', 'Feed cache lookups by result: hit, stale, miss or coalesced.', ['result'])
+STATION_EXTRACT_SECONDS = Histogram(
+    'mta_station_extract_seconds', "Time to build a station's result from its feed snapshots.", ['station'])
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'mta_response_cache_lookups_total', 'Rendered response lookups by result: hit, miss or not_modified.', ['result'])
+RESPONSE_SERIALIZE_SECONDS = Histogram(
+    'mta_response_serialize_seconds', 'Time to serialize a response body to JSON.', ['endpoint'])
+HTTP_REQUEST_SECONDS = Histogram(
+    'mta_http_request_duration_seconds', 'Time to handle an API request.', ['method', 'route', 'status'])
+
+
+# Stage timings of the request being handled, when Server-Timing is enabled
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request_timing():
+    """Collect stage timings for the current request; returns a token for ``stop_request_timing``."""
+    return _request_timings.set([])
+
+
+def current_request_timings():
+    """Return the ``[(stage, seconds)]`` recorded so far for the current request."""
+    return list(_request_timings.get() or ())
+
+
+def stop_request_timing(token):
+    """Stop collecting and return the ``[(stage, seconds)]`` recorded for the request."""
+    timings = _request_timings.get()
+    _request_timings.reset(token)
+    return timings or []
+
+
+@contextmanager
+def stage(name, histogram=None, *labels):
+    """Time a block, observing it in ``histogram`` and the current request's stage timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is not None:
+            histogram.labels(*labels).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def server_timing_header(timings, total=None):
+    """Format stage timings as a ``Server-Timing`` header value; repeated stages are summed."""
+    durations = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.0) + seconds
+    if total is not None:
+        durations['total'] = total
+    return ', '.join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items())
@@ -0,0 +1,145 @@
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Longest the poller sleeps before re-checking which feeds are in demand
+MAX_SLEEP = 1.0
+
+
+class FeedPoller:
+    """Background thread that owns all upstream MTA feed I/O.
+
+    Every feed URL in the service configuration is polled on its own
+    schedule, publishing new snapshots into the service's feed cache.
+    While it runs, request handlers only read the latest published
+    snapshots and never touch the network.
+
+    Feeds read by a request in the last ``idle_after`` seconds (or by an
+    open arrival stream) are refreshed every ``interval`` seconds; idle
+    feeds only every ``idle_interval`` seconds, or not at all when it is
+    0. A request for an idle feed brings it back to the fast schedule
+    within a second. A feed whose circuit breaker is open waits for the
+    breaker's backoff instead. A worker that follows another process's
+    shared snapshots polls the shared directory on its faster interval
+    instead, and records its own demand there for the leader. With parse worker processes configured, due feeds are
+    refreshed concurrently so they are parsed on several cores.
+    """
+
+    def __init__(self, service, interval=30, idle_interval=300, idle_after=300):
+        """Create a poller for an ``MTAService`` instance."""
+        self.service = service
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.idle_after = idle_after
+        self._polled_at = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """Whether the polling thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self.service.feed_cache.managed = True
+        self._thread = threading.Thread(target=self._run, name="feed-poller", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Feed poller started with a {self.interval}s interval "
+            f"({self.idle_interval or 'no'}s for idle feeds)"
+        )
+
+    def stop(self, timeout=None):
+        """Signal the polling thread to exit and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.service.feed_cache.managed = False
+        logger.info("Feed poller stopped")
+
+    def feed_interval(self, url):
+        """Seconds between refreshes of ``url`` right now, or None while it isn't polled."""
+        store = self.service.shared_store
+        if store is not None and not store.is_leader:
+            return store.poll_interval
+        if self.service.feed_cache.in_demand(url, self.idle_after) or (
+                store is not None and store.in_demand(url, self.idle_after)):
+            # A replay faster than real time polls the archive as often as the MTA was
+            return self.interval / self.service.replay_speed
+        return self.idle_interval / self.service.replay_speed if self.idle_interval else None
+
+    def next_due(self, url):
+        """Unix time at which ``url`` is next due for a refresh, or None."""
+        polled_at = self._polled_at.get(url)
+        if polled_at is None:
+            # Every feed is loaded once at startup
+            return 0.0
+        interval = self.feed_interval(url)
+        if interval is None:
+            return None
+        return max(polled_at + interval, self.service.breaker.retry_at(url))
+
+    def share_demand(self):
+        """On a follower, record the feeds this worker's clients read for the leader's schedule."""
+        store = self.service.shared_store
+        if store is None or store.is_leader:
+            return
+        for url in set(self.service.feed_urls.values()):
+            if self.service.feed_cache.in_demand(url, self.idle_after):
+                store.record_demand(url)
+
+    def poll_once(self):
+        """Refresh every feed once."""
+        self._refresh_all(sorted(set(self.service.feed_urls.values())))
+
+    def poll_due(self):
+        """Refresh the feeds that are due; return the seconds until the next one is."""
+        self.share_demand()
+        now = time.time()
+        due, upcoming = [], []
+        for url in sorted(set(self.service.feed_urls.values())):
+            next_due = self.next_due(url)
+            if next_due is None:
+                continue
+            if next_due <= now:
+                due.append(url)
+            else:
+                upcoming.append(next_due - now)
+        self._refresh_all(due)
+        return min(upcoming, default=MAX_SLEEP) if not due else 0.0
+
+    def _refresh_all(self, urls):
+        workers = min(self.service.parse_workers, len(urls))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-poller") as pool:
+                list(pool.map(self._refresh, urls))
+        else:
+            for url in urls:
+                self._refresh(url)
+
+    def _refresh(self, url):
+        if self._stop.is_set():
+            return
+        self._polled_at[url] = time.time()
+        snapshot = self.service.feed_cache.refresh(url)
+        if snapshot is None:
+            logger.warning(f"No snapshot available for feed {url}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.poll_due()
+            except Exception as e:
+                logger.error(f"Error polling MTA feeds: {str(e)}")
+                wait = MAX_SLEEP
+            self._stop.wait(min(wait, MAX_SLEEP))
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+import logging
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def topic_key(station_id, filters):
+    """Return a hashable key for a station and its query filters."""
+    return (station_id,) + tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(filters.items())
+    )
+
+
+class Subscription:
+    """One subscriber's mailbox for a topic.
+
+    The mailbox holds only the latest undelivered message: a slow consumer
+    skips intermediate updates instead of queueing them, so memory per
+    subscriber stays constant no matter how far behind it falls.
+    """
+
+    __slots__ = ('key', 'dropped', '_message', '_event')
+
+    def __init__(self, key):
+        self.key = key
+        self.dropped = 0
+        self._message = None
+        self._event = asyncio.Event()
+
+    def offer(self, message):
+        """Replace any undelivered message with ``message``."""
+        if self._message is not None:
+            self.dropped += 1
+        self._message = message
+        self._event.set()
+
+    async def next(self, timeout=None):
+        """Wait for the next message; return None if ``timeout`` expires first."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        message, self._message = self._message, None
+        return message
+
+
+class _Topic:
+    __slots__ = ('query', 'subscribers')
+
+    def __init__(self, query):
+        self.query = query
+        self.subscribers = set()
+
+
+class ArrivalBroker:
+    """In-process pub/sub of station arrivals on top of ``MTAService``.
+
+    Subscribers are grouped into topics by station and filters. When the
+    feed cache publishes a new version of a feed, each topic that reads the
+    feed renders its station result once, in the thread that loaded the
+    feed, and the event loop only fans the same encoded message out to all
+    of its subscribers.
+    """
+
+    def __init__(self, service):
+        """Create a broker that listens to ``service``'s feed cache."""
+        self.service = service
+        self._topics = {}
+        self._loop = None
+        self._lock = threading.Lock()
+        service.feed_cache.add_listener(self._on_publish)
+        service.feed_cache.add_demand_source(self.subscribed_urls)
+
+    @property
+    def subscriber_count(self):
+        """Number of open subscriptions across all topics."""
+        with self._lock:
+            return sum(len(topic.subscribers) for topic in self._topics.values())
+
+    def subscribed_urls(self):
+        """Return the feed URLs read by at least one open subscription."""
+        with self._lock:
+            return {url for topic in self._topics.values() for url in topic.query.feeds}
+
+    def subscribe(self, station_id, filters):
+        """Subscribe to a station's arrivals; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        key = topic_key(station_id, filters)
+        subscription = Subscription(key)
+        with self._lock:
+            topic = self._topics.get(key)
+            if topic is None:
+                topic = self._topics[key] = _Topic(self.service.plan_station_query(station_id, **filters))
+            topic.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription, dropping its topic once nobody listens."""
+        with self._lock:
+            topic = self._topics.get(subscription.key)
+            if topic is None:
+                return
+            topic.subscribers.discard(subscription)
+            if not topic.subscribers:
+                del self._topics[subscription.key]
+
+    async def current(self, subscription):
+        """Return the encoded current state for a subscription's topic."""
+        with self._lock:
+            topic = self._topics.get(subscription.key)
+        if topic is None:
+            return None
+        snapshots = await self.service.get_query_snapshots_async(topic.query)
+        return await asyncio.to_thread(self.render, topic.query, snapshots)
+
+    def render(self, query, snapshots):
+        """Encode a station result as the JSON message sent to subscribers."""
+        result = self.service.build_station_result(query, snapshots)
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+    def _on_publish(self, snapshot, previous):
+        # Called from whichever thread loaded the feed; only new versions are pushed
+        if previous is not None and previous.version == snapshot.version:
+            return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        # Render in the loading thread; only the hand-off to subscribers runs on the loop
+        with self._lock:
+            topics = [topic for topic in self._topics.values() if snapshot.url in topic.query.feeds]
+        cache = self.service.feed_cache
+        for topic in topics:
+            try:
+                snapshots = {feed_url: cache.peek(feed_url) for feed_url in topic.query.feeds}
+                message = self.render(topic.query, snapshots)
+            except Exception as e:
+                logger.error(f"Error rendering arrivals for {topic.query.station_id}: {str(e)}")
+                continue
+            loop.call_soon_threadsafe(self._deliver, topic, message)
+
+    def _deliver(self, topic, message):
+        with self._lock:
+            subscribers = list(topic.subscribers)
+        for subscription in subscribers:
+            subscription.offer(message)
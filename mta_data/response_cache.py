@@ -0,0 +1,52 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from mta_data.metrics import RESPONSE_CACHE_LOOKUPS
+
+
+class ResponseCache:
+    """Bounded LRU cache of rendered response bodies keyed by their inputs.
+
+    Keys are tuples describing everything a response depends on (request
+    filters, feed contents, time bucket). The ETag is derived from the key,
+    so a conditional request can be answered before anything is rendered.
+    """
+
+    def __init__(self, max_entries=1024):
+        """Keep at most ``max_entries`` rendered bodies."""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(key):
+        """Return a weak ETag for a cache key.
+
+        Weak because bodies rendered for the same key at different moments
+        (or by different workers) can differ in ``minutes_away``.
+        """
+        return 'W/"' + hashlib.blake2b(repr(key).encode('utf-8'), digest_size=12).hexdigest() + '"'
+
+    def get_or_render(self, key, render):
+        """Return the cached body for ``key``, calling ``render()`` on a miss."""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                RESPONSE_CACHE_LOOKUPS.labels('hit').inc()
+                return body
+
+        RESPONSE_CACHE_LOOKUPS.labels('miss').inc()
+        body = render()
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        """Drop every rendered body."""
+        with self._lock:
+            self._entries.clear()
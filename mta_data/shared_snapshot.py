@@ -0,0 +1,277 @@
+import array
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from mta_data.feed_cache import FeedLoad
+from mta_data.feed_index import FeedIndex
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MTAS'
+FORMAT_VERSION = 2
+
+# magic, format version, snapshot version, fetched_at, feed timestamp,
+# string count, stop count, record count, trip count
+HEADER = struct.Struct('=4sIQdqIIII')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _pad(chunks, offset):
+    padding = _align(offset) - offset
+    if padding:
+        chunks.append(b'\0' * padding)
+    return offset + padding
+
+
+def encode_feed_index(feed_index):
+    """Encode a FeedIndex into the shared snapshot body (everything after the header).
+
+    Returns ``(counts, body)`` where ``counts`` is (strings, stops, records,
+    trips). The index's string table (followed by its stop IDs), its
+    arrival columns, grouped by stop and sorted by arrival time, and their
+    trip-major ordering are written as native-endian arrays.
+    """
+    stop_ids, stop_starts, stop_counts, times, routes, trips, tracks = feed_index.columns()
+    trip_codes, trip_starts, trip_order = feed_index.trip_columns()
+    strings = list(feed_index.string_table())
+    stop_strings = array.array('I', range(len(strings), len(strings) + len(stop_ids)))
+    strings.extend(stop_ids)
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = array.array('I', [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    chunks = []
+    offset = HEADER.size
+    for part in (string_offsets.tobytes(), b''.join(encoded), stop_strings.tobytes(),
+                 stop_starts.tobytes(), stop_counts.tobytes(), times.tobytes(),
+                 routes.tobytes(), trips.tobytes(), tracks.tobytes(),
+                 trip_codes.tobytes(), trip_starts.tobytes(), trip_order.tobytes()):
+        offset = _pad(chunks, offset)
+        chunks.append(part)
+        offset += len(part)
+
+    return (len(strings), len(stop_ids), len(times), len(trip_codes)), b''.join(chunks)
+
+
+class SharedFeedIndex(FeedIndex):
+    """A read-only FeedIndex backed by a memory-mapped shared snapshot file.
+
+    The arrival columns and their trip ordering are read in place from the
+    mapping; only stop, trip and route IDs are decoded up front, and other
+    strings the first time they are used.
+    """
+
+    __slots__ = ('version', 'fetched_at', '_buffer', '_string_offsets', '_string_blob', '_decoded')
+
+    def __init__(self, buffer):
+        """Wrap a buffer holding a complete shared snapshot file."""
+        (magic, format_version, self.version, self.fetched_at, timestamp,
+         n_strings, n_stops, n_records, n_trips) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError("Not a shared feed snapshot")
+
+        view = memoryview(buffer)
+        offset = HEADER.size
+
+        def take(size, fmt=None):
+            nonlocal offset
+            offset = _align(offset)
+            if offset + size > len(view):
+                raise ValueError("Truncated shared feed snapshot")
+            part = view[offset:offset + size]
+            offset += size
+            return part.cast(fmt) if fmt else part
+
+        self._buffer = buffer
+        self._string_offsets = take(4 * (n_strings + 1), 'I')
+        self._string_blob = take(self._string_offsets[-1])
+        self._decoded = {}
+        stop_strings = take(4 * n_stops, 'I')
+        stop_starts = take(4 * n_stops, 'I')
+        stop_counts = take(4 * n_stops, 'I')
+        times = take(8 * n_records, 'q')
+        route_column = take(4 * n_records, 'I')
+        trip_column = take(4 * n_records, 'I')
+        tracks = take(4 * n_records, 'i')
+        trip_codes = take(4 * n_trips, 'I')
+        trip_starts = take(4 * n_trips, 'I')
+        trip_order = take(4 * n_records, 'I')
+        super().__init__(
+            None, [self._string(stop_strings[i]) for i in range(n_stops)], stop_starts, stop_counts,
+            times, route_column, trip_column, tracks, trip_codes, trip_starts, trip_order, timestamp=timestamp
+        )
+
+    def _string(self, index):
+        value = self._decoded.get(index)
+        if value is None:
+            start, end = self._string_offsets[index], self._string_offsets[index + 1]
+            value = self._decoded[index] = bytes(self._string_blob[start:end]).decode('utf-8')
+        return value
+
+    def string_table(self):
+        return [self._string(i) for i in range(len(self._string_offsets) - 1)]
+
+
+def decode_feed_index(counts, body, timestamp=0):
+    """Wrap a body produced by ``encode_feed_index`` in a SharedFeedIndex, e.g. one returned by a parse worker."""
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0.0, timestamp or 0, *counts)
+    return SharedFeedIndex(header + body)
+
+
+class SharedSnapshotStore:
+    """Share parsed feed snapshots between uvicorn worker processes.
+
+    One process holds an exclusive lock on ``leader.lock`` in the shared
+    directory and is the only one fetching from the MTA; it writes every
+    published snapshot to one file per feed URL, replacing it atomically.
+    Every other worker maps those files read-only instead of fetching and
+    parsing the feeds itself, and takes over as leader if the lock frees up.
+    Followers touch a ``.demand`` file per feed their clients read, so the
+    leader knows which feeds are in demand across all workers.
+    """
+
+    def __init__(self, directory, poll_interval=1.0):
+        """Use ``directory`` for snapshot files; followers re-check it every ``poll_interval`` seconds."""
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.is_leader = False
+        self._lock_file = None
+        self._bodies = {}
+        self._demand_recorded = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def try_acquire_leadership(self):
+        """Try to become the process that fetches feeds; return whether we are it."""
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            # Without file locks every process fetches for itself
+            self.is_leader = True
+            return True
+
+        lock_file = open(os.path.join(self.directory, 'leader.lock'), 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        self.is_leader = True
+        logger.info(f"Process {os.getpid()} is now the shared feed snapshot leader")
+        return True
+
+    def release(self):
+        """Give up leadership so another worker can take over."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_leader = False
+
+    def path_for(self, url):
+        """Return the snapshot file path for a feed URL."""
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.snap')
+
+    def demand_path(self, url):
+        """Return the path of the file followers touch while ``url`` is in demand."""
+        return self.path_for(url)[:-len('.snap')] + '.demand'
+
+    def record_demand(self, url):
+        """Tell the leader this worker's clients read ``url``; touches its file at most every ``poll_interval``."""
+        now = time.monotonic()
+        recorded = self._demand_recorded.get(url)
+        if recorded is not None and now - recorded < self.poll_interval:
+            return
+        self._demand_recorded[url] = now
+        path = self.demand_path(url)
+        try:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                with open(path, 'a'):
+                    pass
+        except OSError as e:
+            logger.warning(f"Could not record demand for feed {url}: {str(e)}")
+
+    def in_demand(self, url, within):
+        """Whether a follower recorded demand for ``url`` in the last ``within`` seconds."""
+        try:
+            return time.time() - os.stat(self.demand_path(url)).st_mtime < within
+        except OSError:
+            return False
+
+    def publish(self, snapshot, previous=None):
+        """Write a snapshot for followers; a FeedCache listener that only acts on the leader."""
+        if not self.is_leader:
+            return
+
+        # Re-stamped snapshots reuse the encoded body of their version
+        cached = self._bodies.get(snapshot.url)
+        if cached is None or cached[0] != snapshot.version:
+            cached = (snapshot.version,) + encode_feed_index(snapshot.feed)
+            self._bodies[snapshot.url] = cached
+        _, counts, body = cached
+
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, snapshot.version, snapshot.fetched_at,
+            snapshot.feed.timestamp or 0, *counts
+        )
+        path = self.path_for(snapshot.url)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(body)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def read_header(self, url):
+        """Return ``(version, fetched_at)`` of a feed's shared snapshot, or None."""
+        try:
+            with open(self.path_for(url), 'rb') as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, format_version, version, fetched_at = HEADER.unpack(data)[:4]
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            return None
+        return version, fetched_at
+
+    def load(self, url, previous=None):
+        """Load the leader's snapshot for ``url`` as a FeedLoad, mapping it only if it changed."""
+        header = self.read_header(url)
+        if header is None:
+            return None
+        version, fetched_at = header
+        if previous is not None and previous.version == version:
+            return FeedLoad(previous.feed, version=version, fetched_at=fetched_at)
+
+        try:
+            with open(self.path_for(url), 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index = SharedFeedIndex(buffer)
+        except (OSError, ValueError) as e:
+            # Keep the previous snapshot rather than serve a damaged one
+            logger.warning(f"Ignoring unreadable shared snapshot for {url}: {str(e)}")
+            return None
+        return FeedLoad(index, version=index.version, fetched_at=index.fetched_at)
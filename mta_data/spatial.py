@@ -0,0 +1,126 @@
+import heapq
+import math
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class StationGrid:
+    """Uniform grid of station coordinates for radius and k-nearest queries.
+
+    Points are bucketed into square cells of ``cell_size_m`` meters on an
+    equirectangular projection around the points' mean latitude, which is
+    accurate to well under a percent across a city. A query only visits
+    the cells its search circle overlaps, growing ring by ring for
+    k-nearest searches, and ranks candidates by haversine distance.
+    """
+
+    __slots__ = ('cell_size_m', '_cells', '_bounds', '_points', '_meters_per_lon', '_meters_per_lat')
+
+    def __init__(self, points, cell_size_m=500):
+        """Index ``points``, a mapping of ``{key: (lat, lon)}``."""
+        self.cell_size_m = cell_size_m
+        self._points = dict(points)
+        mean_lat = sum(lat for lat, _ in self._points.values()) / len(self._points) if self._points else 0.0
+        self._meters_per_lat = math.radians(1) * EARTH_RADIUS_M
+        self._meters_per_lon = self._meters_per_lat * math.cos(math.radians(mean_lat))
+        self._cells = {}
+        for key, (lat, lon) in self._points.items():
+            self._cells.setdefault(self._cell(lat, lon), []).append(key)
+        xs = [x for x, _ in self._cells]
+        ys = [y for _, y in self._cells]
+        self._bounds = (min(xs), min(ys), max(xs), max(ys)) if self._cells else None
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lon * self._meters_per_lon / self.cell_size_m)),
+                int(math.floor(lat * self._meters_per_lat / self.cell_size_m)))
+
+    def _ring(self, center, radius):
+        # Cells of the square ring at ``radius`` around ``center``, clipped to the occupied bounds
+        cx, cy = center
+        if radius == 0:
+            yield center
+            return
+        min_x, min_y, max_x, max_y = self._bounds
+        x0, x1 = max(cx - radius, min_x), min(cx + radius, max_x)
+        y0, y1 = max(cy - radius + 1, min_y), min(cy + radius - 1, max_y)
+        for y in (cy - radius, cy + radius):
+            if min_y <= y <= max_y:
+                for x in range(x0, x1 + 1):
+                    yield x, y
+        for x in (cx - radius, cx + radius):
+            if min_x <= x <= max_x:
+                for y in range(y0, y1 + 1):
+                    yield x, y
+
+    def _first_ring(self, center):
+        # Rings closer than this lie entirely outside the occupied bounds
+        cx, cy = center
+        min_x, min_y, max_x, max_y = self._bounds
+        return max(0, min_x - cx, cx - max_x, min_y - cy, cy - max_y)
+
+    def within(self, lat, lon, radius_m):
+        """Return ``[(distance_m, key)]`` for points within ``radius_m``, nearest first."""
+        if not self._points:
+            return []
+        cx, cy = self._cell(lat, lon)
+        reach = int(math.ceil(radius_m / self.cell_size_m))
+        min_x, min_y, max_x, max_y = self._bounds
+        found = []
+        for x in range(max(cx - reach, min_x), min(cx + reach, max_x) + 1):
+            for y in range(max(cy - reach, min_y), min(cy + reach, max_y) + 1):
+                for key in self._cells.get((x, y), ()):
+                    distance = haversine_m(lat, lon, *self._points[key])
+                    if distance <= radius_m:
+                        found.append((distance, key))
+        found.sort()
+        return found
+
+    def nearest(self, lat, lon, k=1, radius_m=None):
+        """Return the ``k`` nearest ``[(distance_m, key)]``, optionally within ``radius_m``."""
+        if k <= 0 or not self._points:
+            return []
+        center = self._cell(lat, lon)
+        max_ring = int(math.ceil(radius_m / self.cell_size_m)) if radius_m is not None else None
+        best = []
+        ring = self._first_ring(center)
+        if max_ring is not None and ring > max_ring:
+            return []
+        while True:
+            for cell in self._ring(center, ring):
+                for key in self._cells.get(cell, ()):
+                    distance = haversine_m(lat, lon, *self._points[key])
+                    if radius_m is not None and distance > radius_m:
+                        continue
+                    item = (-distance, key)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+            # Every unvisited cell is at least ``ring * cell_size_m`` away
+            if len(best) == k and -best[0][0] <= ring * self.cell_size_m:
+                break
+            if max_ring is not None and ring >= max_ring:
+                break
+            if self._covers_all(center, ring):
+                break
+            ring += 1
+        return sorted((-distance, key) for distance, key in best)
+
+    def _covers_all(self, center, ring):
+        # True once the searched square contains every occupied cell
+        cx, cy = center
+        min_x, min_y, max_x, max_y = self._bounds
+        return cx - ring <= min_x and cy - ring <= min_y and cx + ring >= max_x and cy + ring >= max_y
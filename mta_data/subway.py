@@ -1,12 +1,39 @@
 import requests
+from requests.adapters import HTTPAdapter
+import hashlib
 import time
+import asyncio
 import json
 from google.transit import gtfs_realtime_pb2
 #from protobuf_to_dict import protobuf_to_dict
 from google.protobuf.json_format import MessageToDict
+from google.protobuf.unknown_fields import UnknownFieldSet
 from datetime import datetime
 import os
 import logging
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+from mta_data.feed_cache import FeedCache, FeedLoad, FeedSnapshot, NOT_MODIFIED
+from mta_data.poller import FeedPoller
+from mta_data.feed_index import FeedIndex
+from mta_data.feed_store import FeedStore
+from mta_data.archive import FeedArchive, ReplayClock
+from mta_data.breaker import CircuitBreaker
+from mta_data.shared_snapshot import SharedSnapshotStore, decode_feed_index, encode_feed_index
+from mta_data.pubsub import ArrivalBroker
+from mta_data.changes import ChangeLog
+from mta_data.catalog import LazyMapping, load_catalog
+from mta_data.spatial import StationGrid
+from mta_data.metrics import (
+    FEED_AGE_AT_SERVE_SECONDS, FEED_CACHE_LOOKUPS, FEED_INDEX_SECONDS, FEED_PARSE_SECONDS, STATION_EXTRACT_SECONDS,
+    UPSTREAM_BREAKER_OPENED, UPSTREAM_ERRORS, UPSTREAM_FETCH_SECONDS, UPSTREAM_NOT_MODIFIED,
+    UPSTREAM_RESPONSE_BYTES, UPSTREAM_SHORT_CIRCUITED, stage
+)
+import heapq
+import zlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 
 # Custom protobuf to dict converter that works with Python 3.11
@@ -27,14 +54,155 @@ def _convert_value(value):
     else:
         return value
 
+# NYCT extensions (nyct-subway.proto) use field 1001 on TripDescriptor and
+# StopTimeUpdate. They are not compiled into gtfs-realtime-bindings, so the
+# parser keeps them as unknown fields that we decode on demand.
+NYCT_EXTENSION_FIELD = 1001
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _decode_string_fields(data):
+    """Decode the length-delimited fields of a small protobuf message."""
+    fields = {}
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            _, pos = _read_varint(data, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            fields[field_number] = data[pos:pos + length].decode('utf-8', 'replace')
+            pos += length
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 5:
+            pos += 4
+        else:
+            break
+    return fields
+
+def nyct_scheduled_track(stop_time_update):
+    """Return the NYCT scheduled track of a StopTimeUpdate, if present."""
+    for field in UnknownFieldSet(stop_time_update):
+        if field.field_number == NYCT_EXTENSION_FIELD and field.wire_type == 2:
+            data = field.data
+            # Fast path: scheduled_track is normally the first, short field
+            if len(data) > 2 and data[0] == 0x0a and data[1] < 0x80:
+                return data[2:2 + data[1]].decode('utf-8', 'replace')
+            return _decode_string_fields(data).get(1)
+    return None
+
+def index_feed_body(binary_data, routes):
+    """Parse and index a feed body; runs in a parse worker process.
+
+    Returns ``(timestamp, counts, body, parse_seconds, index_seconds)`` with
+    the index in the shared snapshot encoding, so only a few flat byte
+    strings cross the process boundary instead of one tuple per arrival.
+    Returns None if the body doesn't parse.
+    """
+    started = time.perf_counter()
+    feed = gtfs_realtime_pb2.FeedMessage()
+    try:
+        feed.ParseFromString(binary_data)
+    except Exception:
+        return None
+    parsed = time.perf_counter()
+    feed_index = FeedIndex.build(feed, routes=routes, track_decoder=nyct_scheduled_track)
+    counts, body = encode_feed_index(feed_index)
+    return feed_index.timestamp, counts, body, parsed - started, time.perf_counter() - parsed
+
+def parse_timestamp(value):
+    """Return Unix time for a Unix timestamp or an ISO 8601 datetime (local time if naive)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Archived feed versions kept indexed for replay and historical queries
+ARCHIVED_INDEX_CACHE_SIZE = 8
+
+class StationQuery(NamedTuple):
+    """A station request with its filters resolved against the configuration."""
+
+    station_id: str
+    line_groups: Tuple[str, ...]
+    directions: Tuple[str, ...]
+    routes: Optional[FrozenSet[str]]
+    stops: Dict[str, Optional[str]]
+    window: int
+    limit: Optional[int]
+    feeds: Dict[str, List[str]]
+
+class StationTables(NamedTuple):
+    """A station's configuration compiled into lookup tables."""
+
+    stops: Dict[str, Optional[str]]
+    route_groups: Dict[str, List[str]]
+    direction_keys: Dict[str, str]
+
 class MTAService:
     def __init__(self, config_path):
         """Initialize the MTA service with a configuration file."""
         # Load configuration
         self.load_config(config_path)
+        # Keep-alive connection pool shared by every upstream request
+        self.session = self.create_session()
+        # Stops fetching feeds whose upstream keeps failing, backing off exponentially
+        self.breaker = CircuitBreaker()
+        # Worker processes that parse and index feed bodies, if configured
+        self.parse_pool = None
+        if self.parse_workers > 0:
+            self.parse_pool = ProcessPoolExecutor(
+                max_workers=self.parse_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        # Parsed feeds shared by every station, keyed by feed URL
+        self.feed_cache = FeedCache(self.load_feed, ttl=self.feed_cache_ttl)
+        # Cold loads awaited by requests on the event loop, keyed by feed URL
+        self.pending_loads = {}
+        # Arrival diffs between consecutive versions of each feed
+        self.change_log = ChangeLog()
+        self.feed_cache.add_listener(self.change_log.record)
+        # Snapshots shared with other worker processes, if configured
+        self.shared_store = None
+        if self.shared_snapshot_dir:
+            self.shared_store = SharedSnapshotStore(self.shared_snapshot_dir)
+            self.feed_cache.add_listener(self.shared_store.publish)
+        # Every distinct raw feed fetched, kept for replay and historical queries
+        self.archive = None
+        self.archived_indexes = OrderedDict()
+        self.archived_indexes_lock = threading.Lock()
+        if self.archive_dir:
+            retention = self.archive_retention_hours * 3600 if self.archive_retention_hours > 0 else None
+            self.archive = FeedArchive(self.archive_dir, retention_seconds=retention)
+        # The service's notion of "now"; runs from the replay start when replaying the archive
+        self.clock = time.time
+        self.replay_speed = 1.0
+        if self.replay_start is not None:
+            if self.archive is None:
+                raise ValueError("REPLAY_START requires ARCHIVE_DIR")
+            self.replay_speed = self.replay_speed_setting
+            self.clock = ReplayClock(self.replay_start, self.replay_speed)
+            logger.info(f"Replaying feeds from {self.archive_dir} starting at "
+                        f"{datetime.fromtimestamp(self.replay_start).isoformat()} at {self.replay_speed}x")
+        # Last-known-good raw feeds on disk, used to warm start the cache
+        self.feed_store = None
+        if self.feed_store_dir:
+            self.feed_store = FeedStore(self.feed_store_dir)
+            if self.replay_start is None:
+                self.warm_start()
         logger.info(f"MTA service initialized with config from {config_path}")
         
     def load_config(self, config_path):
@@ -49,6 +217,25 @@ class MTAService:
             self.target_routes = self.config.get('TARGET_ROUTES', [])
             self.api_key = self.config.get('API_KEY', os.environ.get('MTA_API_KEY'))
             self.feed_to_routes = self.config.get('FEED_TO_ROUTES', {})
+            self.feed_timeout = float(self.config.get('FEED_TIMEOUT', os.environ.get('MTA_FEED_TIMEOUT', 10)))
+            self.feed_cache_ttl = float(self.config.get('FEED_CACHE_TTL', os.environ.get('MTA_FEED_CACHE_TTL', 30)))
+            self.shared_snapshot_dir = self.config.get('SHARED_SNAPSHOT_DIR', os.environ.get('MTA_SHARED_SNAPSHOT_DIR'))
+            self.static_gtfs_path = self.config.get('STATIC_GTFS', os.environ.get('MTA_STATIC_GTFS'))
+            self.feed_store_dir = self.config.get('FEED_STORE_DIR', os.environ.get('MTA_FEED_STORE_DIR'))
+            self.parse_workers = int(self.config.get('PARSE_WORKERS', os.environ.get('MTA_PARSE_WORKERS', 0)))
+            self.archive_dir = self.config.get('ARCHIVE_DIR', os.environ.get('MTA_ARCHIVE_DIR'))
+            self.archive_retention_hours = float(
+                self.config.get('ARCHIVE_RETENTION_HOURS', os.environ.get('MTA_ARCHIVE_RETENTION_HOURS', 168))
+            )
+            replay_start = self.config.get('REPLAY_START', os.environ.get('MTA_REPLAY_START'))
+            self.replay_start = parse_timestamp(replay_start) if replay_start else None
+            self.replay_speed_setting = float(self.config.get('REPLAY_SPEED', os.environ.get('MTA_REPLAY_SPEED', 1)))
+            self.catalog = None
+            self.catalog_indexes = {}
+            self.catalog_station_ids = []
+            if self.static_gtfs_path:
+                self.load_catalog_stations(self.static_gtfs_path)
+            self.compile_config()
             
             if not self.api_key:
                 logger.warning("No MTA API key found in config or environment variables")
@@ -57,25 +244,153 @@ class MTAService:
             logger.error(f"Error loading configuration from {config_path}: {str(e)}")
             raise
             
-    def fetch_mta_data(self, url):
-        """Fetch data from MTA API with proper authentication."""
-        headers = {}
+    def load_catalog_stations(self, zip_path):
+        """Add every station in a static GTFS zip that isn't configured by hand.
+
+        A catalog station is skipped when any of its platforms already
+        belongs to a station in ``STATIONS``, so hand-written entries win.
+        A catalog station's config is only decoded when first looked up.
+        """
+        self.catalog = load_catalog(zip_path)
+        configured = self.stations
+        configured_stops = {
+            stop_id
+            for station_config in configured.values()
+            for stop_id in station_config.get('STOP_IDS', {}).values()
+        }
+        for index, station_id in enumerate(self.catalog.station_ids()):
+            if station_id in configured or configured_stops.intersection(self.catalog.platform_ids(index)):
+                continue
+            self.catalog_indexes[station_id] = index
+        self.catalog_station_ids = list(self.catalog_indexes)
+        self.stations = LazyMapping(
+            list(configured) + self.catalog_station_ids,
+            lambda station_id: configured[station_id] if station_id in configured
+            else self.catalog.station_config(self.catalog_indexes[station_id], self.feed_to_routes)
+        )
+        logger.info(f"Loaded {len(self.catalog_station_ids)} stations from static GTFS {zip_path}")
+
+    def catalog_station_summary(self, station_id):
+        """Return ``(display_name, slug, routes)`` of a catalog station without decoding its config."""
+        return self.catalog.summary(self.catalog_indexes[station_id])
+
+    def station_stop_ids(self, station_id):
+        """Return a station's stop IDs without decoding a catalog station's config."""
+        index = self.catalog_indexes.get(station_id)
+        if index is not None:
+            return self.catalog.platform_ids(index)
+        return list(dict.fromkeys(self.stations[station_id].get('STOP_IDS', {}).values()))
+
+    def station_location(self, station_id):
+        """Return a station's ``(lat, lon)``, or None if it has none configured."""
+        index = self.catalog_indexes.get(station_id)
+        if index is not None:
+            return self.catalog.location(index)
+        station_config = self.stations[station_id]
+        if station_config.get('LAT') is None or station_config.get('LON') is None:
+            return None
+        return station_config['LAT'], station_config['LON']
+
+    def compile_config(self):
+        """Precompile the station configuration into O(1) lookup tables.
+
+        - ``target_route_set``: routes worth scanning
+        - ``stop_index``: stop_id -> [station_id]
+        - ``station_tables``: station_id -> ``StationTables``, compiled on first use
+        - ``route_feeds``: route_id -> [feed IDs carrying it]
+        - ``station_grid``: spatial index of stations with a location
+        - ``feed_labels``: feed URL -> metrics label naming the feeds it serves
+        """
+        self.target_route_set = set(self.target_routes)
+        self.stop_index = {}
+        for station_id in self.stations:
+            for stop_id in self.station_stop_ids(station_id):
+                self.stop_index.setdefault(stop_id, []).append(station_id)
+        self.station_tables = LazyMapping(self.stations, self.compile_station)
+        
+        self.route_feeds = {}
+        for feed_id, routes in self.feed_to_routes.items():
+            for route_id in routes:
+                self.route_feeds.setdefault(route_id, []).append(feed_id)
+        
+        locations = {}
+        for station_id in self.stations:
+            location = self.station_location(station_id)
+            if location is not None:
+                locations[station_id] = location
+        self.station_grid = StationGrid(locations)
+        
+        self.feed_labels = {url: '/'.join(feed_ids) for url, feed_ids in self.get_feed_ids_by_url().items()}
+
+    def compile_station(self, station_id):
+        """Compile one station's configuration into its ``StationTables``."""
+        station_config = self.stations[station_id]
+        directions = station_config.get('DIRECTIONS', {})
+        
+        # The first STOP_IDS key for a stop decides its direction
+        stops = {}
+        for key, stop_id in station_config.get('STOP_IDS', {}).items():
+            if stop_id in stops:
+                continue
+            direction_text = None
+            for direction_key, direction_config in directions.items():
+                if key in direction_config.get('stop_id_keys', []):
+                    direction_text = direction_config.get('display_name', direction_key)
+                    break
+            stops[stop_id] = direction_text
+        
+        route_groups = {}
+        for line_group, line_config in station_config.get('LINE_GROUPS', {}).items():
+            for route_id in line_config.get('routes', []):
+                route_groups.setdefault(route_id, []).append(line_group)
+        
+        direction_keys = {}
+        for direction_key, direction_config in directions.items():
+            direction_keys.setdefault(direction_config.get('display_name'), direction_key)
+        
+        return StationTables(stops, route_groups, direction_keys)
+
+    def create_session(self):
+        """Create a pooled HTTP session for the MTA API."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(set(self.feed_urls.values()))), pool_maxsize=10)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
         if self.api_key:
-            headers['x-api-key'] = self.api_key
+            session.headers['x-api-key'] = self.api_key
+        return session
+
+    def fetch_feed(self, url, etag=None, last_modified=None):
+        """Conditionally fetch a feed; return the response, or None on errors."""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
             
+        feed = self.feed_labels.get(url, url)
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                return response.content
+            with stage('fetch', UPSTREAM_FETCH_SECONDS, feed):
+                response = self.session.get(url, headers=headers, timeout=self.feed_timeout)
+            if response.status_code in (200, 304):
+                return response
             else:
                 logger.error(f"Error fetching MTA data: HTTP {response.status_code}")
+                UPSTREAM_ERRORS.labels(feed, f"http_{response.status_code}").inc()
                 return None
         except Exception as e:
             logger.error(f"Exception fetching MTA data: {str(e)}")
+            UPSTREAM_ERRORS.labels(feed, type(e).__name__).inc()
             return None
 
-    def parse_gtfs_data(self, binary_data):
-        """Parse GTFS binary data into readable format."""
+    def fetch_mta_data(self, url):
+        """Fetch data from MTA API with proper authentication."""
+        response = self.fetch_feed(url)
+        return response.content if response is not None else None
+
+    def parse_feed(self, binary_data):
+        """Parse GTFS binary data into a FeedMessage."""
         if not binary_data:
             return None
             
@@ -86,173 +401,680 @@ class MTAService:
             logger.error(f"Error parsing GTFS data: {str(e)}")
             return None
         
+        return feed
+
+    def parse_gtfs_data(self, binary_data):
+        """Parse GTFS binary data into readable format."""
+        feed = self.parse_feed(binary_data)
+        if feed is None:
+            return None
+        
         # Convert to dictionary for easier handling
         return protobuf_to_dict(feed)
 
+    def load_feed(self, url, previous=None):
+        """Fetch, parse and index a single feed; used to fill the feed cache.
+
+        Followers of a shared snapshot leader load its snapshot instead,
+        replays read the archive at the replay clock's time, and feeds with
+        an open circuit breaker aren't fetched at all.
+        """
+        if self.shared_store is not None and not self.shared_store.try_acquire_leadership():
+            # A restored snapshot's version doesn't come from the leader's numbering
+            return self.shared_store.load(url, previous if previous is not None and not previous.restored else None)
+        
+        if self.replay_start is not None:
+            return self.load_replay_feed(url, previous)
+        
+        label = self.feed_labels.get(url, url)
+        if not self.breaker.allow(url):
+            UPSTREAM_SHORT_CIRCUITED.labels(label).inc()
+            return None
+        
+        loaded = self.load_upstream_feed(url, previous)
+        if loaded is None:
+            if self.breaker.record_failure(url):
+                UPSTREAM_BREAKER_OPENED.labels(label).inc()
+        else:
+            self.breaker.record_success(url)
+        return loaded
+
+    def load_upstream_feed(self, url, previous=None):
+        """Fetch a feed from the MTA and index it; None on errors."""
+        response = self.fetch_feed(
+            url,
+            etag=previous.etag if previous else None,
+            last_modified=previous.last_modified if previous else None
+        )
+        if response is None:
+            return None
+        label = self.feed_labels.get(url, url)
+        if response.status_code == 304:
+            UPSTREAM_NOT_MODIFIED.labels(label).inc()
+            return NOT_MODIFIED if previous else None
+        
+        binary_data = response.content
+        UPSTREAM_RESPONSE_BYTES.labels(label).observe(len(binary_data))
+        digest = hashlib.blake2b(binary_data, digest_size=16).hexdigest()
+        if previous and previous.digest == digest:
+            UPSTREAM_NOT_MODIFIED.labels(label).inc()
+            return NOT_MODIFIED
+        
+        feed_index = self.index_feed_body(binary_data, label)
+        if feed_index is None:
+            UPSTREAM_ERRORS.labels(label, 'parse').inc()
+            return None
+        
+        loaded = FeedLoad(
+            feed_index,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            digest=digest,
+            fetched_at=time.time()
+        )
+        if self.feed_store is not None:
+            try:
+                self.feed_store.save(url, binary_data, loaded.fetched_at, loaded.etag, loaded.last_modified)
+            except OSError as e:
+                logger.error(f"Error saving feed {url} to {self.feed_store_dir}: {str(e)}")
+        if self.archive is not None:
+            try:
+                self.archive.append(url, binary_data, loaded.fetched_at)
+            except OSError as e:
+                logger.error(f"Error archiving feed {url} to {self.archive_dir}: {str(e)}")
+        return loaded
+
+    def load_replay_feed(self, url, previous=None):
+        """Load the archived version of a feed that was current at the replay clock's time."""
+        entry = self.archive.entry_at(url, self.clock())
+        if entry is None:
+            return None
+        digest = entry.digest.hex()
+        if previous and previous.digest == digest:
+            return NOT_MODIFIED
+        feed_index = self.load_archived_index(url, entry)
+        if feed_index is None:
+            return None
+        return FeedLoad(feed_index, digest=digest)
+
+    def load_archived_index(self, url, entry):
+        """Parse and index an archived payload, reusing the last few archived feeds indexed."""
+        key = (url, entry.digest)
+        with self.archived_indexes_lock:
+            feed_index = self.archived_indexes.get(key)
+            if feed_index is not None:
+                self.archived_indexes.move_to_end(key)
+                return feed_index
+        try:
+            binary_data = self.archive.read(entry)
+        except (OSError, zlib.error) as e:
+            logger.error(f"Error reading archived feed {url}: {str(e)}")
+            return None
+        feed_index = self.index_feed_body(binary_data, self.feed_labels.get(url, url))
+        if feed_index is not None:
+            with self.archived_indexes_lock:
+                self.archived_indexes[key] = feed_index
+                while len(self.archived_indexes) > ARCHIVED_INDEX_CACHE_SIZE:
+                    self.archived_indexes.popitem(last=False)
+        return feed_index
+
+    def index_feed_body(self, binary_data, label):
+        """Parse and index a raw feed body, in the parse worker pool if configured; None on errors."""
+        if self.parse_pool is not None:
+            return self.index_feed_in_pool(binary_data, label)
+        with stage('parse', FEED_PARSE_SECONDS, label):
+            feed = self.parse_feed(binary_data)
+        if feed is None:
+            return None
+        with stage('index', FEED_INDEX_SECONDS, label):
+            return self.build_feed_index(feed)
+
+    def warm_start(self):
+        """Seed the feed cache with the last feeds saved to the feed store, served as stale until refreshed."""
+        restored = 0
+        for url in self.get_feed_ids_by_url():
+            stored = self.feed_store.load(url)
+            if stored is None:
+                continue
+            feed_index = self.index_feed_body(stored.body, self.feed_labels.get(url, url))
+            if feed_index is None:
+                logger.warning(f"Ignoring stored feed {url} that no longer parses")
+                continue
+            self.feed_cache.seed(url, FeedLoad(
+                feed_index, etag=stored.etag, last_modified=stored.last_modified,
+                digest=hashlib.blake2b(stored.body, digest_size=16).hexdigest(),
+                fetched_at=stored.fetched_at, restored=True
+            ))
+            restored += 1
+        if restored:
+            logger.info(f"Warm started {restored} feeds from {self.feed_store_dir}")
+
+    def index_feed_in_pool(self, binary_data, label):
+        """Parse and index a feed body in the parse worker pool; None if it fails."""
+        try:
+            with stage('parse'):
+                indexed = self.parse_pool.submit(index_feed_body, binary_data, self.target_route_set).result()
+        except Exception as e:
+            logger.error(f"Error in feed parse worker: {str(e)}")
+            return None
+        if indexed is None:
+            logger.error("Error parsing GTFS data in parse worker")
+            return None
+        
+        timestamp, counts, body, parse_seconds, index_seconds = indexed
+        FEED_PARSE_SECONDS.labels(label).observe(parse_seconds)
+        FEED_INDEX_SECONDS.labels(label).observe(index_seconds)
+        return decode_feed_index(counts, body, timestamp)
+
+    def close(self):
+        """Stop the parse worker processes, if any."""
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(cancel_futures=True)
+            self.parse_pool = None
+
+    def build_feed_index(self, feed):
+        """Index every target-route arrival in a parsed feed by stop_id."""
+        return FeedIndex.build(feed, routes=self.target_route_set, track_decoder=nyct_scheduled_track)
+
+    def get_feed(self, url):
+        """Return the parsed feed for a URL, served from the shared cache."""
+        return self.feed_cache.get(url)
+
+    def get_feed_snapshot(self, url):
+        """Return the latest versioned snapshot for a URL, served from the shared cache."""
+        return self.feed_cache.get_snapshot(url)
+
+    def feed_status(self, feed_ids=None):
+        """Report the version and age of the latest snapshot for each feed."""
+        now = time.time()
+        status = {}
+        for feed_id in (feed_ids if feed_ids is not None else self.feed_urls.keys()):
+            url = self.feed_urls.get(feed_id)
+            snapshot = self.feed_cache.peek(url)
+            status[feed_id] = self.describe_feed(url, snapshot, snapshot.age(now) if snapshot else None)
+        return status
+
+    def describe_feed(self, url, snapshot, age=None):
+        """Report a feed snapshot's version and age, flagging restored or circuit-broken feeds as stale."""
+        info = {"version": None, "age_seconds": None}
+        if snapshot is not None:
+            info["version"] = snapshot.version
+            info["age_seconds"] = round(age if age is not None else snapshot.age(), 1)
+            if snapshot.restored:
+                info["stale"] = True
+        state, retry_in = self.breaker.state(url)
+        if state != 'closed':
+            if snapshot is not None:
+                info["stale"] = True
+            info["upstream"] = state
+            info["retry_in_seconds"] = round(retry_in, 1)
+        return info
+
+    def describe_archived_feed(self, snapshot, now):
+        """Report when an archived feed version was fetched and how old it was at ``now``."""
+        return {
+            "fetched_at": datetime.fromtimestamp(snapshot.fetched_at).isoformat(),
+            "age_seconds": round(snapshot.age(now), 1)
+        }
+
+    def is_stale(self, snapshot):
+        """Whether a snapshot is served without a working upstream behind it."""
+        return snapshot.restored or self.breaker.is_open(snapshot.url)
+
     def format_time(self, timestamp):
         """Format Unix timestamp to readable time."""
         return datetime.fromtimestamp(timestamp).strftime('%I:%M:%S %p')
 
-    def get_upcoming_trains_at_station(self, feed_dict, station_id):
-        """Extract upcoming trains arriving at a specific station."""
-        if not feed_dict or 'entity' not in feed_dict:
+    def get_upcoming_trains_at_station(self, feed_index, station_id, query=None, now=None):
+        """Extract upcoming trains arriving at a specific station.
+
+        Merges the pre-sorted arrivals of the station's stops from the
+        feed's ``FeedIndex``, keeping those due within the next hour of
+        ``now`` (the service clock by default). A ``StationQuery`` narrows
+        the stops, routes and time window scanned.
+        """
+        if feed_index is None:
             return []
         
         if station_id not in self.stations:
             logger.warning(f"Station {station_id} not found in configuration")
             return []
-            
-        station_config = self.stations[station_id]
-        stop_ids = station_config.get('STOP_IDS', {})
         
-        upcoming_trains = []
+        if query is None:
+            query = self.plan_station_query(station_id)
+        stops = query.stops
+        routes = query.routes
+        now = now if now is not None else self.clock()
         
-        for entity in feed_dict.get('entity', []):
-            if 'trip_update' not in entity:
+        upcoming_trains = []
+        for arrival in feed_index.upcoming(stops, now=now, window=query.window):
+            if routes is not None and arrival.route_id not in routes:
                 continue
-                
-            trip_update = entity['trip_update']
             
-            # Skip if no trip or route information
-            if 'trip' not in trip_update or 'route_id' not in trip_update['trip']:
-                continue
-                
-            route_id = trip_update['trip']['route_id']
+            train_info = {
+                'route_id': arrival.route_id,
+                'trip_id': arrival.trip_id,
+                'direction': stops[arrival.stop_id],
+                'arrival_time': arrival.arrival_time,
+                'arrival_time_formatted': self.format_time(arrival.arrival_time),
+                'minutes_away': int((arrival.arrival_time - now) / 60)
+            }
             
-            # Only process our target routes
-            if route_id not in self.target_routes:
-                continue
+            # Get additional NYC subway specific info if available
+            if arrival.track:
+                train_info['track'] = arrival.track
                 
-            # Skip if no stop time updates
-            if 'stop_time_update' not in trip_update:
+            upcoming_trains.append(train_info)
+            if query.limit is not None and len(upcoming_trains) >= query.limit:
+                break
+        
+        return upcoming_trains
+
+    def get_station_feeds(self, station_id, routes=None):
+        """Return the feed URLs that carry a station's routes, mapped to their feed IDs.
+
+        Feed IDs that share a URL (e.g. ``123`` and ``456``) resolve to a
+        single entry so the payload is fetched and scanned once. When
+        ``routes`` is given, only feeds carrying those routes are returned.
+        """
+        station_config = self.stations.get(station_id, {})
+        station_routes = station_config.get('ROUTES', [])
+        feeds_to_fetch = {}
+        
+        # Map routes to feeds
+        for route in station_routes:
+            if routes is not None and route not in routes:
                 continue
-            
-            # Get direction if available through NYC extensions
-            direction = None
-            if 'nyct_trip_descriptor' in trip_update['trip']:
-                nyct_info = trip_update['trip']['nyct_trip_descriptor']
-                if 'direction' in nyct_info:
-                    direction = nyct_info['direction']
-            
-            # Look for station stops in this trip
-            for stop in trip_update['stop_time_update']:
-                stop_id = stop.get('stop_id', '')
-                
-                # Check if this is a station stop
-                is_station_stop = False
-                direction_text = None
-                
-                for key, value in stop_ids.items():
-                    if stop_id == value:
-                        is_station_stop = True
-                        # Determine direction based on the configuration
-                        directions = station_config.get('DIRECTIONS', {})
-                        for direction_key, direction_config in directions.items():
-                            if key in direction_config.get('stop_id_keys', []):
-                                direction_text = direction_config.get('display_name', direction_key)
-                                break
-                        break
-                
-                if not is_station_stop:
-                    continue
-                
-                # Get arrival time
-                arrival_time = None
-                if 'arrival' in stop and 'time' in stop['arrival']:
-                    arrival_time = stop['arrival']['time']
-                
-                # Only include future arrivals (within the next hour)
-                if arrival_time:
-                    now = time.time()
-                    if arrival_time > now and arrival_time < now + 3600:  # Within the next hour
-                        train_info = {
-                            'route_id': route_id,
-                            'direction': direction_text,
-                            'arrival_time': arrival_time,
-                            'arrival_time_formatted': self.format_time(arrival_time),
-                            'minutes_away': int((arrival_time - now) / 60)
-                        }
-                        
-                        # Get additional NYC subway specific info if available
-                        if 'nyct_stop_time_update' in stop:
-                            nyct_stop_info = stop['nyct_stop_time_update']
-                            if 'scheduled_track' in nyct_stop_info:
-                                train_info['track'] = nyct_stop_info['scheduled_track']
-                                
-                        upcoming_trains.append(train_info)
-        
-        # Sort by arrival time
-        return sorted(upcoming_trains, key=lambda x: x['arrival_time'])
-
-    def get_station_trains(self, station_id):
-        """Fetch and return train data for a specific station."""
+            for feed_id in self.route_feeds.get(route, ()):
+                if feed_id in self.feed_urls:
+                    feed_ids = feeds_to_fetch.setdefault(self.feed_urls[feed_id], [])
+                    if feed_id not in feed_ids:
+                        feed_ids.append(feed_id)
+        
+        return feeds_to_fetch
+
+    def plan_station_query(self, station_id, line=None, routes=None, direction=None,
+                           max_minutes=None, limit=None):
+        """Resolve a station's filters into the line groups, routes, stops and feeds to scan.
+
+        - ``line``: a line group from the station's ``LINE_GROUPS``
+        - ``routes``: route IDs to keep
+        - ``direction``: a direction key from the station's ``DIRECTIONS``
+        - ``max_minutes``: only arrivals due within this many minutes (at most 60)
+        - ``limit``: maximum number of trains returned
+
+        A line group the station doesn't serve selects no trains there, so a
+        multi-station query only returns that group's stations. Unknown
+        directions are ignored, as the API always has. Feeds that carry none
+        of the selected routes are never fetched.
+        """
+        station_config = self.stations[station_id]
+        line_groups = station_config.get('LINE_GROUPS', {})
+        directions = station_config.get('DIRECTIONS', {})
+        
+        selected_routes = set(routes) if routes else None
+        reported_groups = tuple(line_groups)
+        if line:
+            reported_groups = (line,) if line in line_groups else ()
+            group_routes = set(line_groups[line].get('routes', [])) if line in line_groups else set()
+            selected_routes = group_routes if selected_routes is None else selected_routes & group_routes
+        
+        stops = self.station_tables[station_id].stops
+        if direction in directions:
+            display_name = directions[direction].get('display_name', direction)
+            stops = {stop_id: text for stop_id, text in stops.items() if text == display_name}
+        
+        window = 3600
+        if max_minutes is not None:
+            window = min(window, max(0, max_minutes) * 60)
+        
+        return StationQuery(
+            station_id=station_id,
+            line_groups=reported_groups,
+            directions=(direction,) if direction in directions else tuple(directions),
+            routes=frozenset(selected_routes) if selected_routes is not None else None,
+            stops=stops,
+            window=window,
+            limit=limit,
+            feeds=self.get_station_feeds(station_id, selected_routes)
+        )
+
+    def get_station_trains(self, station_id, **filters):
+        """Fetch and return train data for a specific station.
+
+        Accepts the filters of ``plan_station_query``.
+        """
         if station_id not in self.stations:
             logger.warning(f"Station {station_id} not found in configuration")
             return {"error": f"Station {station_id} not found in configuration"}
-            
+        
+        # Fetch data for required feeds
+        query = self.plan_station_query(station_id, **filters)
+        snapshots = {url: self.get_feed_snapshot(url) for url in query.feeds}
+        
+        return self.build_station_result(query, snapshots)
+
+    async def get_feed_snapshot_async(self, url):
+        """Return a feed snapshot without blocking the event loop, or None after the feed timeout.
+
+        Cached snapshots, fresh or stale, are returned straight from the
+        event loop. Only a feed with no snapshot yet is loaded in a worker
+        thread, once; every other request for it awaits that same load
+        instead of tying up a thread of its own.
+        """
+        snapshot = self.feed_cache.lookup(url)
+        if snapshot is not None:
+            return snapshot
+        
+        loop = asyncio.get_running_loop()
+        load = self.pending_loads.get(url)
+        if load is None or load.get_loop() is not loop:
+            load = loop.create_task(asyncio.to_thread(self.get_feed_snapshot, url))
+            self.pending_loads[url] = load
+            load.add_done_callback(lambda task: self.finish_pending_load(url, task))
+        else:
+            FEED_CACHE_LOOKUPS.labels('coalesced').inc()
+        try:
+            return await asyncio.wait_for(asyncio.shield(load), timeout=self.feed_timeout)
+        except asyncio.TimeoutError:
+            # The load keeps running in its thread and will still fill the cache
+            logger.warning(f"Timed out after {self.feed_timeout}s waiting for feed {url}")
+            return None
+
+    def finish_pending_load(self, url, task):
+        """Forget a finished cold load of ``url`` started by ``get_feed_snapshot_async``."""
+        if self.pending_loads.get(url) is task:
+            del self.pending_loads[url]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error loading feed {url}: {str(task.exception())}")
+
+    async def get_station_trains_async(self, station_id, **filters):
+        """Fetch all feeds for a station concurrently and return its train data."""
+        if station_id not in self.stations:
+            logger.warning(f"Station {station_id} not found in configuration")
+            return {"error": f"Station {station_id} not found in configuration"}
+        
+        query = self.plan_station_query(station_id, **filters)
+        snapshots = await self.get_query_snapshots_async(query)
+        
+        return self.build_station_result(query, snapshots)
+
+    async def get_query_snapshots_async(self, query):
+        """Fetch the feeds of a ``StationQuery`` concurrently, returning snapshots keyed by URL."""
+        with stage('feeds'):
+            results = await asyncio.gather(*(self.get_feed_snapshot_async(url) for url in query.feeds))
+        return dict(zip(query.feeds, results))
+
+    async def get_stations_trains_async(self, station_ids, **filters):
+        """Fetch the union of feeds for several stations once and return each station's train data."""
+        queries = {}
+        urls = {}
+        for station_id in station_ids:
+            if station_id in self.stations:
+                queries[station_id] = self.plan_station_query(station_id, **filters)
+                urls.update(dict.fromkeys(queries[station_id].feeds))
+        
+        with stage('feeds'):
+            results = await asyncio.gather(*(self.get_feed_snapshot_async(url) for url in urls))
+        snapshots = dict(zip(urls, results))
+        
+        def build_all():
+            trains = {}
+            for station_id in station_ids:
+                if station_id not in queries:
+                    logger.warning(f"Station {station_id} not found in configuration")
+                    trains[station_id] = {"error": f"Station {station_id} not found in configuration"}
+                else:
+                    trains[station_id] = self.build_station_result(queries[station_id], snapshots)
+            return trains
+        
+        # One hop off the event loop for the whole batch, which can be large
+        return await asyncio.to_thread(build_all)
+
+    def get_station_trains_at(self, station_id, when, **filters):
+        """Return a station's train data as of Unix time ``when`` from the archive, or None if it has none."""
+        if station_id not in self.stations:
+            logger.warning(f"Station {station_id} not found in configuration")
+            return {"error": f"Station {station_id} not found in configuration"}
+        if self.archive is None:
+            return None
+        
+        query = self.plan_station_query(station_id, **filters)
+        snapshots = {}
+        for url in query.feeds:
+            entry = self.archive.entry_at(url, when)
+            if entry is None:
+                continue
+            feed_index = self.load_archived_index(url, entry)
+            if feed_index is not None:
+                snapshots[url] = FeedSnapshot(url, 0, entry.fetched_at, feed_index, digest=entry.digest.hex())
+        if not snapshots:
+            return None
+        
+        return self.build_station_result(query, snapshots, now=when)
+
+    def find_nearby_stations(self, lat, lon, radius=800, max_stations=5):
+        """Return ``[(distance_m, station_id)]`` for the closest stations within ``radius`` meters."""
+        return self.station_grid.nearest(lat, lon, k=max_stations, radius_m=radius)
+
+    async def get_nearby_trains_async(self, lat, lon, radius=800, max_stations=5, **filters):
+        """Return train data for the stations closest to a point, nearest first.
+
+        The stations' feeds are fetched once and shared, as in
+        ``get_stations_trains_async``. Each item is ``(station_id,
+        distance_m, result)``.
+        """
+        nearby = self.find_nearby_stations(lat, lon, radius, max_stations)
+        trains = await self.get_stations_trains_async([station_id for _, station_id in nearby], **filters)
+        return [(station_id, distance, trains[station_id]) for distance, station_id in nearby]
+
+    async def get_station_changes_async(self, station_id, since=None, **filters):
+        """Return what changed in a station's arrivals since a change-log version token.
+
+        When the token cannot be answered from the retained history (first
+        call, another worker's token, or too old), ``reset`` is True and
+        ``all_trains`` carries the full current arrivals instead.
+        """
+        if station_id not in self.stations:
+            logger.warning(f"Station {station_id} not found in configuration")
+            return {"error": f"Station {station_id} not found in configuration"}
+        
+        query = self.plan_station_query(station_id, **filters)
+        # Taken before loading so a reset never skips a version published meanwhile
+        version_before = self.change_log.version
+        snapshots = await self.get_query_snapshots_async(query)
+        reset, changes, version = self.change_log.changes_since(since, query.feeds, query.stops, query.routes)
+        
+        result = {
+            "station": self.stations[station_id].get('DISPLAY_NAME', station_id),
+            "since": since,
+            "version": version,
+            "reset": reset,
+            "changes": []
+        }
+        if reset:
+            result["version"] = version_before
+            result["all_trains"] = self.build_station_result(query, snapshots)["all_trains"]
+            return result
+        
+        for change in changes:
+            item = {
+                "change": change.change,
+                "trip_id": change.trip_id,
+                "route_id": change.route_id,
+                "direction": query.stops.get(change.stop_id),
+                "arrival_time": change.arrival_time,
+                "previous_arrival_time": change.previous_arrival_time
+            }
+            if change.arrival_time:
+                item["arrival_time_formatted"] = self.format_time(change.arrival_time)
+            if change.track:
+                item["track"] = change.track
+            result["changes"].append(item)
+        return result
+
+    def describe_arrival(self, arrival, now):
+        """Format one arrival of a trip, naming the configured station at its stop if any."""
+        stations = self.stop_index.get(arrival.stop_id)
+        station_id = stations[0] if stations else None
+        stop_info = {
+            'stop_id': arrival.stop_id,
+            'station': self.stations[station_id].get('DISPLAY_NAME') if station_id else None,
+            'direction': self.station_tables[station_id].stops.get(arrival.stop_id) if station_id else None,
+            'arrival_time': arrival.arrival_time,
+            'arrival_time_formatted': self.format_time(arrival.arrival_time),
+            'minutes_away': int((arrival.arrival_time - now) / 60)
+        }
+        if arrival.track:
+            stop_info['track'] = arrival.track
+        return stop_info
+
+    def get_feed_ids_by_url(self, feed_ids=None):
+        """Group feed IDs by URL so feeds sharing a payload are loaded once."""
+        feeds = {}
+        for feed_id in (feed_ids if feed_ids is not None else self.feed_urls.keys()):
+            url = self.feed_urls.get(feed_id)
+            if url:
+                feeds.setdefault(url, []).append(feed_id)
+        return feeds
+
+    async def get_trip_async(self, trip_id):
+        """Return the remaining stops and ETAs of one trip, or None if no feed carries it.
+
+        Trip IDs don't say which feed they belong to, so every feed is
+        consulted; each lookup is a dictionary hit on the feed's trip index.
+        """
+        feeds = self.get_feed_ids_by_url()
+        snapshots = await asyncio.gather(*(self.get_feed_snapshot_async(url) for url in feeds))
+        now = self.clock()
+        
+        for (url, feed_ids), snapshot in zip(feeds.items(), snapshots):
+            if snapshot is None or snapshot.feed is None:
+                continue
+            arrivals = snapshot.feed.trip(trip_id)
+            if arrivals is None:
+                continue
+            return {
+                "trip_id": trip_id,
+                "route_id": arrivals[0].route_id,
+                "timestamp": datetime.fromtimestamp(now).isoformat(),
+                "stops": [self.describe_arrival(arrival, now) for arrival in arrivals if arrival.arrival_time > now],
+                "feeds": {
+                    feed_id: self.describe_feed(url, snapshot)
+                    for feed_id in feed_ids
+                }
+            }
+        return None
+
+    async def get_route_trains_async(self, route_id):
+        """Return every active trip on a route with its next and final stops, soonest first.
+
+        Returns None for a route that no configured feed carries.
+        """
+        feed_ids = self.route_feeds.get(route_id)
+        if not feed_ids:
+            return None
+        feeds = self.get_feed_ids_by_url(feed_ids)
+        snapshots = await asyncio.gather(*(self.get_feed_snapshot_async(url) for url in feeds))
+        now = self.clock()
+        
+        result = {
+            "route_id": route_id,
+            "timestamp": datetime.fromtimestamp(now).isoformat(),
+            "trains": [],
+            "feeds": {}
+        }
+        trains = []
+        for (url, url_feed_ids), snapshot in zip(feeds.items(), snapshots):
+            if snapshot is None or snapshot.feed is None:
+                continue
+            for feed_id in url_feed_ids:
+                result["feeds"][feed_id] = self.describe_feed(url, snapshot)
+            for trip_id, arrivals in snapshot.feed.route_trips(route_id):
+                remaining = [arrival for arrival in arrivals if arrival.arrival_time > now]
+                if not remaining:
+                    continue
+                trains.append({
+                    "trip_id": trip_id,
+                    "next_stop": self.describe_arrival(remaining[0], now),
+                    "final_stop": self.describe_arrival(remaining[-1], now),
+                    "remaining_stops": len(remaining)
+                })
+        
+        trains.sort(key=lambda train: train["next_stop"]["arrival_time"])
+        result["trains"] = trains
+        return result
+
+    def build_station_result(self, query, snapshots, now=None):
+        """Build a station's train data for a ``StationQuery`` from the snapshots of its feeds.
+
+        Arrivals are counted from ``now``, the service clock by default.
+        """
+        with stage('extract', STATION_EXTRACT_SECONDS, query.station_id):
+            return self._build_station_result(query, snapshots, now)
+
+    def _build_station_result(self, query, snapshots, now=None):
+        station_id = query.station_id
         station_config = self.stations[station_id]
-        timestamp = datetime.now()
+        live = now is None
+        now = now if now is not None else self.clock()
+        timestamp = datetime.fromtimestamp(now)
         
         result = {
             "station": station_config.get('DISPLAY_NAME', station_id),
             "timestamp": timestamp.isoformat(),
             "formatted_time": timestamp.strftime('%I:%M:%S %p, %B %d, %Y'),
             "lines": {},
-            "all_trains": []
+            "all_trains": [],
+            "feeds": {}
         }
         
         # Initialize lines structure based on configuration
         line_groups = station_config.get('LINE_GROUPS', {})
-        for line_group, line_config in line_groups.items():
+        for line_group in query.line_groups:
             result["lines"][line_group] = {
-                "name": line_config.get('display_name', line_group)
+                "name": line_groups[line_group].get('display_name', line_group)
             }
             # Initialize directions for this line group
-            for direction_key in station_config.get('DIRECTIONS', {}).keys():
+            for direction_key in query.directions:
                 result["lines"][line_group][direction_key] = []
         
-        all_upcoming_trains = []
+        trains_by_feed = []
         
-        # Determine which feeds to fetch based on the station configuration
-        station_routes = station_config.get('ROUTES', [])
-        feeds_to_fetch = set()
-        
-        # Map routes to feeds
-        for route in station_routes:
-            for feed_id, routes in self.feed_to_routes.items():
-                if route in routes:
-                    feeds_to_fetch.add(feed_id)
+        for url, feed_ids in query.feeds.items():
+            snapshot = snapshots.get(url)
+            if snapshot is not None and snapshot.feed is not None:
+                if live:
+                    age = snapshot.age()
+                    FEED_AGE_AT_SERVE_SECONDS.labels(self.feed_labels.get(url, url)).observe(age)
+                    for feed_id in feed_ids:
+                        result["feeds"][feed_id] = self.describe_feed(url, snapshot, age)
+                else:
+                    for feed_id in feed_ids:
+                        result["feeds"][feed_id] = self.describe_archived_feed(snapshot, now)
+                upcoming_trains = self.get_upcoming_trains_at_station(snapshot.feed, station_id, query, now)
+                trains_by_feed.append(upcoming_trains)
+                logger.info(f"Fetched {len(upcoming_trains)} trains for {station_id} from feed {'/'.join(feed_ids)}")
+            elif live and not self.breaker.allow(url):
+                # No data to fall back on; say why instead of silently leaving the feed out
+                for feed_id in feed_ids:
+                    result["feeds"][feed_id] = self.describe_feed(url, None)
         
-        # Fetch data for required feeds
-        for feed_id in feeds_to_fetch:
-            if feed_id in self.feed_urls:
-                url = self.feed_urls[feed_id]
-                binary_data = self.fetch_mta_data(url)
-                if binary_data:
-                    feed_dict = self.parse_gtfs_data(binary_data)
-                    if feed_dict:
-                        upcoming_trains = self.get_upcoming_trains_at_station(feed_dict, station_id)
-                        all_upcoming_trains.extend(upcoming_trains)
-                        logger.info(f"Fetched {len(upcoming_trains)} trains for {station_id} from feed {feed_id}")
-        
-        # Sort by arrival time
-        all_upcoming_trains = sorted(all_upcoming_trains, key=lambda x: x['arrival_time'])
+        # Merge the per-feed lists, each already sorted by arrival time
+        all_upcoming_trains = list(heapq.merge(*trains_by_feed, key=lambda x: x['arrival_time']))[:query.limit]
         result["all_trains"] = all_upcoming_trains
         
         # Group trains by line and direction
+        tables = self.station_tables[station_id]
+        route_groups = tables.route_groups
+        direction_keys = tables.direction_keys
         for train in all_upcoming_trains:
-            route_id = train['route_id']
-            direction = train['direction']
-            
-            # Find which line group this route belongs to
-            for line_group, line_config in line_groups.items():
-                if route_id in line_config.get('routes', []):
-                    # Find which direction this train is going
-                    for direction_key, direction_config in station_config.get('DIRECTIONS', {}).items():
-                        if direction == direction_config.get('display_name'):
-                            if direction_key in result["lines"][line_group]:
-                                result["lines"][line_group][direction_key].append(train)
-                                break
+            direction_key = direction_keys.get(train['direction'])
+            if direction_key is None:
+                continue
+            for line_group in route_groups.get(train['route_id'], ()):
+                if line_group in result["lines"] and direction_key in result["lines"][line_group]:
+                    result["lines"][line_group][direction_key].append(train)
         
         return result
 
@@ -260,6 +1082,8 @@ class MTAService:
 # Initialize service with config path (can be overridden with environment variable)
 config_path = os.environ.get("MTA_CONFIG_PATH", "mta_data/mta_config.json")
 _service = None
+_poller = None
+_broker = None
 
 def get_service():
     """Get or initialize the MTA service singleton."""
@@ -272,19 +1096,73 @@ def get_service():
             raise
     return _service
 
+def get_poller():
+    """Get or initialize the background feed poller singleton."""
+    global _poller
+    if _poller is None:
+        interval = float(os.environ.get("MTA_POLL_INTERVAL", 30))
+        _poller = FeedPoller(
+            get_service(), interval=interval,
+            idle_interval=float(os.environ.get("MTA_POLL_IDLE_INTERVAL", 300)),
+            idle_after=float(os.environ.get("MTA_POLL_IDLE_AFTER", 300))
+        )
+    return _poller
+
+def get_broker():
+    """Get or initialize the station arrivals pub/sub broker singleton."""
+    global _broker
+    if _broker is None:
+        _broker = ArrivalBroker(get_service())
+    return _broker
+
 # Function to get Union Square trains (for compatibility with existing code)
-def get_union_square_trains():
+def get_union_square_trains(**filters):
     """Get train data for Union Square station."""
     service = get_service()
-    return service.get_station_trains("union_square")
+    return service.get_station_trains("union_square", **filters)
 
 # Functions for other stations can be added as needed
-def get_times_square_trains():
+def get_times_square_trains(**filters):
     """Get train data for Times Square station."""
     service = get_service()
-    return service.get_station_trains("times_square")
+    return service.get_station_trains("times_square", **filters)
 
-def get_station_trains(station_id):
+def get_station_trains(station_id, **filters):
     """Generic function to get train data for any station."""
     service = get_service()
-    return service.get_station_trains(station_id)
\ No newline at end of file
+    return service.get_station_trains(station_id, **filters)
+
+async def get_station_trains_async(station_id, **filters):
+    """Generic function to get train data for any station without blocking the event loop."""
+    service = get_service()
+    return await service.get_station_trains_async(station_id, **filters)
+
+async def get_nearby_trains_async(lat, lon, radius=800, max_stations=5, **filters):
+    """Get train data for the stations closest to a point."""
+    service = get_service()
+    return await service.get_nearby_trains_async(lat, lon, radius, max_stations, **filters)
+
+async def get_trip_async(trip_id):
+    """Get the remaining stops of one trip across all feeds."""
+    service = get_service()
+    return await service.get_trip_async(trip_id)
+
+async def get_route_trains_async(route_id):
+    """Get every active trip on a route."""
+    service = get_service()
+    return await service.get_route_trains_async(route_id)
+
+async def get_station_trains_at_async(station_id, when, **filters):
+    """Get a station's train data as of a past time, read from the feed archive."""
+    service = get_service()
+    return await asyncio.to_thread(service.get_station_trains_at, station_id, when, **filters)
+
+async def get_station_changes_async(station_id, since=None, **filters):
+    """Get the changes to a station's arrivals since a change-log version token."""
+    service = get_service()
+    return await service.get_station_changes_async(station_id, since, **filters)
+
+async def get_stations_trains_async(station_ids, **filters):
+    """Get train data for several stations, fetching each shared feed once."""
+    service = get_service()
+    return await service.get_stations_trains_async(station_ids, **filters)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from google.transit import gtfs_realtime_pb2
+
+# Run from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main refuses to import without an API key
+os.environ.setdefault('API_KEY', 'test-key')
+
+from mta_data import subway  # noqa: E402
+from mta_data.feed_cache import FeedLoad  # noqa: E402
+from mta_data.feed_index import FeedIndex  # noqa: E402
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mta_data', 'mta_config.json')
+
+# Settings that would make a test service touch disk or other processes
+SERVICE_ENVIRONMENT = (
+    'MTA_SHARED_SNAPSHOT_DIR', 'MTA_STATIC_GTFS', 'MTA_FEED_STORE_DIR', 'MTA_ARCHIVE_DIR',
+    'MTA_REPLAY_START', 'MTA_PARSE_WORKERS',
+)
+
+
+def build_feed(trips, timestamp=1700000000):
+    """Build a FeedMessage from ``{trip_id: (route_id, [(stop_id, arrival_time), ...])}``."""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = timestamp
+    for trip_id, (route_id, stops) in trips.items():
+        entity = feed.entity.add()
+        entity.id = trip_id
+        entity.trip_update.trip.trip_id = trip_id
+        entity.trip_update.trip.route_id = route_id
+        for stop_id, arrival_time in stops:
+            stop = entity.trip_update.stop_time_update.add()
+            stop.stop_id = stop_id
+            stop.arrival.time = arrival_time
+    return feed
+
+
+TRIPS = {
+    "A1": ("A", [("101N", 1000), ("102N", 1060), ("103N", 1120)]),
+    "A2": ("A", [("101N", 1300), ("102N", 1360)]),
+    "C1": ("C", [("102N", 1030), ("103N", 1090)]),
+    "A3": ("A", [("103S", 1500), ("102S", 1560)]),
+}
+
+
+@pytest.fixture
+def feed_index():
+    """A small FeedIndex over two routes and four trips."""
+    return FeedIndex.build(build_feed(TRIPS))
+
+
+def index_contents(index):
+    """Everything a FeedIndex answers, in a comparable form."""
+    return {
+        "timestamp": index.timestamp,
+        "stops": dict(index.stop_arrivals()),
+        "trips": {trip_id: index.trip(trip_id) for trip_id in index.trip_ids()},
+        "routes": {route_id: index.route_trips(route_id) for route_id in ("A", "C")},
+    }
+
+
+class FakeUpstream:
+    """Stands in for the MTA: feeds are published by the test instead of fetched."""
+
+    def __init__(self, service):
+        self.service = service
+        self.loads = {}
+        service.feed_cache.loader = self.load
+
+    def load(self, url, previous):
+        return self.loads.get(url)
+
+    def publish(self, feed_id, trips, now=None):
+        """Publish ``trips`` as feed ``feed_id``, with arrival times in seconds from ``now``."""
+        now = now if now is not None else time.time()
+        url = self.service.feed_urls[feed_id]
+        shifted = {
+            trip_id: (route_id, [(stop_id, int(now + offset)) for stop_id, offset in stops])
+            for trip_id, (route_id, stops) in trips.items()
+        }
+        self.loads[url] = FeedLoad(self.service.build_feed_index(build_feed(shifted, int(now))))
+        return self.service.feed_cache.refresh(url)
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    """Build MTAServices on the bundled configuration, with settings given as environment variables."""
+    for name in SERVICE_ENVIRONMENT:
+        monkeypatch.delenv(name, raising=False)
+    services = []
+
+    def make(**environment):
+        for name, value in environment.items():
+            monkeypatch.setenv(name, str(value))
+        services.append(subway.MTAService(CONFIG_PATH))
+        return services[-1]
+
+    yield make
+    for service in services:
+        service.close()
+
+
+@pytest.fixture
+def service(make_service, monkeypatch):
+    """The MTAService behind the API; feeds only come from ``upstream``."""
+    service = make_service()
+    monkeypatch.setattr(subway, '_service', service)
+    monkeypatch.setattr(subway, '_broker', None)
+    return service
+
+
+@pytest.fixture
+def upstream(service):
+    return FakeUpstream(service)
+
+
+@pytest.fixture
+def client(service):
+    """A client for the API, served by ``service`` without starting the poller."""
+    import main
+    main.response_cache.clear()
+    return TestClient(main.app, headers={"X-API-Key": main.API_KEY})
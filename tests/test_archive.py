@@ -0,0 +1,95 @@
+import pytest
+
+from mta_data.archive import INDEX_ENTRY, INDEX_SUFFIX, FeedArchive
+
+URL = "https://example.com/feed"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return FeedArchive(str(tmp_path), segment_seconds=100)
+
+
+def test_payloads_round_trip(archive):
+    archive.append(URL, b"one", 1000)
+    archive.append(URL, b"two", 1050)
+    entries = archive.entries(URL)
+    assert [(e.fetched_at, archive.read(e)) for e in entries] == [(1000, b"one"), (1050, b"two")]
+    assert archive.urls() == [URL]
+
+
+def test_unchanged_payloads_are_skipped(archive):
+    assert archive.append(URL, b"same", 1000)
+    assert not archive.append(URL, b"same", 1010)
+    assert archive.append(URL, b"other", 1020)
+    assert len(archive.entries(URL)) == 2
+
+
+def test_deduplication_survives_a_restart(archive):
+    archive.append(URL, b"same", 1000)
+    reopened = FeedArchive(archive.directory, segment_seconds=100)
+    assert not reopened.append(URL, b"same", 1010)
+    assert reopened.append(URL, b"new", 1020)
+
+
+def test_entry_at_returns_the_version_current_at_a_time(archive):
+    archive.append(URL, b"one", 1000)
+    archive.append(URL, b"two", 1150)
+    assert archive.entry_at(URL, 999) is None
+    assert archive.read(archive.entry_at(URL, 1000)) == b"one"
+    # The lookup falls back to an earlier segment when the later one starts after ``when``
+    assert archive.read(archive.entry_at(URL, 1120)) == b"one"
+    assert archive.read(archive.entry_at(URL, 5000)) == b"two"
+
+
+def test_entries_are_split_into_segments_and_filtered_by_time(archive):
+    for i, when in enumerate((1000, 1050, 1150, 1250)):
+        archive.append(URL, b"payload %d" % i, when)
+    assert archive.segment_starts(URL) == [1000, 1100, 1200]
+    assert [e.fetched_at for e in archive.entries(URL, 1050, 1250)] == [1050, 1150]
+
+
+def test_old_segments_are_expired(tmp_path):
+    archive = FeedArchive(str(tmp_path), segment_seconds=100, retention_seconds=250)
+    archive.append(URL, b"a", 1000)
+    archive.append(URL, b"b", 1100)
+    archive.append(URL, b"c", 1450)
+    assert archive.segment_starts(URL) == [1100, 1400]
+
+
+def test_torn_index_entry_is_ignored_and_trimmed(archive):
+    archive.append(URL, b"one", 1000)
+    index_path = archive._segment_path(URL, 1000, INDEX_SUFFIX)
+    with open(index_path, "ab") as f:
+        f.write(b"\x01" * (INDEX_ENTRY.size - 1))
+    assert [e.fetched_at for e in archive.entries(URL)] == [1000]
+
+    archive.append(URL, b"two", 1010)
+    assert [archive.read(e) for e in archive.entries(URL)] == [b"one", b"two"]
+
+
+def test_replay_clock_runs_from_its_start(monkeypatch):
+    from mta_data import archive as archive_module
+    from mta_data.archive import ReplayClock
+
+    now = [100.0]
+    monkeypatch.setattr(archive_module.time, "monotonic", lambda: now[0])
+    clock = ReplayClock(1000, speed=10)
+    now[0] += 2
+    assert clock() == 1020
+
+
+def test_station_history_is_read_from_the_archive(tmp_path, make_service):
+    from conftest import build_feed
+
+    service = make_service(MTA_ARCHIVE_DIR=tmp_path)
+    url = service.feed_urls["l"]
+    service.archive.append(url, build_feed({"L-1": ("L", [("L03S", 10300)])}, 10000).SerializeToString(), 10000)
+    service.archive.append(url, build_feed({"L-2": ("L", [("L03S", 10900)])}, 10600).SerializeToString(), 10600)
+
+    result = service.get_station_trains_at("union_square", 10100, line="l")
+    assert [t["trip_id"] for t in result["all_trains"]] == ["L-1"]
+    assert [t["minutes_away"] for t in result["all_trains"]] == [3]
+    result = service.get_station_trains_at("union_square", 10700, line="l")
+    assert [t["trip_id"] for t in result["all_trains"]] == ["L-2"]
+    assert service.get_station_trains_at("union_square", 9000, line="l") is None
@@ -0,0 +1,87 @@
+import pytest
+
+from mta_data import breaker as breaker_module
+from mta_data.breaker import CircuitBreaker
+
+URL = "https://example.com/feed"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module.time, "time", clock)
+    # Always take the longest jittered delay
+    monkeypatch.setattr(breaker_module.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def test_breaker_opens_after_the_failure_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, base_delay=5, max_delay=300)
+    assert not breaker.record_failure(URL)
+    assert not breaker.record_failure(URL)
+    assert breaker.state(URL) == ("closed", 0.0)
+    assert breaker.allow(URL)
+
+    assert breaker.record_failure(URL)
+    assert breaker.is_open(URL)
+    assert not breaker.allow(URL)
+    assert breaker.state(URL) == ("open", 5.0)
+    assert breaker.retry_at(URL) == 1005.0
+
+
+def test_breaker_half_opens_after_the_delay_and_backs_off(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=5, max_delay=12)
+    breaker.record_failure(URL)
+    clock.now += 5
+    assert breaker.allow(URL)
+    assert breaker.state(URL) == ("half-open", 0.0)
+
+    # A failed probe reopens for twice as long, capped at max_delay
+    breaker.record_failure(URL)
+    assert breaker.state(URL) == ("open", 10.0)
+    clock.now += 10
+    breaker.record_failure(URL)
+    assert breaker.state(URL) == ("open", 12.0)
+
+
+def test_success_closes_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=5)
+    breaker.record_failure(URL)
+    clock.now += 5
+    breaker.record_success(URL)
+    assert breaker.state(URL) == ("closed", 0.0)
+    assert not breaker.is_open(URL)
+    assert breaker.retry_at(URL) == 0.0
+
+
+def test_breakers_are_per_url(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure(URL)
+    assert not breaker.allow(URL)
+    assert breaker.allow("https://example.com/other")
+
+
+def test_jitter_keeps_the_delay_between_half_and_full(monkeypatch):
+    monkeypatch.setattr(breaker_module.time, "time", lambda: 0.0)
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=8)
+    breaker.record_failure(URL)
+    assert 4.0 <= breaker.retry_at(URL) <= 8.0
+
+
+def test_long_outage_keeps_backing_off(clock):
+    # Float delays, as the service uses; int delays never overflow
+    breaker = CircuitBreaker(failure_threshold=3, base_delay=5.0, max_delay=300.0)
+    for _ in range(5000):
+        breaker.record_failure(URL)
+    assert breaker.state(URL) == ("open", 300.0)
+    clock.now += 300
+    assert breaker.record_failure(URL)
+    assert breaker.retry_at(URL) == clock.now + 300
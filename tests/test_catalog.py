@@ -0,0 +1,121 @@
+import os
+import zipfile
+
+import pytest
+
+from mta_data import catalog as catalog_module
+from mta_data.catalog import LazyMapping, build_catalog, load_catalog
+
+GTFS = {
+    "stops.txt": """stop_id,stop_name,stop_lat,stop_lon,parent_station
+635,14 St-Union Sq,40.734673,-73.989951,
+635N,14 St-Union Sq,40.734673,-73.989951,635
+635S,14 St-Union Sq,40.734673,-73.989951,635
+L03,14 St-Union Sq,40.734789,-73.990730,
+L03N,14 St-Union Sq,40.734789,-73.990730,L03
+G22,Court Sq,40.746554,-73.943832,
+G22N,Court Sq,40.746554,-73.943832,G22
+G22S,Court Sq,40.746554,-73.943832,G22
+A09,168 St,40.840719,-73.939561,
+A09S,168 St,40.840719,-73.939561,A09
+""",
+    "transfers.txt": """from_stop_id,to_stop_id,transfer_type,min_transfer_time
+635,L03,2,180
+""",
+    "trips.txt": """route_id,service_id,trip_id
+6,weekday,six
+L,weekday,el
+G,weekday,gee
+A,weekday,ay
+C,weekday,cee
+""",
+    "stop_times.txt": """trip_id,arrival_time,departure_time,stop_id,stop_sequence
+six,08:00:00,08:00:00,635N,1
+six,08:10:00,08:10:00,635S,2
+el,08:00:00,08:00:00,L03N,1
+gee,08:00:00,08:00:00,G22N,1
+gee,08:20:00,08:20:00,G22S,2
+ay,08:00:00,08:00:00,A09S,1
+cee,08:05:00,08:05:00,A09S,1
+""",
+}
+
+
+@pytest.fixture
+def gtfs_zip(tmp_path):
+    path = str(tmp_path / "gtfs.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, text in GTFS.items():
+            archive.writestr(name, text)
+    return path
+
+
+def test_stations_are_merged_into_complexes(gtfs_zip):
+    catalog = load_catalog(gtfs_zip)
+    assert catalog.station_ids() == ["gtfs_635", "gtfs_A09", "gtfs_G22"]
+    assert sorted(catalog.platform_ids(0)) == ["635N", "635S", "L03N"]
+    assert catalog.summary(0) == ("14 St-Union Sq", "14-st-union-sq-635", ["6", "L"])
+
+
+def test_station_config_follows_feed_groups(gtfs_zip):
+    catalog = load_catalog(gtfs_zip)
+    config = catalog.station_config(1, {"ace": ["A", "C", "E"], "g": ["G"]})
+    assert config["LINE_GROUPS"] == {"ace": {"display_name": "A/C Trains", "routes": ["A", "C"]}}
+    assert config["DIRECTIONS"] == {"southbound": {"display_name": "Southbound", "stop_id_keys": ["A09S"]}}
+    assert (config["LAT"], config["LON"]) == (40.840719, -73.939561)
+    assert catalog.station_config(1, {}) is config
+
+
+def test_cache_is_reused_until_the_zip_changes(gtfs_zip, monkeypatch):
+    first = load_catalog(gtfs_zip)
+    assert os.path.exists(gtfs_zip + ".catalog")
+
+    def fail(zip_path):
+        raise AssertionError("catalog rebuilt")
+
+    monkeypatch.setattr(catalog_module, "build_catalog", fail)
+    assert load_catalog(gtfs_zip).station_ids() == first.station_ids()
+
+    monkeypatch.setattr(catalog_module, "build_catalog", build_catalog)
+    stat = os.stat(gtfs_zip)
+    os.utime(gtfs_zip, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    rebuilt = []
+    monkeypatch.setattr(catalog_module, "build_catalog", lambda path: rebuilt.append(path) or build_catalog(path))
+    load_catalog(gtfs_zip)
+    assert rebuilt == [gtfs_zip]
+
+
+def test_unreadable_cache_is_rebuilt(gtfs_zip):
+    load_catalog(gtfs_zip)
+    with open(gtfs_zip + ".catalog", "r+b") as f:
+        f.seek(catalog_module.HEADER.size)
+        f.write(b"\xff" * 16)
+    assert load_catalog(gtfs_zip).station_ids() == ["gtfs_635", "gtfs_A09", "gtfs_G22"]
+
+
+def test_lazy_mapping_builds_each_value_once():
+    built = []
+    mapping = LazyMapping(["a", "b"], lambda key: built.append(key) or key.upper())
+    assert list(mapping) == ["a", "b"] and len(mapping) == 2
+    assert "a" in mapping and "c" not in mapping
+    assert built == []
+    assert mapping["a"] == "A" and mapping["a"] == "A"
+    assert built == ["a"]
+    with pytest.raises(KeyError):
+        mapping["c"]
+
+
+def test_catalog_stations_are_decoded_on_first_lookup(gtfs_zip, make_service):
+    service = make_service(MTA_STATIC_GTFS=gtfs_zip)
+    # The Union Square complex is configured by hand, so the catalog's copy is skipped
+    assert service.catalog_station_ids == ["gtfs_A09", "gtfs_G22"]
+    assert service.catalog._configs == {}
+    assert service.stop_index["G22N"] == ["gtfs_G22"]
+    assert service.catalog_station_summary("gtfs_G22") == ("Court Sq", "court-sq-g22", ["G"])
+    assert [station_id for _, station_id in service.find_nearby_stations(40.7466, -73.9438, 500)] == ["gtfs_G22"]
+    assert service.catalog._configs == {}
+
+    query = service.plan_station_query("gtfs_G22", line="g")
+    assert query.routes == frozenset({"G"})
+    assert service.station_tables["gtfs_G22"].stops == {"G22N": "Northbound", "G22S": "Southbound"}
+    assert list(service.catalog._configs) == [2]
@@ -0,0 +1,135 @@
+from mta_data.changes import ChangeLog, diff_feed_indexes
+from mta_data.feed_cache import FeedSnapshot
+from mta_data.feed_index import FeedIndex
+
+from conftest import build_feed
+
+URL = "https://example.com/feed"
+OTHER_URL = "https://example.com/other"
+
+
+def index(trips):
+    return FeedIndex.build(build_feed(trips))
+
+
+BEFORE = index({
+    "A1": ("A", [("101N", 1000), ("102N", 1060)]),
+    "A2": ("A", [("101N", 1300)]),
+    "C1": ("C", [("101N", 1200)]),
+})
+AFTER = index({
+    "A1": ("A", [("101N", 1030), ("102N", 1060)]),
+    "C1": ("C", [("101N", 1200)]),
+    "C2": ("C", [("101N", 1500)]),
+})
+
+
+def snapshot(version, feed, url=URL):
+    return FeedSnapshot(url, version, 0.0, feed)
+
+
+def test_diff_reports_added_removed_and_changed_arrivals():
+    changes = diff_feed_indexes(BEFORE, AFTER)
+    assert set(changes) == {"101N"}
+    found = sorted((c.change, c.trip_id, c.arrival_time, c.previous_arrival_time) for c in changes["101N"])
+    assert found == [("added", "C2", 1500, None), ("changed", "A1", 1030, 1000), ("removed", "A2", None, 1300)]
+
+
+def test_diff_is_limited_to_the_given_stops():
+    assert diff_feed_indexes(BEFORE, AFTER, {"102N"}) == {}
+
+
+def test_changes_since_a_token():
+    log = ChangeLog()
+    log.record(snapshot(1, BEFORE), None)
+    reset, changes, token = log.changes_since(None, [URL], ["101N"])
+    assert reset and changes == []
+    assert token == f"{log.epoch}-1"
+
+    log.record(snapshot(2, AFTER), snapshot(1, BEFORE))
+    reset, changes, token = log.changes_since(token, [URL], ["101N"])
+    assert not reset
+    assert sorted(c.trip_id for c in changes) == ["A1", "A2", "C2"]
+    assert token == f"{log.epoch}-2"
+
+    reset, changes, _ = log.changes_since(token, [URL], ["101N"], routes={"C"})
+    assert (reset, changes) == (False, [])
+
+
+def test_route_filter_and_other_feeds():
+    log = ChangeLog()
+    log.record(snapshot(1, BEFORE), None)
+    _, _, token = log.changes_since(None, [URL], ["101N"])
+    log.record(snapshot(2, AFTER), snapshot(1, BEFORE))
+    log.record(snapshot(2, AFTER, OTHER_URL), snapshot(1, BEFORE, OTHER_URL))
+
+    reset, changes, _ = log.changes_since(token, [URL], ["101N"], routes={"C"})
+    assert not reset
+    assert [(c.change, c.trip_id) for c in changes] == [("added", "C2")]
+
+
+def test_unchanged_versions_are_not_recorded():
+    log = ChangeLog()
+    log.record(snapshot(1, BEFORE), None)
+    log.record(snapshot(1, BEFORE), snapshot(1, BEFORE))
+    assert log.version == f"{log.epoch}-1"
+
+
+def test_foreign_and_future_tokens_reset():
+    log = ChangeLog()
+    log.record(snapshot(1, BEFORE), None)
+    for token in ("other-1", f"{log.epoch}-99", f"{log.epoch}-x", ""):
+        assert log.changes_since(token, [URL], ["101N"])[0]
+
+
+def test_stops_watched_after_a_version_reset_for_it():
+    log = ChangeLog()
+    log.record(snapshot(1, BEFORE), None)
+    _, _, token = log.changes_since(None, [URL], ["102N"])
+    # Version 2 was only diffed at 102N, so it can't answer for 101N
+    log.record(snapshot(2, AFTER), snapshot(1, BEFORE))
+    assert log.changes_since(token, [URL], ["101N"])[0]
+    assert not log.changes_since(token, [URL], ["102N"])[0]
+
+
+def test_unwatched_stops_cost_nothing_and_idle_watches_expire():
+    log = ChangeLog(idle_after=60)
+    log.record(snapshot(1, BEFORE), None)
+    log.record(snapshot(2, AFTER), snapshot(1, BEFORE))
+    assert log.change_count == 0
+
+    log.changes_since(None, [URL], ["101N"])
+    assert log.watched_stops() == {"101N"}
+    assert log.watched_stops(now=10 ** 12) == frozenset()
+
+
+def test_history_is_capped_by_versions_and_changes():
+    log = ChangeLog(max_diffs=2)
+    log.record(snapshot(1, BEFORE), None)
+    _, _, token = log.changes_since(None, [URL], ["101N"])
+    for version in range(2, 6):
+        previous, current = (BEFORE, AFTER) if version % 2 == 0 else (AFTER, BEFORE)
+        log.record(snapshot(version, current), snapshot(version - 1, previous))
+    assert log.changes_since(token, [URL], ["101N"])[0]
+
+    log = ChangeLog(max_changes=3)
+    log.changes_since(None, [URL], ["101N"])
+    log.record(snapshot(1, BEFORE), None)
+    for version in range(2, 5):
+        previous, current = (BEFORE, AFTER) if version % 2 == 0 else (AFTER, BEFORE)
+        log.record(snapshot(version, current), snapshot(version - 1, previous))
+    assert log.change_count == 3
+
+
+def test_changes_endpoint_returns_deltas_after_a_reset(client, upstream):
+    upstream.publish("l", {"L-1": ("L", [("L03S", 60)])})
+    url = "/api/stations/union-square/trains/changes"
+    first = client.get(url, params={"line": "l"}).json()
+    assert first["reset"]
+    assert [t["trip_id"] for t in first["all_trains"]] == ["L-1"]
+
+    upstream.publish("l", {"L-1": ("L", [("L03S", 60)]), "L-2": ("L", [("L03S", 400)])})
+    second = client.get(url, params={"line": "l", "since": first["version"]}).json()
+    assert not second["reset"]
+    assert [(c["change"], c["trip_id"]) for c in second["changes"]] == [("added", "L-2")]
+    assert second["version"] != first["version"]
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from mta_data.feed_cache import NOT_MODIFIED, FeedCache, FeedLoad
+
+
+def test_concurrent_misses_share_one_load():
+    calls = []
+    release = threading.Event()
+
+    def loader(url, previous):
+        calls.append(url)
+        release.wait(5)
+        return FeedLoad("feed")
+
+    cache = FeedCache(loader, ttl=30)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_snapshot("url"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == ["url"]
+    assert len(results) == 8
+    assert {snapshot.version for snapshot in results} == {1}
+
+
+def test_versions_increase_and_not_modified_keeps_the_version():
+    responses = iter([FeedLoad("v1"), NOT_MODIFIED, FeedLoad("v2")])
+    cache = FeedCache(lambda url, previous: next(responses))
+
+    first = cache.refresh("url")
+    restamped = cache.refresh("url")
+    second = cache.refresh("url")
+
+    assert (first.version, first.feed) == (1, "v1")
+    assert (restamped.version, restamped.feed) == (1, "v1")
+    assert restamped.fetched_at >= first.fetched_at
+    assert (second.version, second.feed) == (2, "v2")
+
+
+def test_failed_load_keeps_the_previous_snapshot():
+    responses = iter([FeedLoad("v1"), None])
+    cache = FeedCache(lambda url, previous: next(responses))
+    first = cache.refresh("url")
+    assert cache.refresh("url") is first
+
+
+def test_stale_hit_is_served_while_refreshing_in_the_background():
+    refreshed = threading.Event()
+    responses = iter([FeedLoad("v1"), FeedLoad("v2")])
+
+    def loader(url, previous):
+        loaded = next(responses)
+        if previous is not None:
+            refreshed.set()
+        return loaded
+
+    cache = FeedCache(loader, ttl=0)
+    cache.refresh("url")
+    assert cache.get_snapshot("url").feed == "v1"
+    assert refreshed.wait(5)
+    deadline = time.time() + 5
+    while cache.peek("url").feed != "v2" and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.peek("url").version == 2
+
+
+def test_lookup_never_loads():
+    cache = FeedCache(lambda url, previous: FeedLoad("v1"))
+    assert cache.lookup("url") is None
+    assert cache.peek("url") is None
+    cache.refresh("url")
+    assert cache.lookup("url").feed == "v1"
+
+
+def test_seeded_snapshot_is_restored_and_replaced_by_a_live_load():
+    cache = FeedCache(lambda url, previous: FeedLoad("live"))
+    seeded = cache.seed("url", FeedLoad("disk", fetched_at=1.0, restored=True))
+    assert seeded.restored and seeded.fetched_at == 1.0
+    assert cache.seed("url", FeedLoad("again")) is None
+
+    live = cache.refresh("url")
+    assert (live.feed, live.version, live.restored) == ("live", 2, False)
+
+
+def test_listeners_see_each_publish_with_its_predecessor():
+    seen = []
+    responses = iter([FeedLoad("v1"), FeedLoad("v2")])
+    cache = FeedCache(lambda url, previous: next(responses))
+    cache.add_listener(lambda snapshot, previous: seen.append((snapshot.version, previous and previous.version)))
+    cache.refresh("url")
+    cache.refresh("url")
+    assert seen == [(1, None), (2, 1)]
@@ -0,0 +1,38 @@
+from mta_data.feed_index import FeedIndex
+
+from conftest import TRIPS, build_feed
+
+
+def test_stop_arrivals_are_sorted_by_time(feed_index):
+    assert [a.trip_id for a in feed_index.arrivals("102N")] == ["C1", "A1", "A2"]
+    assert [a.arrival_time for a in feed_index.arrivals("102N", 1030, 1360)] == [1060]
+
+
+def test_trip_lookup_follows_the_train_in_time_order(feed_index):
+    arrivals = feed_index.trip("A1")
+    assert [(a.stop_id, a.arrival_time) for a in arrivals] == [("101N", 1000), ("102N", 1060), ("103N", 1120)]
+    assert feed_index.trip("missing") is None
+
+
+def test_route_trips_are_in_feed_order(feed_index):
+    assert [trip_id for trip_id, _ in feed_index.route_trips("A")] == ["A1", "A2", "A3"]
+    assert [trip_id for trip_id, _ in feed_index.route_trips("C")] == ["C1"]
+
+
+def test_routes_filter_drops_other_routes():
+    index = FeedIndex.build(build_feed(TRIPS), routes={"C"})
+    assert set(index.trip_ids()) == {"C1"}
+    assert index.arrivals("101N") == []
+
+
+def test_trip_ordering_is_built_at_ingestion(feed_index):
+    trip_codes, trip_starts, trip_order = feed_index.trip_columns()
+    strings = feed_index.string_table()
+    assert [strings[code] for code in trip_codes] == ["A1", "A2", "C1", "A3"]
+    assert list(trip_starts) == [0, 3, 5, 7]
+    assert sorted(trip_order) == list(range(len(feed_index)))
+
+
+def test_upcoming_merges_stops_in_time_order(feed_index):
+    arrivals = list(feed_index.upcoming({"101N": None, "102N": None}, now=1000, window=400))
+    assert [(a.trip_id, a.arrival_time) for a in arrivals] == [("C1", 1030), ("A1", 1060), ("A2", 1300), ("A2", 1360)]
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from mta_data.feed_store import HEADER, FeedStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeedStore(str(tmp_path))
+
+
+def test_saved_feed_round_trips(store):
+    store.save("url", b"\x00body\xff", 1234.5, etag='"abc"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    stored = store.load("url")
+    assert stored.body == b"\x00body\xff"
+    assert stored.fetched_at == 1234.5
+    assert stored.etag == '"abc"'
+    assert stored.last_modified == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_missing_validators_load_as_none(store):
+    store.save("url", b"body", 1.0)
+    stored = store.load("url")
+    assert (stored.etag, stored.last_modified) == (None, None)
+
+
+def test_missing_feed_loads_as_none(store):
+    assert store.load("url") is None
+
+
+def test_truncated_feed_is_ignored(store):
+    store.save("url", b"x" * 100, 1.0, etag="e")
+    path = store.path_for("url")
+    with open(path, "rb") as f:
+        data = f.read()
+    for size in (len(data) - 1, HEADER.size + 1, HEADER.size - 1, 0):
+        with open(path, "wb") as f:
+            f.write(data[:size])
+        assert store.load("url") is None
+
+
+def test_unknown_format_is_ignored(store):
+    store.save("url", b"body", 1.0)
+    path = store.path_for("url")
+    with open(path, "r+b") as f:
+        f.write(b"XXXX")
+    assert store.load("url") is None
+
+
+def test_failed_save_keeps_the_previous_feed(store, monkeypatch):
+    store.save("url", b"old", 1.0)
+
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        store.save("url", b"new", 2.0)
+    monkeypatch.undo()
+    assert store.load("url").body == b"old"
+    assert os.listdir(store.directory) == [os.path.basename(store.path_for("url"))]
+
+
+def test_service_warm_starts_from_stored_feeds(tmp_path, make_service):
+    import time
+
+    from conftest import build_feed
+
+    url = "https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l"
+    now = time.time()
+    body = build_feed({"L-1": ("L", [("L03S", int(now) + 300)])}, int(now) - 600).SerializeToString()
+    FeedStore(str(tmp_path)).save(url, body, now - 600, etag='"v1"')
+
+    service = make_service(MTA_FEED_STORE_DIR=tmp_path)
+    snapshot = service.feed_cache.peek(url)
+    assert snapshot.restored and snapshot.etag == '"v1"'
+    assert [a.trip_id for a in snapshot.feed.arrivals("L03S")] == ["L-1"]
+    assert service.describe_feed(url, snapshot)["stale"]
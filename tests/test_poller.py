@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+
+from mta_data.poller import FeedPoller
+
+
+@pytest.fixture
+def workers(tmp_path, make_service):
+    """A leader and a follower sharing snapshots, with pollers that never poll idle feeds."""
+    leader = make_service(MTA_SHARED_SNAPSHOT_DIR=tmp_path)
+    assert leader.shared_store.try_acquire_leadership()
+    follower = make_service()
+    assert not follower.shared_store.try_acquire_leadership()
+    yield [(service, FeedPoller(service, interval=30, idle_interval=0, idle_after=300)) for service in (leader, follower)]
+    leader.shared_store.release()
+
+
+def test_idle_feeds_are_not_polled_and_requests_bring_them_back(service):
+    poller = FeedPoller(service, interval=30, idle_interval=0, idle_after=300)
+    url = service.feed_urls["l"]
+    assert poller.feed_interval(url) is None
+    service.feed_cache.lookup(url)
+    assert poller.feed_interval(url) == 30
+    assert FeedPoller(service, idle_interval=300).feed_interval(service.feed_urls["g"]) == 300
+
+
+def test_follower_requests_keep_the_leader_polling(workers):
+    (leader, leader_poller), (follower, follower_poller) = workers
+    url, idle_url = follower.feed_urls["l"], follower.feed_urls["g"]
+    assert leader_poller.feed_interval(url) is None
+
+    # A request on the follower, then the follower's next poll
+    follower.feed_cache.lookup(url)
+    follower_poller.poll_due()
+
+    assert leader_poller.feed_interval(url) == 30
+    assert leader_poller.feed_interval(idle_url) is None
+    # Followers keep re-reading the shared directory on their own schedule
+    assert follower_poller.feed_interval(url) == follower.shared_store.poll_interval
+
+
+def test_follower_demand_expires(workers):
+    (leader, leader_poller), (follower, follower_poller) = workers
+    url = follower.feed_urls["l"]
+    follower.feed_cache.lookup(url)
+    follower_poller.share_demand()
+
+    stale = time.time() - 301
+    os.utime(follower.shared_store.demand_path(url), (stale, stale))
+    assert leader_poller.feed_interval(url) is None
+
+
+def test_follower_stream_subscribers_count_as_demand(workers):
+    (leader, leader_poller), (follower, follower_poller) = workers
+    url = follower.feed_urls["l"]
+    follower.feed_cache.add_demand_source(lambda: {url})
+    follower_poller.share_demand()
+    assert leader_poller.feed_interval(url) == 30
+
+
+def test_leader_records_no_demand_files(workers, tmp_path):
+    (leader, leader_poller), _ = workers
+    leader.feed_cache.lookup(leader.feed_urls["l"])
+    leader_poller.share_demand()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".demand")]
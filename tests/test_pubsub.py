@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from starlette.requests import Request
+
+import main
+from mta_data.feed_cache import NOT_MODIFIED
+from mta_data.pubsub import ArrivalBroker, Subscription, topic_key
+
+
+def trains(route_id, offset):
+    return {f"{route_id}-1": (route_id, [("L03S", offset)])}
+
+
+def test_slow_subscriber_only_gets_the_latest_message():
+    async def scenario():
+        subscription = Subscription("key")
+        subscription.offer("first")
+        subscription.offer("second")
+        assert await subscription.next(timeout=1) == "second"
+        assert subscription.dropped == 1
+        assert await subscription.next(timeout=0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_topic_key_ignores_filter_order():
+    assert topic_key("s", {"line": "l", "routes": ["L"]}) == topic_key("s", {"routes": ["L"], "line": "l"})
+
+
+def test_new_feed_versions_are_pushed_to_subscribers(service, upstream):
+    upstream.publish("l", trains("L", 60))
+    broker = ArrivalBroker(service)
+
+    async def scenario():
+        first = broker.subscribe("union_square", {"line": "l"})
+        second = broker.subscribe("union_square", {"line": "l"})
+        current = json.loads(await broker.current(first))
+        assert [t["minutes_away"] for t in current["all_trains"]] == [0]
+
+        # Two versions published before the subscribers read: only the last is delivered
+        await asyncio.to_thread(upstream.publish, "l", trains("L", 120))
+        await asyncio.to_thread(upstream.publish, "l", trains("L", 300))
+        for subscription in (first, second):
+            message = json.loads(await subscription.next(timeout=1))
+            assert [t["minutes_away"] for t in message["all_trains"]] == [4]
+            assert subscription.dropped == 1
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_versions_are_not_pushed(service, upstream):
+    upstream.publish("l", trains("L", 60))
+    broker = ArrivalBroker(service)
+
+    async def scenario():
+        subscription = broker.subscribe("union_square", {})
+        # Re-stamping the same version (a 304 upstream) publishes nothing
+        upstream.loads.clear()
+        upstream.loads[service.feed_urls["l"]] = NOT_MODIFIED
+        await asyncio.to_thread(service.feed_cache.refresh, service.feed_urls["l"])
+        assert await subscription.next(timeout=0.1) is None
+
+    asyncio.run(scenario())
+
+
+def test_topics_keep_their_feeds_in_demand_until_unsubscribed(service):
+    broker = ArrivalBroker(service)
+
+    async def scenario():
+        subscription = broker.subscribe("union_square", {"line": "l"})
+        assert broker.subscribed_urls() == {service.feed_urls["l"]}
+        assert service.feed_cache.in_demand(service.feed_urls["l"], within=0)
+        broker.unsubscribe(subscription)
+        assert broker.subscribed_urls() == set()
+        assert broker.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_stream_subscribes_only_once_it_starts(service, upstream):
+    upstream.publish("l", trains("L", 60))
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def scenario():
+        request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""}, receive)
+        filters = {"line": "l", "routes": None, "direction": None, "max_minutes": None, "limit": None}
+        response = await main.station_trains_stream(request, "union-square", filters, main.API_KEY)
+        broker = main.get_broker()
+        # A client gone before streaming starts leaves no subscription behind
+        assert broker.subscriber_count == 0
+
+        events = response.body_iterator
+        assert (await events.__anext__()).startswith("event: arrivals\n")
+        assert broker.subscriber_count == 1
+        await events.aclose()
+        assert broker.subscriber_count == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+import main
+from mta_data.response_cache import ResponseCache
+
+TRAINS = {"L-1": ("L", [("L03S", 60)])}
+
+
+@pytest.fixture(autouse=True)
+def one_time_bucket(monkeypatch):
+    # Keep a minute boundary from changing ETags halfway through a test
+    monkeypatch.setattr(main, "RESPONSE_BUCKET_SECONDS", 10 ** 9)
+
+
+def test_body_is_rendered_once_per_key():
+    cache = ResponseCache()
+    calls = []
+
+    def render():
+        calls.append(1)
+        return b"body"
+
+    assert cache.get_or_render(("a",), render) == b"body"
+    assert cache.get_or_render(("a",), render) == b"body"
+    assert len(calls) == 1
+
+
+def test_least_recently_used_body_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.get_or_render("a", lambda: b"a")
+    cache.get_or_render("b", lambda: b"b")
+    cache.get_or_render("a", lambda: b"a")
+    cache.get_or_render("c", lambda: b"c")
+    assert cache.get_or_render("a", lambda: b"new") == b"a"
+    assert cache.get_or_render("b", lambda: b"new") == b"new"
+
+
+def test_etag_is_weak_and_depends_only_on_the_key():
+    etag = ResponseCache.etag(("station", 1))
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert ResponseCache.etag(("station", 1)) == etag
+    assert ResponseCache.etag(("station", 2)) != etag
+
+
+def test_response_carries_etag_and_cache_control(client, upstream):
+    upstream.publish("l", TRAINS)
+    response = client.get("/api/stations/union-square/trains", params={"line": "l"})
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('W/"')
+    directive, max_age = response.headers["cache-control"].split(", max-age=")
+    assert directive == "private"
+    # Never longer than the feed refresh interval
+    assert 0 <= int(max_age) <= 30
+
+
+def test_matching_if_none_match_is_not_modified(client, upstream):
+    upstream.publish("l", TRAINS)
+    url = "/api/stations/union-square/trains"
+    etag = client.get(url, params={"line": "l"}).headers["etag"]
+
+    for if_none_match in (etag, etag.removeprefix("W/"), f'"other", {etag}'):
+        response = client.get(url, params={"line": "l"}, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    response = client.get(url, params={"line": "l"}, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_etag_changes_with_feed_contents_and_filters(client, upstream):
+    now = time.time()
+    upstream.publish("l", TRAINS, now=now)
+    url = "/api/stations/union-square/trains"
+    etag = client.get(url, params={"line": "l"}).headers["etag"]
+
+    assert client.get(url, params={"line": "l", "limit": 1}).headers["etag"] != etag
+
+    # Republishing the same feed keeps the ETag; a new MTA timestamp changes it
+    upstream.publish("l", TRAINS, now=now)
+    assert client.get(url, params={"line": "l"}).headers["etag"] == etag
+    upstream.publish("l", TRAINS, now=now + 5)
+    response = client.get(url, params={"line": "l"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from mta_data.feed_cache import FeedSnapshot
+from mta_data.shared_snapshot import SharedSnapshotStore, decode_feed_index, encode_feed_index
+
+from conftest import index_contents
+
+
+@pytest.fixture
+def leader(tmp_path):
+    store = SharedSnapshotStore(str(tmp_path))
+    assert store.try_acquire_leadership()
+    yield store
+    store.release()
+
+
+def test_encoded_index_round_trips(feed_index):
+    counts, body = encode_feed_index(feed_index)
+    decoded = decode_feed_index(counts, body, feed_index.timestamp)
+    assert index_contents(decoded) == index_contents(feed_index)
+
+
+def test_published_snapshot_round_trips(leader, feed_index):
+    leader.publish(FeedSnapshot("url", 3, 1234.5, feed_index))
+    loaded = leader.load("url")
+    assert (loaded.version, loaded.fetched_at) == (3, 1234.5)
+    assert index_contents(loaded.feed) == index_contents(feed_index)
+
+
+def test_unchanged_version_is_not_mapped_again(leader, feed_index):
+    leader.publish(FeedSnapshot("url", 3, 1.0, feed_index))
+    first = leader.load("url")
+    previous = FeedSnapshot("url", 3, 1.0, first.feed)
+    assert leader.load("url", previous).feed is first.feed
+
+
+def test_truncated_snapshot_is_ignored(leader, feed_index):
+    leader.publish(FeedSnapshot("url", 1, 1.0, feed_index))
+    path = leader.path_for("url")
+    with open(path, "rb") as f:
+        data = f.read()
+    for size in (len(data) - 3, len(data) // 2, 10, 0):
+        with open(path, "wb") as f:
+            f.write(data[:size])
+        assert leader.load("url") is None
+
+
+def test_failed_publish_keeps_the_previous_file(leader, feed_index, monkeypatch):
+    leader.publish(FeedSnapshot("url", 1, 1.0, feed_index))
+
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        leader.publish(FeedSnapshot("url", 2, 2.0, feed_index))
+    monkeypatch.undo()
+    assert leader.load("url").version == 1
+    assert not [name for name in os.listdir(leader.directory) if name.endswith(".tmp")]
+
+
+def test_only_one_store_leads(tmp_path, leader, feed_index):
+    follower = SharedSnapshotStore(str(tmp_path))
+    assert not follower.try_acquire_leadership()
+    # Followers never write, even when handed a snapshot
+    follower.publish(FeedSnapshot("other", 1, 1.0, feed_index))
+    assert not os.path.exists(follower.path_for("other"))
+
+    leader.release()
+    assert follower.try_acquire_leadership()
+    follower.release()
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from mta_data.spatial import StationGrid, haversine_m
+
+
+def brute_force(points, lat, lon, k=None, radius_m=None):
+    found = sorted((haversine_m(lat, lon, *point), key) for key, point in points.items())
+    if radius_m is not None:
+        found = [item for item in found if item[0] <= radius_m]
+    return found[:k] if k is not None else found
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(42)
+    return {f"s{i}": (40.55 + rng.random() * 0.35, -74.05 + rng.random() * 0.35) for i in range(500)}
+
+
+def test_haversine_distance():
+    assert haversine_m(40.0, -74.0, 40.0, -74.0) == 0
+    # One degree of latitude is about 111.2 km
+    assert haversine_m(40.0, -74.0, 41.0, -74.0) == pytest.approx(111195, rel=1e-3)
+
+
+@pytest.mark.parametrize("cell_size_m", [100, 500, 5000])
+def test_nearest_matches_brute_force(points, cell_size_m):
+    grid = StationGrid(points, cell_size_m=cell_size_m)
+    rng = random.Random(cell_size_m)
+    for _ in range(50):
+        lat, lon = 40.5 + rng.random() * 0.45, -74.1 + rng.random() * 0.45
+        for k in (1, 5, 20):
+            assert grid.nearest(lat, lon, k=k) == brute_force(points, lat, lon, k=k)
+            assert grid.nearest(lat, lon, k=k, radius_m=1500) == brute_force(points, lat, lon, k=k, radius_m=1500)
+
+
+def test_within_matches_brute_force(points):
+    grid = StationGrid(points)
+    for lat, lon in ((40.7, -73.9), (40.6, -74.0), (41.5, -73.0)):
+        assert grid.within(lat, lon, 2000) == brute_force(points, lat, lon, radius_m=2000)
+
+
+def test_far_away_query_still_finds_the_nearest(points):
+    grid = StationGrid(points)
+    assert grid.nearest(0.0, 0.0, k=3) == brute_force(points, 0.0, 0.0, k=3)
+    assert grid.nearest(0.0, 0.0, k=3, radius_m=1000) == []
+
+
+def test_more_than_every_point(points):
+    grid = StationGrid(dict(list(points.items())[:3]))
+    assert len(grid.nearest(40.7, -73.9, k=10)) == 3
+
+
+def test_empty_grid():
+    grid = StationGrid({})
+    assert len(grid) == 0
+    assert grid.nearest(40.7, -73.9, k=5) == []
+    assert grid.within(40.7, -73.9, 1000) == []
+    assert grid.nearest(40.7, -73.9, k=0) == []
+
+
+def test_nearby_endpoint_lists_the_closest_stations_first(client, upstream):
+    upstream.publish("l", {"L-1": ("L", [("L03S", 60)])})
+    # Between Herald Square and Penn Station, nearer Herald Square
+    response = client.get("/api/nearby/trains", params={"lat": 40.7497, "lon": -73.9889, "radius": 500})
+    assert response.status_code == 200
+    stations = response.json()["stations"]
+    assert [item["station"]["id"] for item in stations] == ["herald-square-34th", "penn-station-34th"]
+    assert stations[0]["distance_meters"] < stations[1]["distance_meters"] <= 500
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+# One train per line group at Union Square, Penn Station and Herald Square
+TRAINS = {
+    "456": {"4-1": ("4", [("635N", 120)]), "1-1": ("1", [("128S", 180)])},
+    "l": {"L-1": ("L", [("L03S", 60)])},
+    "nqrw": {"N-1": ("N", [("R14N", 240), ("R17N", 600)])},
+    "ace": {"A-1": ("A", [("A28N", 300)])},
+}
+
+
+@pytest.fixture
+def feeds(upstream):
+    for feed_id, trips in TRAINS.items():
+        upstream.publish(feed_id, trips)
+
+
+def test_line_group_narrows_routes_and_feeds(service):
+    query = service.plan_station_query("union_square", line="l")
+    assert query.line_groups == ("l",)
+    assert query.routes == frozenset({"L"})
+    assert list(query.feeds) == [service.feed_urls["l"]]
+
+
+def test_routes_and_line_group_intersect(service):
+    query = service.plan_station_query("union_square", line="456", routes=["4", "L"])
+    assert query.routes == frozenset({"4"})
+    assert list(query.feeds) == [service.feed_urls["456"]]
+
+
+def test_unserved_line_group_selects_nothing(service):
+    query = service.plan_station_query("penn_station", line="l")
+    assert query.line_groups == ()
+    assert query.routes == frozenset()
+    assert query.feeds == {}
+
+
+def test_direction_keeps_only_its_stops(service):
+    query = service.plan_station_query("union_square", direction="downtown")
+    assert set(query.stops) == {"R14S", "635S"}
+    assert query.directions == ("downtown",)
+
+
+def test_window_and_limit(service, feeds):
+    result = service.get_station_trains("union_square", max_minutes=3)
+    assert [train["trip_id"] for train in result["all_trains"]] == ["L-1", "4-1"]
+    result = service.get_station_trains("union_square", limit=1)
+    assert [train["trip_id"] for train in result["all_trains"]] == ["L-1"]
+
+
+def test_batch_only_returns_stations_serving_the_line_group(service, feeds):
+    trains = asyncio.run(service.get_stations_trains_async(["union_square", "penn_station", "herald_square"], line="l"))
+    assert [train["trip_id"] for train in trains["union_square"]["all_trains"]] == ["L-1"]
+    assert trains["penn_station"]["all_trains"] == []
+    assert trains["herald_square"]["all_trains"] == []
+
+
+def test_batch_endpoint_filters_by_line_group(client, feeds):
+    response = client.get("/api/trains", params={"stations": "union-square,penn-station-34th", "line": "l"})
+    assert response.status_code == 200
+    stations = response.json()["stations"]
+    assert [train["route_id"] for train in stations["union-square"]["all_trains"]] == ["L"]
+    assert stations["penn-station-34th"]["all_trains"] == []
+    assert stations["penn-station-34th"]["lines"] == {}
+
+
+def test_nearby_endpoint_filters_by_line_group(client, feeds):
+    # Union Square, with Penn Station and Herald Square about 2 km north
+    response = client.get("/api/nearby/trains", params={
+        "lat": 40.7357, "lon": -73.9906, "radius": 2500, "max_stations": 5, "line": "l"
+    })
+    assert response.status_code == 200
+    routes = {item["station"]["id"]: [t["route_id"] for t in item["trains"]["all_trains"]]
+              for item in response.json()["stations"]}
+    assert routes["union-square"] == ["L"]
+    assert routes["penn-station-34th"] == []
+    assert routes["herald-square-34th"] == []